@@ -0,0 +1,217 @@
+# api_helpers.py
+from fastapi import Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+import json
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from requests import MAX_PAGE_SIZE, STREAM_BATCH_SIZE, EXHIBIT_QUERY_FIELDS, SALES_GROUPS, SALES_PERIODS, render_receipt
+from zipstream import ZipStream
+
+
+# ====== CONDITIONAL GET ======
+
+def version_etag(name: str, versions: Dict[str, int]) -> str:
+    """Build the ETag of a resource from the versions of the scopes it depends on"""
+    return '"' + name + "-" + "-".join(str(version) for version in versions.values()) + '"'
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Set the ETag of a response; returns a 304 response if the client already has this version"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    response.headers.update(headers)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags or "W/" + etag in tags:
+            return Response(status_code=304, headers=headers)
+    return None
+
+
+# ====== PAGINATION HELPERS ======
+
+def paginated(response: Response, items: list, limit: int) -> list:
+    """Pass the keyset cursor of the next page in the X-Next-After header"""
+    if len(items) == limit:
+        response.headers["X-Next-After"] = str(items[-1].id)
+    return items
+
+
+def paginated_by_date(response: Response, items: list, limit: int) -> list:
+    """Pass the (date, id) keyset cursor of the next page in the X-Next-After header"""
+    if len(items) == limit:
+        response.headers["X-Next-After"] = f"{items[-1].date.isoformat()},{items[-1].id}"
+    return items
+
+
+def offset_paginated(response: Response, items: list, limit: int, offset: int) -> list:
+    """Pass the offset of the next page in the X-Next-Offset header"""
+    if len(items) == limit:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return items
+
+
+def ndjson_stream(db: Session, stream_rows, after: Optional[int]) -> StreamingResponse:
+    """Stream rows as NDJSON with the route's session, reading them through a server-side cursor"""
+    def generate():
+        # The session dependency may be closed before the body is sent (it
+        # depends on the FastAPI version); a closed Session can be used again,
+        # and closing it here returns the connection as soon as the stream ends
+        try:
+            lines = []
+            for row in stream_rows(db, after):
+                lines.append(row.model_dump_json() + "\n")
+                if len(lines) >= STREAM_BATCH_SIZE:
+                    yield "".join(lines)
+                    lines = []
+            if lines:
+                yield "".join(lines)
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+def async_ndjson_stream(db: AsyncSession, stream_rows, after: Optional[int]) -> StreamingResponse:
+    """Stream rows as NDJSON with the route's async session, reading them through a server-side cursor"""
+    async def generate():
+        try:
+            lines = []
+            async for row in stream_rows(db, after):
+                lines.append(row.model_dump_json() + "\n")
+                if len(lines) >= STREAM_BATCH_SIZE:
+                    yield "".join(lines)
+                    lines = []
+            if lines:
+                yield "".join(lines)
+        finally:
+            await db.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+def receipts_stream(db: Session, stream_receipts, output: str) -> StreamingResponse:
+    """Stream receipts as NDJSON or as a ZIP of text documents, reading them through a server-side cursor"""
+    def generate_ndjson():
+        try:
+            lines = []
+            for receipt in stream_receipts(db):
+                lines.append(json.dumps(receipt, ensure_ascii=False, default=datetime.isoformat) + "\n")
+                if len(lines) >= STREAM_BATCH_SIZE:
+                    yield "".join(lines)
+                    lines = []
+            if lines:
+                yield "".join(lines)
+        finally:
+            db.close()
+
+    def generate_zip():
+        try:
+            with ZipStream() as archive:
+                chunks = []
+                for receipt in stream_receipts(db):
+                    chunks.append(archive.add(f"{receipt['receipt_number']}.txt", render_receipt(receipt).encode("utf-8")))
+                    if len(chunks) >= STREAM_BATCH_SIZE:
+                        yield b"".join(chunks)
+                        chunks = []
+                yield b"".join(chunks)
+                yield from archive.finish()
+        finally:
+            db.close()
+
+    if output == "zip":
+        return StreamingResponse(generate_zip(), media_type="application/zip",
+                                 headers={"Content-Disposition": 'attachment; filename="receipts.zip"'})
+    return StreamingResponse(generate_ndjson(), media_type="application/x-ndjson")
+
+
+# ====== QUERY PARAMETER HELPERS ======
+
+def parse_id_list(raw: str, name: str = "ids") -> List[int]:
+    """Parse a comma-separated list of integer ids from a query parameter"""
+    try:
+        ids = [int(value) for value in raw.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"'{name}' must be a comma-separated list of integers")
+    if not ids:
+        raise HTTPException(status_code=422, detail=f"'{name}' must not be empty")
+    if len(ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_PAGE_SIZE} values are allowed in '{name}'")
+    return ids
+
+
+def parse_date_cursor(raw: Optional[str], name: str = "after") -> Optional[Tuple[datetime, int]]:
+    """Parse a '<date>,<id>' keyset cursor taken from the X-Next-After header"""
+    if raw is None:
+        return None
+    try:
+        moment, _, row_id = raw.rpartition(",")
+        return datetime.fromisoformat(moment), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"'{name}' must be a '<date>,<id>' cursor from X-Next-After")
+
+
+def parse_field_list(raw: str, allowed, name: str = "fields") -> List[str]:
+    """Parse a comma-separated list of field names, each of which must be allowed"""
+    fields = [value.strip() for value in raw.split(",") if value.strip()]
+    if not fields:
+        raise HTTPException(status_code=422, detail=f"'{name}' must not be empty")
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown values in '{name}': {', '.join(unknown)}; "
+                                                    f"expected any of: {', '.join(allowed)}")
+    # Duplicates would become duplicate columns
+    return list(dict.fromkeys(fields))
+
+
+def parse_sort(raw: str, allowed, name: str = "sort") -> List[Tuple[str, bool]]:
+    """Parse 'field,-other' into (field, descending) pairs; '-' sorts in descending order"""
+    keys = [(value[1:], True) if value.startswith("-") else (value.lstrip("+"), False)
+            for value in (value.strip() for value in raw.split(",")) if value]
+    parse_field_list(",".join(field for field, _ in keys), allowed, name)
+    return keys
+
+
+def exhibit_query_params(hall_id: Optional[str] = Query(None, description="Comma-separated hall ids"),
+                         supply_id: Optional[str] = Query(None, description="Comma-separated supply ids"),
+                         condition: Optional[str] = None,
+                         author: Optional[str] = None,
+                         storage_location: Optional[str] = None,
+                         created_from: Optional[date] = None,
+                         created_to: Optional[date] = None,
+                         sort: str = Query("id", description="Comma-separated fields, '-' for descending"),
+                         fields: Optional[str] = Query(None, description="Comma-separated fields to return")) -> dict:
+    """Dependency parsing the filters, sort and projection of GET /exhibits/query"""
+    return {
+        "filters": {
+            "hall_id": parse_id_list(hall_id, "hall_id") if hall_id is not None else None,
+            "supply_id": parse_id_list(supply_id, "supply_id") if supply_id is not None else None,
+            "condition": condition,
+            "author": author,
+            "storage_location": storage_location,
+            "created_from": created_from,
+            "created_to": created_to,
+        },
+        "sort": parse_sort(sort, EXHIBIT_QUERY_FIELDS),
+        "fields": parse_field_list(fields, EXHIBIT_QUERY_FIELDS) if fields is not None else list(EXHIBIT_QUERY_FIELDS),
+    }
+
+
+def period_params(start: Optional[date] = Query(None, alias="from", description="First day, inclusive"),
+                  end: Optional[date] = Query(None, alias="to", description="Last day, inclusive")) -> dict:
+    """Dependency parsing the from/to days of the statistics routes"""
+    if start is not None and end is not None and end < start:
+        raise HTTPException(status_code=422, detail="'to' must not be before 'from'")
+    return {"start": start, "end": end}
+
+
+def sales_statistics_params(period: dict = Depends(period_params),
+                            group_by: str = Query("day", description="Comma-separated: one of day, week, month, "
+                                                                     "year, and any of type, payment_status")) -> dict:
+    """Dependency parsing the period and grouping of GET /statistics/sales"""
+    groups = parse_field_list(group_by, SALES_GROUPS, "group_by")
+    if len([group for group in groups if group in SALES_PERIODS]) > 1:
+        raise HTTPException(status_code=422, detail=f"'group_by' may contain only one of: {', '.join(SALES_PERIODS)}")
+    return {**period, "group_by": groups}
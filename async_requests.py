@@ -0,0 +1,353 @@
+# async_requests.py
+# Async versions of the read queries from requests.py, used when DB_ASYNC is enabled.
+# The statements themselves are shared with requests.py wherever they are not trivial.
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import *
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from datetime import date, datetime
+
+from cache import cache, MISS
+from requests import (
+    DEFAULT_PAGE_SIZE,
+    STREAM_BATCH_SIZE,
+    _page_statement,
+    _in_requested_order,
+    _visitors_with_tickets_statement,
+    _stream_statement,
+    _movements_by_period_statement,
+    _exhibits_at_location_statement,
+    _exhibits_in_hall_statement,
+    _exhibits_in_halls_statement,
+    _group_exhibits_by_hall,
+    _exhibit_card,
+    _exhibit_card_statement,
+    _collect_exhibit_cards,
+    _halls_statistics_statement,
+    _collect_halls_statistics,
+    _sales_statistics_statement,
+    _collect_sales_statistics,
+    _visitor_statistics_statement,
+    _collect_visitor_statistics,
+    daily_sales_fold_statements,
+    EXHIBIT_QUERY_FIELDS,
+    _exhibit_query_statement,
+    _collect_exhibit_query,
+    _search_features,
+    _TRIGRAM_CHECK,
+    _fulltext_probe,
+    _search_statement
+)
+
+
+# ====== PAGINATION HELPERS ======
+
+async def _get_page(db: AsyncSession, model, limit: int, after: Optional[int]) -> list:
+    """Get one page of rows ordered by id, starting after the given id"""
+    results = await db.exec(_page_statement(model, limit, after))
+    return results.all()
+
+
+async def _stream_rows(db: AsyncSession, model, after: Optional[int]) -> AsyncIterator:
+    """Iterate over all rows ordered by id using a server-side cursor"""
+    results = await db.stream_scalars(_stream_statement(model, after))
+    async for row in results:
+        yield row
+
+
+# ====== EMPLOYEE OPERATIONS ======
+
+async def get_all_employees(db: AsyncSession) -> List[Employee]:
+    """Get all employees"""
+    results = await db.exec(select(Employee))
+    return results.all()
+
+
+async def get_employee_by_id(db: AsyncSession, employee_id: int) -> Optional[Employee]:
+    """Get employee by ID"""
+    return await db.get(Employee, employee_id)
+
+
+async def get_employees_by_position(db: AsyncSession, position: str) -> List[Employee]:
+    """Get employees by position"""
+    employees = cache.get("employees_position", position, Employee)
+    if employees is MISS:
+        results = await db.exec(select(Employee).where(Employee.position == position))
+        employees = results.all()
+        cache.set("employees_position", position, employees)
+    return employees
+
+
+# ====== EXHIBIT OPERATIONS ======
+
+async def get_all_exhibits(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, after: Optional[int] = None) -> List[Exhibit]:
+    """Get one page of exhibits (keyset pagination on id)"""
+    return await _get_page(db, Exhibit, limit, after)
+
+
+def stream_all_exhibits(db: AsyncSession, after: Optional[int] = None) -> AsyncIterator[Exhibit]:
+    """Iterate over all exhibits without loading the whole table"""
+    return _stream_rows(db, Exhibit, after)
+
+
+async def get_exhibit_by_id(db: AsyncSession, exhibit_id: int) -> Optional[Exhibit]:
+    """Get exhibit by ID"""
+    exhibit = cache.get("exhibit", exhibit_id, Exhibit)
+    if exhibit is MISS:
+        exhibit = await db.get(Exhibit, exhibit_id)
+        cache.set("exhibit", exhibit_id, exhibit)
+    return exhibit
+
+
+async def find_exhibit_by_inventory_number(db: AsyncSession, inventory_number: str) -> Optional[Exhibit]:
+    """Find exhibit by inventory number"""
+    exhibit = cache.get("exhibit_inventory", inventory_number, Exhibit)
+    if exhibit is MISS:
+        results = await db.exec(select(Exhibit).where(Exhibit.inventory_number == inventory_number))
+        exhibit = results.first()
+        cache.set("exhibit_inventory", inventory_number, exhibit)
+    return exhibit
+
+
+async def get_exhibit_location(db: AsyncSession, exhibit_id: int) -> Optional[ExhibitLocation]:
+    """Get the current location of an exhibit"""
+    return await db.get(ExhibitLocation, exhibit_id)
+
+
+async def get_exhibits_at_location(db: AsyncSession, location: str, limit: int = DEFAULT_PAGE_SIZE,
+                                   after: Optional[int] = None) -> List[Exhibit]:
+    """Get one page of the exhibits now at a location (keyset pagination on id)"""
+    results = await db.exec(_exhibits_at_location_statement(location, limit, after))
+    return results.all()
+
+
+# ====== HALL OPERATIONS ======
+
+async def get_all_halls(db: AsyncSession) -> List[Hall]:
+    """Get all halls"""
+    halls = cache.get("halls", "all", Hall)
+    if halls is MISS:
+        results = await db.exec(select(Hall))
+        halls = results.all()
+        cache.set("halls", "all", halls)
+    return halls
+
+
+async def get_hall_by_id(db: AsyncSession, hall_id: int) -> Optional[Hall]:
+    """Get hall by ID"""
+    hall = cache.get("hall", hall_id, Hall)
+    if hall is MISS:
+        hall = await db.get(Hall, hall_id)
+        cache.set("hall", hall_id, hall)
+    return hall
+
+
+# ====== VISITOR OPERATIONS ======
+
+async def get_all_visitors(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, after: Optional[int] = None) -> List[Visitor]:
+    """Get one page of visitors (keyset pagination on id)"""
+    return await _get_page(db, Visitor, limit, after)
+
+
+def stream_all_visitors(db: AsyncSession, after: Optional[int] = None) -> AsyncIterator[Visitor]:
+    """Iterate over all visitors without loading the whole table"""
+    return _stream_rows(db, Visitor, after)
+
+
+async def get_visitor_by_id(db: AsyncSession, visitor_id: int) -> Optional[Visitor]:
+    """Get visitor by ID"""
+    return await db.get(Visitor, visitor_id)
+
+
+# ====== TICKET OPERATIONS ======
+
+async def get_all_tickets(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, after: Optional[int] = None) -> List[Ticket]:
+    """Get one page of tickets (keyset pagination on id)"""
+    return await _get_page(db, Ticket, limit, after)
+
+
+def stream_all_tickets(db: AsyncSession, after: Optional[int] = None) -> AsyncIterator[Ticket]:
+    """Iterate over all tickets without loading the whole table"""
+    return _stream_rows(db, Ticket, after)
+
+
+async def get_ticket_by_id(db: AsyncSession, ticket_id: int) -> Optional[Ticket]:
+    """Get ticket by ID"""
+    return await db.get(Ticket, ticket_id)
+
+
+async def get_tickets_by_ids(db: AsyncSession, ticket_ids: List[int]) -> List[Ticket]:
+    """Get several tickets in one query, in the order of the given ids"""
+    results = await db.exec(select(Ticket).where(Ticket.id.in_(ticket_ids)))
+    return _in_requested_order(results, ticket_ids)
+
+
+# ====== MOVEMENT OPERATIONS ======
+
+async def get_all_movements(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, after: Optional[int] = None) -> List[Movement]:
+    """Get one page of movements (keyset pagination on id)"""
+    return await _get_page(db, Movement, limit, after)
+
+
+def stream_all_movements(db: AsyncSession, after: Optional[int] = None) -> AsyncIterator[Movement]:
+    """Iterate over all movements without loading the whole table"""
+    return _stream_rows(db, Movement, after)
+
+
+# ====== RESTORATION OPERATIONS ======
+
+async def get_all_restorations(db: AsyncSession) -> List[Restoration]:
+    """Get all restorations"""
+    results = await db.exec(select(Restoration))
+    return results.all()
+
+
+# ====== SPECIAL QUERIES ======
+
+async def get_versions(db: AsyncSession, scopes: List[str]) -> Dict[str, int]:
+    """Get the versions of the given scopes (0 for scopes never changed)"""
+    results = await db.exec(select(EntityVersion).where(EntityVersion.scope.in_(scopes)))
+    versions = {row.scope: row.version for row in results}
+    return {scope: versions.get(scope, 0) for scope in scopes}
+
+
+async def get_exhibits_in_hall(db: AsyncSession, hall_number: int) -> List[Exhibit]:
+    """Get all exhibits in specified hall"""
+    results = await db.exec(_exhibits_in_hall_statement(hall_number))
+    return results.all()
+
+
+async def get_exhibits_in_halls(db: AsyncSession, hall_numbers: List[int]) -> Dict[int, List[Exhibit]]:
+    """Get the exhibits of several halls, grouped by hall number, in one query"""
+    results = await db.exec(_exhibits_in_halls_statement(hall_numbers))
+    return _group_exhibits_by_hall(results, hall_numbers)
+
+
+async def get_visitors_with_tickets(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE,
+                                    after: Optional[int] = None) -> List[Visitor]:
+    """Get one page of visitors with their tickets loaded (keyset pagination on id)"""
+    results = await db.exec(_visitors_with_tickets_statement(limit, after))
+    return results.all()
+
+
+async def get_exhibit_movement_history(db: AsyncSession, exhibit_id: int) -> List[Movement]:
+    """Get movement history for specific exhibit"""
+    statement = (select(Movement)
+                 .where(Movement.exhibit_id == exhibit_id)
+                 .order_by(Movement.date))
+    results = await db.exec(statement)
+    return results.all()
+
+
+async def get_current_restorations(db: AsyncSession) -> List[Restoration]:
+    """Get all current (unfinished) restorations"""
+    statement = (select(Restoration)
+                 .where(Restoration.status == ACTIVE_RESTORATION_STATUS))
+    results = await db.exec(statement)
+    return results.all()
+
+
+async def get_exhibits_from_supply(db: AsyncSession, supply_id: int) -> List[Exhibit]:
+    """Get all exhibits from specific supply"""
+    results = await db.exec(select(Exhibit).where(Exhibit.supply_id == supply_id))
+    return results.all()
+
+
+async def get_movements_page_by_period(db: AsyncSession, start: datetime, end: datetime, limit: int = DEFAULT_PAGE_SIZE,
+                                       after: Optional[Tuple[datetime, int]] = None) -> List[Movement]:
+    """Get one page of the movements of a period, starting after the given (date, id)"""
+    results = await db.exec(_movements_by_period_statement(start, end, after).limit(limit))
+    return results.all()
+
+
+async def stream_movements_by_period(db: AsyncSession, start: datetime, end: datetime,
+                                     after: Optional[Tuple[datetime, int]] = None) -> AsyncIterator[Movement]:
+    """Iterate over the movements of a period using a server-side cursor"""
+    statement = _movements_by_period_statement(start, end, after).execution_options(yield_per=STREAM_BATCH_SIZE)
+    results = await db.stream_scalars(statement)
+    async for row in results:
+        yield row
+
+
+async def get_movements_by_period(db: AsyncSession, start: datetime, end: datetime) -> List[Movement]:
+    """Get all movements for specified period"""
+    statement = (select(Movement)
+                 .where(Movement.date >= start)
+                 .where(Movement.date <= end)
+                 .order_by(Movement.date))
+    results = await db.exec(statement)
+    return results.all()
+
+
+async def get_full_exhibit_info(db: AsyncSession, exhibit_id: int):
+    """Get full exhibit information including hall, supply, movements and restorations"""
+    results = await db.exec(_exhibit_card_statement([exhibit_id]))
+    exhibit = results.first()
+    if not exhibit:
+        return None
+    return _exhibit_card(exhibit)
+
+
+async def get_full_exhibits_info(db: AsyncSession, exhibit_ids: List[int]) -> List[dict]:
+    """Get full information for several exhibits with a constant number of queries"""
+    results = await db.exec(_exhibit_card_statement(exhibit_ids))
+    return _collect_exhibit_cards(results.unique(), exhibit_ids)
+
+
+async def get_halls_statistics(db: AsyncSession):
+    """Get statistics on exhibits in each hall: totals, conditions and active restorations"""
+    results = await db.exec(_halls_statistics_statement())
+    return _collect_halls_statistics(results)
+
+
+async def get_sales_statistics(db: AsyncSession, start: Optional[date] = None, end: Optional[date] = None,
+                               group_by: List[str] = ("day",)) -> List[dict]:
+    """Get tickets sold and revenue between two days (inclusive), grouped by the given keys"""
+    statement = _sales_statistics_statement(db.get_bind().dialect.name, start, end, list(group_by))
+    return _collect_sales_statistics(await db.exec(statement))
+
+
+async def get_visitor_statistics(db: AsyncSession, start: Optional[date] = None, end: Optional[date] = None) -> dict:
+    """Get the age histogram, ticket type mix and hourly attendance of visitors with tickets of a period"""
+    statement = _visitor_statistics_statement(db.get_bind().dialect.name, start, end)
+    return _collect_visitor_statistics(await db.exec(statement))
+
+
+async def fold_daily_sales(db: AsyncSession):
+    """Move the sales journal into daily_sales and commit (the only write of the async mode)"""
+    for statement in daily_sales_fold_statements(db.get_bind().dialect.name):
+        await db.exec(statement)
+    await db.commit()
+
+
+# ====== EXHIBIT QUERY ======
+
+async def query_exhibits(db: AsyncSession, filters: Dict[str, Any], sort: List[Tuple[str, bool]] = (),
+                         fields: List[str] = EXHIBIT_QUERY_FIELDS, limit: int = DEFAULT_PAGE_SIZE,
+                         offset: int = 0) -> List[dict]:
+    """Get one page of exhibits matching all the given filters, with the requested fields only"""
+    results = await db.exec(_exhibit_query_statement(filters, list(sort), list(fields), limit, offset))
+    return _collect_exhibit_query(results, list(fields))
+
+
+# ====== SEARCH ======
+
+async def _search_mode(db: AsyncSession, query: str) -> str:
+    """Choose how to search: fulltext, fuzzy (no full-text match) or substring"""
+    if db.get_bind().dialect.name != "postgresql":
+        return "substring"
+    if "pg_trgm" not in _search_features:
+        results = await db.exec(_TRIGRAM_CHECK)
+        _search_features["pg_trgm"] = results.one() > 0
+    if not _search_features["pg_trgm"]:
+        return "fulltext"
+    results = await db.exec(_fulltext_probe(query))
+    return "fulltext" if results.first() is not None else "fuzzy"
+
+
+async def search_exhibits(db: AsyncSession, query: str, limit: int = DEFAULT_PAGE_SIZE,
+                          offset: int = 0) -> Tuple[str, List[Exhibit]]:
+    """Search exhibits by title, author and description; returns the search mode and one page of results"""
+    mode = await _search_mode(db, query)
+    results = await db.exec(_search_statement(mode, query, limit, offset))
+    return mode, results.all()
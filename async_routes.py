@@ -0,0 +1,312 @@
+# async_routes.py
+# Async versions of the read-only routes from main.py. When DB_ASYNC is enabled
+# main.py registers this router first, so these handlers take precedence over
+# the sync ones and run on the event loop instead of the threadpool.
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import get_async_session
+from models import Employee, Hall, Ticket, Visitor, Exhibit, Movement, Restoration, ExhibitLocation, VisitorWithTicket
+from api_helpers import paginated, paginated_by_date, offset_paginated, async_ndjson_stream, parse_id_list, parse_date_cursor, exhibit_query_params, period_params, sales_statistics_params, version_etag, not_modified
+from requests import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_PAGE_OFFSET, RESTORATION_SCOPE, ALL_HALLS_SCOPE, hall_scope, sales_fold_due
+import async_requests as queries
+
+router = APIRouter()
+
+
+# ====== EMPLOYEE ROUTES ======
+
+@router.get("/employees", response_model=List[Employee])
+async def get_all_employees_async_api(db: AsyncSession = Depends(get_async_session)):
+    """Get all museum employees"""
+    return await queries.get_all_employees(db)
+
+
+@router.get("/employees/{employee_id}", response_model=Employee)
+async def get_employee_by_id_async_api(employee_id: int, db: AsyncSession = Depends(get_async_session)):
+    """Get employee by ID"""
+    employee = await queries.get_employee_by_id(db, employee_id)
+    if not employee:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    return employee
+
+
+@router.get("/employees/position/{position}", response_model=List[Employee])
+async def get_employees_by_position_async_api(position: str, db: AsyncSession = Depends(get_async_session)):
+    """Get employees by specific position"""
+    employees = await queries.get_employees_by_position(db, position)
+    if not employees:
+        raise HTTPException(status_code=404, detail=f"Employees with position '{position}' not found")
+    return employees
+
+
+# ====== EXHIBIT ROUTES ======
+
+@router.get("/exhibits", response_model=List[Exhibit])
+async def get_all_exhibits_async_api(response: Response,
+                                     limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                     after: Optional[int] = None,
+                                     stream: bool = False,
+                                     db: AsyncSession = Depends(get_async_session)):
+    """Get a page of museum exhibits (or stream all of them as NDJSON)"""
+    if stream:
+        return async_ndjson_stream(db, queries.stream_all_exhibits, after)
+    return paginated(response, await queries.get_all_exhibits(db, limit, after), limit)
+
+
+@router.get("/exhibits/query", response_model=List[Dict[str, Any]])
+async def query_exhibits_async_api(response: Response,
+                                   params: dict = Depends(exhibit_query_params),
+                                   limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                   offset: int = Query(0, ge=0, le=MAX_PAGE_OFFSET),
+                                   db: AsyncSession = Depends(get_async_session)):
+    """Get a page of exhibits by any combination of filters, with the requested sort and fields"""
+    exhibits = await queries.query_exhibits(db, params["filters"], params["sort"], params["fields"], limit, offset)
+    return offset_paginated(response, exhibits, limit, offset)
+
+
+@router.get("/exhibits/search", response_model=List[Exhibit])
+async def search_exhibits_async_api(response: Response,
+                                    q: str = Query(..., min_length=1, max_length=200),
+                                    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                    offset: int = Query(0, ge=0, le=MAX_PAGE_OFFSET),
+                                    db: AsyncSession = Depends(get_async_session)):
+    """Search exhibits by title, author and description, the best matches first"""
+    mode, exhibits = await queries.search_exhibits(db, q, limit, offset)
+    response.headers["X-Search-Mode"] = mode
+    return offset_paginated(response, exhibits, limit, offset)
+
+
+@router.get("/exhibits/halls", response_model=Dict[int, List[Exhibit]])
+async def get_exhibits_in_halls_async_api(numbers: str, request: Request, response: Response,
+                                          db: AsyncSession = Depends(get_async_session)):
+    """Get the exhibits of several halls (comma-separated numbers), grouped by hall number (supports If-None-Match)"""
+    hall_numbers = list(dict.fromkeys(parse_id_list(numbers, "numbers")))
+    versions = await queries.get_versions(db, [hall_scope(number) for number in hall_numbers] + [ALL_HALLS_SCOPE])
+    unchanged = not_modified(request, response, version_etag("halls" + "-".join(map(str, hall_numbers)), versions))
+    if unchanged:
+        return unchanged
+    return await queries.get_exhibits_in_halls(db, hall_numbers)
+
+
+@router.get("/exhibits/full-info")
+async def get_full_exhibits_info_async_api(ids: str, db: AsyncSession = Depends(get_async_session)):
+    """Get full information for several exhibits (comma-separated ids) for catalogue pages"""
+    return await queries.get_full_exhibits_info(db, parse_id_list(ids))
+
+
+@router.get("/exhibits/{exhibit_id}", response_model=Exhibit)
+async def get_exhibit_by_id_async_api(exhibit_id: int, db: AsyncSession = Depends(get_async_session)):
+    """Get exhibit by ID"""
+    exhibit = await queries.get_exhibit_by_id(db, exhibit_id)
+    if not exhibit:
+        raise HTTPException(status_code=404, detail="Exhibit not found")
+    return exhibit
+
+
+@router.get("/exhibits/inventory/{inventory_number}", response_model=Exhibit)
+async def find_exhibit_by_inventory_number_async_api(inventory_number: str, db: AsyncSession = Depends(get_async_session)):
+    """Find specific exhibit by inventory number"""
+    exhibit = await queries.find_exhibit_by_inventory_number(db, inventory_number)
+    if not exhibit:
+        raise HTTPException(status_code=404, detail=f"Exhibit with inventory number '{inventory_number}' not found")
+    return exhibit
+
+
+@router.get("/exhibits/hall/{hall_number}", response_model=List[Exhibit])
+async def get_exhibits_in_hall_async_api(hall_number: int, request: Request, response: Response,
+                                         db: AsyncSession = Depends(get_async_session)):
+    """Get all exhibits in specified hall (supports If-None-Match)"""
+    versions = await queries.get_versions(db, [hall_scope(hall_number), ALL_HALLS_SCOPE])
+    unchanged = not_modified(request, response, version_etag(f"hall{hall_number}", versions))
+    if unchanged:
+        return unchanged
+    return await queries.get_exhibits_in_hall(db, hall_number)
+
+
+@router.get("/exhibits/{exhibit_id}/full-info")
+async def get_full_exhibit_info_async_api(exhibit_id: int, db: AsyncSession = Depends(get_async_session)):
+    """Get full exhibit information including hall, supply, movements and restorations"""
+    info = await queries.get_full_exhibit_info(db, exhibit_id)
+    if not info:
+        raise HTTPException(status_code=404, detail=f"Exhibit with ID {exhibit_id} not found")
+    return info
+
+
+@router.get("/exhibits/{exhibit_id}/location", response_model=ExhibitLocation)
+async def get_exhibit_location_async_api(exhibit_id: int, db: AsyncSession = Depends(get_async_session)):
+    """Get the current location of an exhibit and the movement that brought it there"""
+    location = await queries.get_exhibit_location(db, exhibit_id)
+    if not location:
+        raise HTTPException(status_code=404, detail=f"Exhibit with ID {exhibit_id} not found")
+    return location
+
+
+@router.get("/locations/{location}/exhibits", response_model=List[Exhibit])
+async def get_exhibits_at_location_async_api(location: str, response: Response,
+                                             limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                             after: Optional[int] = None,
+                                             db: AsyncSession = Depends(get_async_session)):
+    """Get a page of the exhibits now at a location (hall, storage or restoration workshop)"""
+    return paginated(response, await queries.get_exhibits_at_location(db, location, limit, after), limit)
+
+
+@router.get("/exhibits/supply/{supply_id}", response_model=List[Exhibit])
+async def get_exhibits_from_supply_async_api(supply_id: int, db: AsyncSession = Depends(get_async_session)):
+    """Get all exhibits from specific supply"""
+    return await queries.get_exhibits_from_supply(db, supply_id)
+
+
+# ====== HALL ROUTES ======
+
+@router.get("/halls", response_model=List[Hall])
+async def get_all_halls_async_api(db: AsyncSession = Depends(get_async_session)):
+    """Get all museum halls"""
+    return await queries.get_all_halls(db)
+
+
+@router.get("/halls/{hall_id}", response_model=Hall)
+async def get_hall_by_id_async_api(hall_id: int, db: AsyncSession = Depends(get_async_session)):
+    """Get hall by ID"""
+    hall = await queries.get_hall_by_id(db, hall_id)
+    if not hall:
+        raise HTTPException(status_code=404, detail="Hall not found")
+    return hall
+
+
+# ====== VISITOR ROUTES ======
+
+@router.get("/visitors", response_model=List[Visitor])
+async def get_all_visitors_async_api(response: Response,
+                                     limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                     after: Optional[int] = None,
+                                     stream: bool = False,
+                                     db: AsyncSession = Depends(get_async_session)):
+    """Get a page of visitors (or stream all of them as NDJSON)"""
+    if stream:
+        return async_ndjson_stream(db, queries.stream_all_visitors, after)
+    return paginated(response, await queries.get_all_visitors(db, limit, after), limit)
+
+
+@router.get("/visitors/with-tickets", response_model=List[VisitorWithTicket])
+async def get_visitors_with_tickets_async_api(response: Response,
+                                              limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                              after: Optional[int] = None,
+                                              db: AsyncSession = Depends(get_async_session)):
+    """Get a page of visitors, each with its ticket embedded (one joined query)"""
+    return paginated(response, await queries.get_visitors_with_tickets(db, limit, after), limit)
+
+
+@router.get("/visitors/{visitor_id}", response_model=Visitor)
+async def get_visitor_by_id_async_api(visitor_id: int, db: AsyncSession = Depends(get_async_session)):
+    """Get visitor by ID"""
+    visitor = await queries.get_visitor_by_id(db, visitor_id)
+    if not visitor:
+        raise HTTPException(status_code=404, detail="Visitor not found")
+    return visitor
+
+
+# ====== TICKET ROUTES ======
+
+@router.get("/tickets", response_model=List[Ticket])
+async def get_all_tickets_async_api(response: Response,
+                                    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                    after: Optional[int] = None,
+                                    stream: bool = False,
+                                    ids: Optional[str] = Query(None, description="Comma-separated ids: get these tickets instead of a page"),
+                                    db: AsyncSession = Depends(get_async_session)):
+    """Get a page of tickets, the tickets with the given ids, or all of them as NDJSON (stream)"""
+    if ids is not None:
+        return await queries.get_tickets_by_ids(db, parse_id_list(ids))
+    if stream:
+        return async_ndjson_stream(db, queries.stream_all_tickets, after)
+    return paginated(response, await queries.get_all_tickets(db, limit, after), limit)
+
+
+@router.get("/tickets/{ticket_id}", response_model=Ticket)
+async def get_ticket_by_id_async_api(ticket_id: int, db: AsyncSession = Depends(get_async_session)):
+    """Get ticket by ID"""
+    ticket = await queries.get_ticket_by_id(db, ticket_id)
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return ticket
+
+
+# ====== MOVEMENT ROUTES ======
+
+@router.get("/movements", response_model=List[Movement])
+async def get_all_movements_async_api(response: Response,
+                                      limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                      after: Optional[int] = None,
+                                      stream: bool = False,
+                                      db: AsyncSession = Depends(get_async_session)):
+    """Get a page of movements (or stream all of them as NDJSON)"""
+    if stream:
+        return async_ndjson_stream(db, queries.stream_all_movements, after)
+    return paginated(response, await queries.get_all_movements(db, limit, after), limit)
+
+
+@router.get("/movements/period", response_model=List[Movement])
+async def get_movements_by_period_async_api(response: Response, start: datetime, end: datetime,
+                                            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                            after: Optional[str] = Query(None, description="Cursor from X-Next-After: '<date>,<id>'"),
+                                            stream: bool = False,
+                                            db: AsyncSession = Depends(get_async_session)):
+    """Get a page of the movements of a period in date order (or stream all of them as NDJSON)"""
+    if end < start:
+        raise HTTPException(status_code=422, detail="'end' must not be before 'start'")
+    cursor = parse_date_cursor(after)
+    if stream:
+        return async_ndjson_stream(db, lambda session, after: queries.stream_movements_by_period(session, start, end, after), cursor)
+    return paginated_by_date(response, await queries.get_movements_page_by_period(db, start, end, limit, cursor), limit)
+
+
+@router.get("/movements/exhibit/{exhibit_id}", response_model=List[Movement])
+async def get_exhibit_movement_history_async_api(exhibit_id: int, db: AsyncSession = Depends(get_async_session)):
+    """Get movement history for specific exhibit"""
+    return await queries.get_exhibit_movement_history(db, exhibit_id)
+
+
+# ====== RESTORATION ROUTES ======
+
+@router.get("/restorations", response_model=List[Restoration])
+async def get_all_restorations_async_api(db: AsyncSession = Depends(get_async_session)):
+    """Get all restorations"""
+    return await queries.get_all_restorations(db)
+
+
+@router.get("/restorations/current", response_model=List[Restoration])
+async def get_current_restorations_async_api(request: Request, response: Response,
+                                             db: AsyncSession = Depends(get_async_session)):
+    """Get all current (unfinished) restorations (supports If-None-Match)"""
+    versions = await queries.get_versions(db, [RESTORATION_SCOPE])
+    unchanged = not_modified(request, response, version_etag("restorations", versions))
+    if unchanged:
+        return unchanged
+    return await queries.get_current_restorations(db)
+
+
+# ====== STATISTICS ROUTES ======
+
+@router.get("/statistics/halls")
+async def get_halls_statistics_async_api(db: AsyncSession = Depends(get_async_session)):
+    """Get statistics on exhibits in each hall, by condition and by active restorations"""
+    return await queries.get_halls_statistics(db)
+
+
+@router.get("/statistics/sales")
+async def get_sales_statistics_async_api(params: dict = Depends(sales_statistics_params),
+                                         db: AsyncSession = Depends(get_async_session)):
+    """Get tickets sold and revenue for a period, grouped by day/week/month/year, type and payment status"""
+    if sales_fold_due():
+        await queries.fold_daily_sales(db)
+    return await queries.get_sales_statistics(db, params["start"], params["end"], params["group_by"])
+
+
+@router.get("/statistics/visitors")
+async def get_visitor_statistics_async_api(period: dict = Depends(period_params),
+                                           db: AsyncSession = Depends(get_async_session)):
+    """Get the age histogram, ticket type mix and hourly attendance of the visitors of a period"""
+    return await queries.get_visitor_statistics(db, period["start"], period["end"])
@@ -0,0 +1,426 @@
+# benchmark.py
+"""
+HTTP benchmark of the museum API.
+
+Usage:
+    python benchmark.py                                   # SQLite stand-in in the temp directory
+    python benchmark.py --database-url postgresql://postgres@localhost/museum_bench --exhibits 100000
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --tolerance 15
+
+The app from main.py is served by uvicorn in a background thread against the
+given database. An empty database is first filled by the seed_data generator.
+Every scenario sends a fixed number of requests at a fixed concurrency over
+keep-alive connections. The report gives p50/p95/p99 latency, throughput,
+errors and SQL statements per request, counted with an engine event hook.
+With --baseline the run is compared to a stored report, and the exit code is 1
+when a scenario got slower by more than --tolerance percent.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+DEFAULT_DATABASE_URL = "sqlite:///" + os.path.join(tempfile.gettempdir(), "museum_benchmark.db")
+DEFAULT_PORT = 8765
+# Share of ids and numbers sampled from the database to build request paths
+SAMPLE_SIZE = 1000
+# Tickets per request of the batch receipt scenarios
+RECEIPT_BATCH_SIZE = 100
+
+
+# ====== SCENARIOS ======
+
+class Scenario:
+    """One benchmarked request: a method and a path (and body) built from sampled data"""
+
+    def __init__(self, name: str, method: str, path: Callable, body: Optional[Callable] = None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+
+    def build(self, rng: random.Random, sample: dict) -> Tuple[str, Optional[bytes]]:
+        body = self.body(rng, sample) if self.body else None
+        return self.path(rng, sample), json.dumps(body).encode() if body is not None else None
+
+
+def _new_ticket(rng: random.Random, sample: dict) -> dict:
+    return {
+        "number": f"BENCH-{uuid.uuid4().hex[:16]}",
+        "date_time": datetime.now().isoformat(timespec="seconds"),
+        "type": "взрослый",
+        "price": 500.0,
+        "payment_status": "оплачен",
+    }
+
+
+def _ticket_sale(rng: random.Random, sample: dict) -> list:
+    return [
+        {"type": "взрослый", "price": 500.0, "payment_status": "оплачен",
+         "visitor": {"name": "Посетитель", "age": rng.randint(18, 80)}},
+        {"type": "детский", "price": 200.0, "payment_status": "оплачен"},
+    ]
+
+
+def _receipt_batch(rng: random.Random, sample: dict) -> dict:
+    return {"ids": rng.sample(sample["ticket_ids"], min(RECEIPT_BATCH_SIZE, len(sample["ticket_ids"])))}
+
+
+def _receipt_day(rng: random.Random, sample: dict) -> dict:
+    # End-of-day reconciliation: every receipt of one sales day
+    day = str(rng.choice(sample["ticket_dates"]))[:10]
+    return {"from": day, "to": day}
+
+
+def _new_movement(rng: random.Random, sample: dict) -> dict:
+    return {
+        "exhibit_id": rng.choice(sample["exhibit_ids"]),
+        "from_location": "хранилище",
+        "to_location": "зал №1",
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "responsible_employee_id": rng.choice(sample["employee_ids"]),
+        "reason": "benchmark",
+    }
+
+
+# Hot routes of the API
+SCENARIOS = [
+    Scenario("exhibits_page", "GET",
+             lambda rng, s: f"/exhibits?limit=100&after={rng.choice(s['exhibit_ids'])}"),
+    Scenario("exhibit_full_info", "GET",
+             lambda rng, s: f"/exhibits/{rng.choice(s['exhibit_ids'])}/full-info"),
+    Scenario("halls_statistics", "GET", lambda rng, s: "/statistics/halls"),
+    Scenario("exhibit_by_inventory", "GET",
+             lambda rng, s: f"/exhibits/inventory/{rng.choice(s['inventory_numbers'])}"),
+    Scenario("ticket_receipt", "GET",
+             lambda rng, s: f"/tickets/{rng.choice(s['ticket_ids'])}/receipt"),
+    Scenario("ticket_receipts_ndjson", "POST", lambda rng, s: "/tickets/receipts", _receipt_batch),
+    Scenario("ticket_receipts_zip", "POST", lambda rng, s: "/tickets/receipts?format=zip", _receipt_batch),
+    Scenario("ticket_receipts_day_zip", "POST", lambda rng, s: "/tickets/receipts?format=zip", _receipt_day),
+    Scenario("create_ticket", "POST", lambda rng, s: "/tickets", _new_ticket),
+    Scenario("sell_tickets", "POST", lambda rng, s: "/tickets/sell", _ticket_sale),
+    Scenario("create_movement", "POST", lambda rng, s: "/movements", _new_movement),
+]
+
+# Values for path parameters of the routes discovered with --all-routes
+ROUTE_PARAMETERS = {
+    "employee_id": lambda rng, s: rng.choice(s["employee_ids"]),
+    "exhibit_id": lambda rng, s: rng.choice(s["exhibit_ids"]),
+    "hall_id": lambda rng, s: rng.choice(s["hall_ids"]),
+    "hall_number": lambda rng, s: rng.choice(s["hall_numbers"]),
+    "supply_id": lambda rng, s: rng.choice(s["supply_ids"]),
+    "ticket_id": lambda rng, s: rng.choice(s["ticket_ids"]),
+    "visitor_id": lambda rng, s: rng.choice(s["visitor_ids"]),
+    "inventory_number": lambda rng, s: rng.choice(s["inventory_numbers"]),
+    "position": lambda rng, s: rng.choice(s["positions"]),
+}
+# Routes that are not part of the API workload
+SKIPPED_ROUTES = {"/", "/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc", "/export/{table}"}
+
+
+def _route_scenario(path: str) -> Optional[Scenario]:
+    """Build a GET scenario for a route template, None if a parameter can't be filled"""
+    names = [part[1:-1] for part in path.split("/") if part.startswith("{")]
+    if any(name not in ROUTE_PARAMETERS for name in names):
+        return None
+
+    def build_path(rng, sample):
+        return path.format(**{name: quote(str(ROUTE_PARAMETERS[name](rng, sample))) for name in names})
+
+    return Scenario("GET " + path, "GET", build_path)
+
+
+def discover_route_scenarios(app) -> List[Scenario]:
+    """Build a scenario for every GET route of the app that has no required query parameters"""
+    from fastapi.routing import APIRoute
+
+    scenarios, seen = [], set()
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or "GET" not in route.methods:
+            continue
+        if route.path in SKIPPED_ROUTES or route.path in seen:
+            continue
+        if any(parameter.field_info.is_required() for parameter in route.dependant.query_params):
+            continue
+        scenario = _route_scenario(route.path)
+        if scenario:
+            seen.add(route.path)
+            scenarios.append(scenario)
+    return scenarios
+
+
+# ====== DATASET ======
+
+def prepare_dataset(args) -> dict:
+    """Apply migrations, fill an empty database and sample ids for the request paths"""
+    from sqlalchemy import text
+    import database
+    import seed_data
+
+    database.create_db_and_tables()
+    with database.engine.connect() as connection:
+        exhibits = connection.execute(text("SELECT count(*) FROM exhibit")).scalar()
+    if not exhibits:
+        print(f"⏳ Generating dataset: {args.exhibits} exhibits...", file=sys.stderr)
+        seed_data.generate_dataset(
+            exhibits=args.exhibits,
+            movements_per_exhibit=args.movements_per_exhibit,
+            tickets_per_day=args.tickets_per_day,
+            days=args.days,
+            seed=args.seed,
+        )
+
+    def sample(connection, column: str, table: str) -> list:
+        # Ids are spread over the whole table without ORDER BY random()
+        rows = connection.execute(text(f"SELECT {column} FROM {table} ORDER BY id")).scalars()
+        values = list(rows)
+        if len(values) > SAMPLE_SIZE:
+            values = random.Random(args.seed).sample(values, SAMPLE_SIZE)
+        return values
+
+    with database.engine.connect() as connection:
+        data = {
+            "employee_ids": sample(connection, "id", "employee"),
+            "exhibit_ids": sample(connection, "id", "exhibit"),
+            "inventory_numbers": sample(connection, "inventory_number", "exhibit"),
+            "hall_ids": sample(connection, "id", "hall"),
+            "hall_numbers": sample(connection, "number", "hall"),
+            "supply_ids": sample(connection, "id", "supply"),
+            "ticket_ids": sample(connection, "id", "ticket"),
+            "ticket_dates": sample(connection, "date_time", "ticket"),
+            "visitor_ids": sample(connection, "id", "visitor"),
+            "positions": sorted(set(sample(connection, "position", "employee"))),
+        }
+        data["counts"] = {
+            table: connection.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+            for table in ("exhibit", "movement", "ticket", "visitor", "restoration")
+        }
+    return data
+
+
+# ====== SERVER AND QUERY COUNTER ======
+
+class QueryCounter:
+    """Counts SQL statements sent by the application engines"""
+
+    def __init__(self, engines):
+        from sqlalchemy import event
+
+        self.count = 0
+        self.lock = threading.Lock()
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        with self.lock:
+            self.count += 1
+
+    def read(self) -> int:
+        with self.lock:
+            return self.count
+
+
+def start_server(app, port: int):
+    """Run uvicorn in a daemon thread and wait until it accepts connections"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 60
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("Benchmark server did not start")
+        time.sleep(0.05)
+    return server, thread
+
+
+# ====== LOAD GENERATION ======
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_scenario(scenario: Scenario, sample: dict, counter: QueryCounter, port: int,
+                 requests: int, concurrency: int, warmup: int, seed: int) -> dict:
+    """Send the scenario requests with a pool of keep-alive clients and summarize the timings"""
+    rng = random.Random(f"{seed}:{scenario.name}")
+    calls = [scenario.build(rng, sample) for _ in range(warmup + requests)]
+    local = threading.local()
+    headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+
+    def send(call) -> Tuple[float, int]:
+        path, body = call
+        if not hasattr(local, "connection"):
+            local.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        started = time.perf_counter()
+        try:
+            local.connection.request(scenario.method, path, body=body, headers=headers)
+            response = local.connection.getresponse()
+            response.read()
+            status = response.status
+        except (http.client.HTTPException, OSError):
+            local.connection.close()
+            del local.connection
+            status = 0
+        return time.perf_counter() - started, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, calls[:warmup]))
+        queries_before = counter.read()
+        started = time.perf_counter()
+        results = list(pool.map(send, calls[warmup:]))
+        elapsed = time.perf_counter() - started
+        queries = counter.read() - queries_before
+
+    latencies = sorted(seconds * 1000 for seconds, _ in results)
+    return {
+        "method": scenario.method,
+        "requests": requests,
+        "errors": sum(1 for _, status in results if not 200 <= status < 300),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "queries_per_request": round(queries / requests, 2) if requests else 0.0,
+    }
+
+
+# ====== REPORTING ======
+
+def print_report(report: dict):
+    print(f"\nDatabase: {report['meta']['database']}, concurrency {report['meta']['concurrency']}, "
+          f"{report['meta']['requests']} requests per scenario")
+    print(f"{'scenario':<42} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'queries':>8} {'errors':>7}")
+    for name, result in report["scenarios"].items():
+        print(f"{name:<42} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+              f"{result['throughput_rps']:>9.1f} {result['queries_per_request']:>8.2f} {result['errors']:>7}")
+
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Print the change of every metric against the baseline, returns the regressions"""
+    regressions = []
+    print(f"\nCompared with baseline from {baseline['meta'].get('created', '?')} (tolerance {tolerance}%):")
+    for name, result in report["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            print(f"  {name}: not in baseline")
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "queries_per_request"):
+            if not base[metric]:
+                continue
+            change = (result[metric] - base[metric]) / base[metric] * 100
+            changes.append(f"{metric} {change:+.1f}%")
+            if metric == "queries_per_request":
+                # Statement counts are exact, any growth is a regression
+                worse = result[metric] > base[metric]
+            elif metric == "throughput_rps":
+                worse = change < -tolerance
+            else:
+                # p99 is too noisy on short runs to fail the comparison
+                worse = metric != "p99_ms" and change > tolerance
+            if worse:
+                regressions.append(f"{name}: {metric} {base[metric]} -> {result[metric]}")
+        print(f"  {name}: {', '.join(changes)}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="HTTP benchmark of the museum API")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenario", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("--all-routes", action="store_true", help="also benchmark every parameterless GET route")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--exhibits", type=int, default=10_000, help="dataset size when the database is empty")
+    parser.add_argument("--movements-per-exhibit", type=int, default=5)
+    parser.add_argument("--tickets-per-day", type=int, default=200)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--save-baseline", help="write the report as a baseline JSON file")
+    parser.add_argument("--baseline", help="compare with a baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed slowdown against the baseline, %%")
+    args = parser.parse_args(argv)
+
+    # database.py reads its settings at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("APP_MODE", "dev")
+    import database
+    from main import app
+
+    sample = prepare_dataset(args)
+    engines = [database.engine] + ([database.async_engine.sync_engine] if database.async_engine else [])
+    counter = QueryCounter(engines)
+
+    scenarios = list(SCENARIOS)
+    if args.all_routes:
+        hot = {scenario.name for scenario in scenarios}
+        scenarios += [scenario for scenario in discover_route_scenarios(app) if scenario.name not in hot]
+    if args.scenario:
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.scenario]
+        if not scenarios:
+            parser.error(f"no scenarios match {args.scenario}")
+
+    server, thread = start_server(app, args.port)
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "database": database.engine.dialect.name,
+            "async": database.DB_ASYNC,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "dataset": sample["counts"],
+            "python": platform.python_version(),
+        },
+        "scenarios": {},
+    }
+    try:
+        for scenario in scenarios:
+            print(f"⏳ {scenario.name}...", file=sys.stderr)
+            report["scenarios"][scenario.name] = run_scenario(
+                scenario, sample, counter, args.port,
+                args.requests, args.concurrency, args.warmup, args.seed,
+            )
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    print_report(report)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as source:
+            regressions = compare_with_baseline(report, json.load(source), args.tolerance)
+        if regressions:
+            print("\n❌ Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# cache.py
+# Read-through cache for the hot lookups of requests.py (exhibit by id or
+# inventory number, halls, employees by position).
+#
+# Values are stored as JSON-compatible dicts (model_dump(mode="json")) and
+# turned back into models on the way out, so any backend can hold them and
+# callers never share mutable objects. Write functions invalidate the exact
+# keys they touch; bulk writes drop a whole namespace. Writes made outside the
+# application (seeding, manual SQL) are bounded by CACHE_TTL.
+#
+# Backends:
+#   memory - per-process LRU with TTL (default)
+#   redis  - shared between workers, any client with the redis-py interface
+#            (get/set/delete/scan_iter), so tests can pass a local fake
+#   none   - caching disabled
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, Counter
+from typing import Any, Iterable, Optional
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").strip().lower()
+CACHE_TTL = int(os.getenv("CACHE_TTL", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_KEY_PREFIX = "museum:cache:"
+
+# Returned by ModelCache.get when the key is not cached (None is a valid value)
+MISS = object()
+
+
+# ====== BACKENDS ======
+
+class MemoryBackend:
+    """In-process LRU cache with a time to live"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: int = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+
+class RedisBackend:
+    """Cache shared by all workers through a Redis-compatible client"""
+
+    def __init__(self, client, ttl: int = CACHE_TTL, key_prefix: str = REDIS_KEY_PREFIX):
+        self.client = client
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+
+    def get(self, key: str):
+        raw = self.client.get(self.key_prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value):
+        self.client.set(self.key_prefix + key, json.dumps(value, ensure_ascii=False), ex=self.ttl)
+
+    def delete(self, keys: Iterable[str]):
+        keys = [self.key_prefix + key for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def delete_prefix(self, prefix: str):
+        keys = list(self.client.scan_iter(match=self.key_prefix + prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_backend(name: str = CACHE_BACKEND):
+    """Create the backend selected by CACHE_BACKEND"""
+    if name == "none":
+        return None
+    if name == "memory":
+        return MemoryBackend()
+    if name == "redis":
+        # The redis package is only needed when this backend is selected
+        import redis
+
+        return RedisBackend(redis.Redis.from_url(REDIS_URL))
+    raise RuntimeError(f"Unknown CACHE_BACKEND '{name}', expected memory, redis or none")
+
+
+# ====== MODEL CACHE ======
+
+class ModelCache:
+    """Caches models and lists of models under '<namespace>:<key>' keys"""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, namespace: str, result: str):
+        with self._stats_lock:
+            self._stats[(namespace, result)] += 1
+
+    def stats(self) -> dict:
+        """Operation counts by (namespace, result): hit, miss, invalidation, error"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    @staticmethod
+    def _key(namespace: str, key: Any) -> str:
+        return f"{namespace}:{key}"
+
+    def get(self, namespace: str, key: Any, model):
+        """Cached model (or list of models) for the key, MISS if it is not cached"""
+        if self.backend is None:
+            return MISS
+        try:
+            value = self.backend.get(self._key(namespace, key))
+        except Exception:
+            # An unavailable cache must not fail the request
+            self._count(namespace, "error")
+            value = None
+        if value is None:
+            self._count(namespace, "miss")
+            return MISS
+        self._count(namespace, "hit")
+        if isinstance(value, list):
+            return [model.model_validate(item) for item in value]
+        return model.model_validate(value)
+
+    def set(self, namespace: str, key: Any, value):
+        """Cache a model or a list of models; None (not found) is never cached"""
+        if self.backend is None or value is None:
+            return
+        if isinstance(value, list):
+            data = [item.model_dump(mode="json") for item in value]
+        else:
+            data = value.model_dump(mode="json")
+        try:
+            self.backend.set(self._key(namespace, key), data)
+        except Exception:
+            self._count(namespace, "error")
+
+    def _drop(self, namespace: str, drop):
+        if self.backend is None:
+            return
+        self._count(namespace, "invalidation")
+        try:
+            drop()
+        except Exception:
+            # The write is already committed; the entry expires after CACHE_TTL
+            self._count(namespace, "error")
+
+    def invalidate(self, namespace: str, *keys):
+        """Drop the given keys of a namespace"""
+        self._drop(namespace, lambda: self.backend.delete([self._key(namespace, key) for key in keys]))
+
+    def invalidate_namespace(self, namespace: str):
+        """Drop every key of a namespace, for bulk writes"""
+        self._drop(namespace, lambda: self.backend.delete_prefix(namespace + ":"))
+
+
+cache = ModelCache(create_backend())
@@ -0,0 +1,305 @@
+# copy_io.py
+"""
+CSV import and export of the catalogue tables through PostgreSQL COPY.
+
+Usage:
+    python copy_io.py export exhibit exhibits.csv
+    python copy_io.py import exhibit exhibits.csv --chunk-size 10000
+
+Imports are validated against the SQLModel schemas chunk by chunk and run in
+one transaction; rows that fail validation are skipped and reported.
+"""
+import argparse
+import csv
+import io
+import sys
+import threading
+import time
+from itertools import islice
+from queue import Queue, Full
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+from pydantic import ValidationError
+
+import database
+from metrics import business
+from models import Exhibit, Movement, Ticket
+from requests import ALL_HALLS_SCOPE, PARTITION_COLUMNS, location_refresh_statements
+from sqlalchemy.dialects import postgresql
+
+# Tables that can be loaded and dumped with COPY
+COPY_MODELS = {
+    "exhibit": Exhibit,
+    "movement": Movement,
+    "ticket": Ticket,
+}
+# Rows validated and sent to the server per COPY round trip
+COPY_CHUNK_SIZE = 10000
+# Rejected rows listed in the import report (all of them are counted)
+MAX_REPORTED_ERRORS = 100
+
+
+def _model(table: str):
+    """Get the model of a table that supports COPY"""
+    if table not in COPY_MODELS:
+        raise ValueError(f"Unknown table '{table}', expected one of: {', '.join(COPY_MODELS)}")
+    return COPY_MODELS[table]
+
+
+def check_copy_support():
+    """Make sure the configured database can run COPY through psycopg2"""
+    engine = database.engine
+    if engine.dialect.name != "postgresql" or engine.dialect.driver != "psycopg2":
+        raise ValueError("CSV import and export need PostgreSQL with the psycopg2 driver")
+
+
+def _raw_connection():
+    """Get a psycopg2 connection from the engine pool"""
+    check_copy_support()
+    return database.engine.raw_connection()
+
+
+def _csv_value(value):
+    """Convert a validated value to its CSV form; None becomes an unquoted empty field (NULL)"""
+    return "" if value is None else value
+
+
+def copy_rows(cursor, table: str, columns: List[str], rows: Iterable[list]) -> int:
+    """Send rows to a table with one COPY ... FROM STDIN, returns the number of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        count += 1
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return count
+
+
+# ====== EXPORT ======
+
+def export_csv(table: str, output) -> None:
+    """Write a whole table to a file-like object as CSV with a header line"""
+    model = _model(table)
+    columns = ", ".join(column.name for column in model.__table__.columns)
+    connection = _raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            # The query form also works for the partitioned movement table
+            cursor.copy_expert(f"COPY (SELECT {columns} FROM {table}) TO STDOUT WITH (FORMAT csv, HEADER true)", output)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+class _ExportCancelled(Exception):
+    """Raised inside COPY when the consumer of an export stream went away"""
+
+
+# Size of the pieces an export stream is cut into
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+class _QueueWriter:
+    """File-like object handing COPY output over to another thread through a bounded queue"""
+
+    def __init__(self, queue: Queue, cancelled: threading.Event):
+        self.queue = queue
+        self.cancelled = cancelled
+        self.buffer = []
+        self.buffered = 0
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise _ExportCancelled()
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except Full:
+                continue
+
+    def write(self, data):
+        # COPY writes one row at a time; hand them over in larger pieces
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= EXPORT_BUFFER_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.put(self.buffer[0][:0].join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+
+
+def iter_export_csv(table: str) -> Iterator:
+    """Iterate over CSV chunks of a table while COPY runs in a background thread"""
+    _model(table)
+    queue = Queue(maxsize=64)
+    cancelled = threading.Event()
+    done = object()
+
+    def produce():
+        writer = _QueueWriter(queue, cancelled)
+        try:
+            export_csv(table, writer)
+            writer.flush()
+            writer.put(done)
+        except _ExportCancelled:
+            pass
+        except Exception as error:
+            try:
+                writer.put(error)
+            except _ExportCancelled:
+                pass
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            chunk = queue.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        cancelled.set()
+
+
+# ====== IMPORT ======
+
+def _validated_rows(model, header: List[str], columns: List[str], lines, report: dict) -> Iterator[list]:
+    """Validate CSV lines against the model, yielding rows for COPY and recording rejected lines"""
+    for line_number, values in lines:
+        if len(values) != len(header):
+            error = f"expected {len(header)} fields, got {len(values)}"
+        else:
+            record = {name: value if value != "" else None for name, value in zip(header, values)}
+            try:
+                row = model.model_validate(record).model_dump()
+                yield [row[column] for column in columns]
+                continue
+            except ValidationError as validation_error:
+                error = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in validation_error.errors())
+        report["rejected_count"] += 1
+        if len(report["rejected"]) < MAX_REPORTED_ERRORS:
+            report["rejected"].append({"line": line_number, "error": error})
+
+
+def import_csv(table: str, source: TextIO, chunk_size: int = COPY_CHUNK_SIZE) -> dict:
+    """Load CSV with a header line into a table in one transaction, chunk by chunk.
+
+    Raises ValueError for a bad file or when the database rejects the data.
+    """
+    model = _model(table)
+    model_columns = [column.name for column in model.__table__.columns]
+
+    reader = csv.reader(source)
+    header = next(reader, None)
+    if not header:
+        raise ValueError("CSV file is empty, a header line is expected")
+    unknown = [name for name in header if name not in model_columns]
+    if unknown:
+        raise ValueError(f"Unknown columns for '{table}': {', '.join(unknown)}")
+
+    # Columns missing from the file get the model defaults; ids are generated
+    # by the database unless the file provides them
+    columns = [column for column in model_columns if column != "id" or "id" in header]
+    report = {"table": table, "imported": 0, "rejected_count": 0, "rejected": []}
+    lines = enumerate(reader, start=2)
+
+    started = time.perf_counter()
+    connection = _raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            # The primary key of a partitioned table is (id, partition column), so
+            # imported ids are checked below; writers wait so that none slips in between
+            check_ids = "id" in columns and model in PARTITION_COLUMNS
+            if check_ids:
+                cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+            while True:
+                chunk = list(islice(lines, chunk_size))
+                if not chunk:
+                    break
+                rows = _validated_rows(model, header, columns, chunk, report)
+                report["imported"] += copy_rows(cursor, table, columns, rows)
+            if check_ids:
+                cursor.execute(f"SELECT id FROM {table} GROUP BY id HAVING count(*) > 1 LIMIT 1")
+                duplicate = cursor.fetchone()
+                if duplicate:
+                    raise ValueError(f"Import into '{table}' failed: id {duplicate[0]} already exists")
+            if model is Exhibit:
+                # Imported exhibits may land in any hall (see requests.bump_versions)
+                cursor.execute("INSERT INTO entity_version (scope, version) VALUES (%s, 1) "
+                               "ON CONFLICT (scope) DO UPDATE SET version = entity_version.version + 1",
+                               (ALL_HALLS_SCOPE,))
+            if model in (Exhibit, Movement):
+                # Imported rows may change the location of any exhibit: rebuild exhibit_location
+                for statement in location_refresh_statements():
+                    cursor.execute(str(statement.compile(dialect=postgresql.dialect(),
+                                                         compile_kwargs={"literal_binds": True})))
+            if "id" in columns:
+                # Move the id sequence past the imported ids
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                               f"(SELECT coalesce(max(id), 1) FROM {table}))")
+        connection.commit()
+        if model is Ticket:
+            # Imported tickets bypass the incremental counters
+            business.invalidate()
+    except database.engine.dialect.dbapi.Error as error:
+        connection.rollback()
+        raise ValueError(f"Import into '{table}' failed: {str(error).strip().splitlines()[0]}") from error
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    seconds = time.perf_counter() - started
+    report["seconds"] = round(seconds, 3)
+    report["rows_per_second"] = round(report["imported"] / seconds) if seconds else None
+    return report
+
+
+# ====== COMMAND LINE ======
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="CSV import/export of museum tables through PostgreSQL COPY")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="dump a table to CSV")
+    export_parser.add_argument("table", choices=COPY_MODELS)
+    export_parser.add_argument("file", help="output CSV file, '-' for stdout")
+
+    import_parser = commands.add_parser("import", help="load a CSV file into a table")
+    import_parser.add_argument("table", choices=COPY_MODELS)
+    import_parser.add_argument("file", help="input CSV file with a header line, '-' for stdin")
+    import_parser.add_argument("--chunk-size", type=int, default=COPY_CHUNK_SIZE)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        started = time.perf_counter()
+        if args.file == "-":
+            export_csv(args.table, sys.stdout)
+        else:
+            with open(args.file, "w", encoding="utf-8", newline="") as output:
+                export_csv(args.table, output)
+        print(f"✅ Exported '{args.table}' in {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    else:
+        if args.file == "-":
+            report = import_csv(args.table, sys.stdin, args.chunk_size)
+        else:
+            with open(args.file, encoding="utf-8", newline="") as source:
+                report = import_csv(args.table, source, args.chunk_size)
+        print(f"✅ Imported {report['imported']} rows into '{args.table}' in {report['seconds']} s "
+              f"({report['rows_per_second']} rows/s), rejected {report['rejected_count']}", file=sys.stderr)
+        for rejected in report["rejected"]:
+            print(f"   line {rejected['line']}: {rejected['error']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
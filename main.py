@@ -1,16 +1,48 @@
 # main.py
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response, Body
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
 from sqlmodel import Session
+import io
+import os
+import tempfile
 import webbrowser
 import threading
 import time
 import uvicorn
 
-from database import engine, create_db_and_tables, get_session
-from models import Employee, Hall, Supply, Ticket, Visitor, Exhibit, Movement, Restoration
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from database import (
+    engine, create_db_and_tables, check_schema_version, get_session,
+    check_database_connection, get_pool_status, DB_ASYNC
+)
+from profiling import PROFILE_REQUESTS, ProfilingMiddleware, get_slow_requests
+from metrics import METRICS_ENABLED, MetricsMiddleware, render_metrics
+from api_helpers import paginated, paginated_by_date, offset_paginated, ndjson_stream, receipts_stream, parse_id_list, parse_date_cursor, exhibit_query_params, period_params, sales_statistics_params, version_etag, not_modified
+from models import Employee, Hall, Supply, Ticket, Visitor, Exhibit, Movement, Restoration, ExhibitLocation, VisitorWithTicket
 from requests import (
+    # Pagination
+    DEFAULT_PAGE_SIZE,
+
+    # Change versions (ETags)
+    RESTORATION_SCOPE,
+    ALL_HALLS_SCOPE,
+    hall_scope,
+    get_versions,
+    MAX_PAGE_SIZE,
+    MAX_PAGE_OFFSET,
+
+    # Bulk operations
+    MAX_BULK_SIZE,
+    bulk_create,
+    bulk_update,
+    bulk_delete,
+
     # Employees
     get_all_employees,
     get_employee_by_id,
@@ -21,8 +53,13 @@ from requests import (
 
     # Exhibits
     get_all_exhibits,
+    stream_all_exhibits,
+    query_exhibits,
+    search_exhibits,
     get_exhibit_by_id,
     find_exhibit_by_inventory_number,
+    get_exhibit_location,
+    get_exhibits_at_location,
     create_exhibit,
     update_exhibit,
     delete_exhibit,
@@ -36,6 +73,7 @@ from requests import (
 
     # Visitors
     get_all_visitors,
+    stream_all_visitors,
     get_visitor_by_id,
     create_visitor,
     update_visitor,
@@ -43,13 +81,21 @@ from requests import (
 
     # Tickets
     get_all_tickets,
+    stream_all_tickets,
     get_ticket_by_id,
+    get_tickets_by_ids,
+    build_receipt,
+    stream_receipts,
+    RECEIPT_FORMATS,
     create_ticket,
+    MAX_SALE_SIZE,
+    sell_tickets,
     update_ticket,
     delete_ticket,
 
     # Movements
     get_all_movements,
+    stream_all_movements,
     create_movement,
     delete_movement,
 
@@ -61,15 +107,24 @@ from requests import (
 
     # Special queries
     get_exhibits_in_hall,
+    get_exhibits_in_halls,
     get_visitors_with_tickets,
     get_exhibit_movement_history,
     get_current_restorations,
     get_exhibits_from_supply,
     get_movements_by_period,
+    get_movements_page_by_period,
+    stream_movements_by_period,
     get_full_exhibit_info,
-    get_halls_statistics
+    get_full_exhibits_info,
+    get_halls_statistics,
+    get_sales_statistics,
+    get_visitor_statistics,
+    sales_fold_due,
+    fold_daily_sales
 )
 from seed_data import create_sample_data
+from copy_io import COPY_MODELS, COPY_CHUNK_SIZE, check_copy_support, iter_export_csv, import_csv
 
 # Create FastAPI application
 app = FastAPI(
@@ -85,14 +140,50 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After", "X-Next-Offset", "X-Search-Mode", "Idempotent-Replayed", "ETag", "Server-Timing", "X-Query-Count"],
 )
 
-# Create tables and test data on startup
+# Write functions validate their input with model_validate (table models skip
+# validation when the body is parsed); invalid data is the client's error
+@app.exception_handler(ValidationError)
+def validation_error_handler(request: Request, error: ValidationError):
+    return JSONResponse(status_code=422, content={"detail": jsonable_encoder(error.errors(include_url=False))})
+
+
+# Statement count and database time of every request in the response headers
+if PROFILE_REQUESTS:
+    app.add_middleware(ProfilingMiddleware)
+
+# Latency histograms per route template for /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Async deployments serve read routes from the event loop; the router is
+# registered before the sync routes below, so its handlers match first
+if DB_ASYNC:
+    from async_routes import router as async_router
+    app.include_router(async_router)
+
+# What happens to the database on startup:
+#   prod - only check that the schema is at the latest migration
+#   dev  - apply pending migrations
+#   demo - apply pending migrations and add the sample data if it is missing
+APP_MODE = os.getenv("APP_MODE", "dev")
+if APP_MODE not in ("prod", "dev", "demo"):
+    raise RuntimeError(f"Unknown APP_MODE '{APP_MODE}', expected prod, dev or demo")
+
+
 @app.on_event("startup")
 def on_startup():
+    if APP_MODE == "prod":
+        check_schema_version()
+        print("✅ Database schema is up to date")
+        return
+
     create_db_and_tables()
-    create_sample_data()
-    print("✅ Database and test data created!")
+    print("✅ Database schema migrated")
+    if APP_MODE == "demo":
+        create_sample_data()
 
 
 # ====== ROOT ROUTE ======
@@ -105,6 +196,20 @@ def root_route():
         "version": "2.0.0",
         "documentation": "/docs",
         "available_endpoints": {
+            "csv": [
+                "GET /export/{table}",
+                "POST /import/{table}"
+            ],
+            "bulk": [
+                "POST /{entity}/bulk?upsert=",
+                "PUT /{entity}/bulk",
+                "DELETE /{entity}/bulk"
+            ],
+            "health": [
+                "GET /health/db",
+                "GET /debug/slow",
+                "GET /metrics"
+            ],
             "employees": [
                 "GET /employees",
                 "GET /employees/{id}",
@@ -114,11 +219,17 @@ def root_route():
                 "DELETE /employees/{id}"
             ],
             "exhibits": [
-                "GET /exhibits",
+                "GET /exhibits?limit=&after=&stream=",
+                "GET /exhibits/query?hall_id=&supply_id=&condition=&author=&storage_location=&created_from=&created_to=&sort=&fields=&limit=&offset=",
+                "GET /exhibits/search?q=&limit=&offset=",
                 "GET /exhibits/{id}",
                 "GET /exhibits/inventory/{inventory_number}",
                 "GET /exhibits/hall/{hall_number}",
+                "GET /exhibits/halls?numbers=",
                 "GET /exhibits/{id}/full-info",
+                "GET /exhibits/{id}/location",
+                "GET /exhibits/full-info?ids=",
+                "GET /locations/{location}/exhibits?limit=&after=",
                 "POST /exhibits",
                 "PUT /exhibits/{id}",
                 "DELETE /exhibits/{id}"
@@ -131,16 +242,21 @@ def root_route():
                 "DELETE /halls/{id}"
             ],
             "visitors": [
-                "GET /visitors",
+                "GET /visitors?limit=&after=&stream=",
+                "GET /visitors/with-tickets?limit=&after=",
                 "GET /visitors/{id}",
                 "POST /visitors",
                 "PUT /visitors/{id}",
                 "DELETE /visitors/{id}"
             ],
             "tickets": [
-                "GET /tickets",
+                "GET /tickets?limit=&after=&stream=",
+                "GET /tickets?ids=",
                 "GET /tickets/{id}",
+                "GET /tickets/{id}/receipt",
                 "POST /tickets",
+                "POST /tickets/sell",
+                "POST /tickets/receipts?format=ndjson|zip",
                 "PUT /tickets/{id}",
                 "DELETE /tickets/{id}"
             ]
@@ -148,6 +264,84 @@ def root_route():
     }
 
 
+# ====== HEALTH ROUTES ======
+
+@app.get("/health/db")
+def database_health_api(response: Response):
+    """Check database connectivity and report connection pool usage of this worker"""
+    try:
+        check_database_connection()
+        status = "ok"
+    except SQLAlchemyError:
+        response.status_code = 503
+        status = "unavailable"
+    return {"status": status, "pool": get_pool_status()}
+
+
+@app.get("/debug/slow")
+def slow_requests_api():
+    """Get the recent slow requests of this worker with their query counts and slowest statement"""
+    if not PROFILE_REQUESTS:
+        raise HTTPException(status_code=404, detail="Request profiling is disabled (PROFILE_REQUESTS)")
+    return get_slow_requests()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_api():
+    """Get the metrics of this worker in the Prometheus text format"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED)")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# ====== BULK ROUTES ======
+# Registered before the per-entity routes, otherwise "/{entity}/bulk"
+# would be matched by "/{entity}/{id}"
+
+def check_bulk_size(items: list):
+    """Reject bulk requests that are empty or too large"""
+    if not items:
+        raise HTTPException(status_code=422, detail="Bulk request must contain at least one item")
+    if len(items) > MAX_BULK_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_SIZE} items are allowed per bulk request")
+
+
+def add_bulk_routes(path: str, model):
+    """Register POST/PUT/DELETE {path}/bulk for a model"""
+    name = path.strip("/")
+
+    def bulk_create_api(items: List[Dict[str, Any]], upsert: bool = False, db: Session = Depends(get_session)):
+        check_bulk_size(items)
+        try:
+            return bulk_create(db, model, items, upsert)
+        except ValueError as error:
+            raise HTTPException(status_code=400, detail=str(error))
+
+    def bulk_update_api(items: List[Dict[str, Any]], db: Session = Depends(get_session)):
+        check_bulk_size(items)
+        return bulk_update(db, model, items)
+
+    def bulk_delete_api(ids: List[int] = Body(...), db: Session = Depends(get_session)):
+        check_bulk_size(ids)
+        return bulk_delete(db, model, ids)
+
+    app.add_api_route(f"{path}/bulk", bulk_create_api, methods=["POST"], name=f"bulk_create_{name}",
+                      summary=f"Create {name} in bulk (upsert=true updates existing rows)")
+    app.add_api_route(f"{path}/bulk", bulk_update_api, methods=["PUT"], name=f"bulk_update_{name}",
+                      summary=f"Update {name} in bulk by id")
+    app.add_api_route(f"{path}/bulk", bulk_delete_api, methods=["DELETE"], name=f"bulk_delete_{name}",
+                      summary=f"Delete {name} in bulk by id")
+
+
+add_bulk_routes("/employees", Employee)
+add_bulk_routes("/exhibits", Exhibit)
+add_bulk_routes("/halls", Hall)
+add_bulk_routes("/visitors", Visitor)
+add_bulk_routes("/tickets", Ticket)
+add_bulk_routes("/movements", Movement)
+add_bulk_routes("/restorations", Restoration)
+
+
 # ====== EMPLOYEE ROUTES ======
 
 @app.get("/employees", response_model=List[Employee])
@@ -201,9 +395,56 @@ def delete_employee_api(employee_id: int, db: Session = Depends(get_session)):
 # ====== EXHIBIT ROUTES ======
 
 @app.get("/exhibits", response_model=List[Exhibit])
-def get_all_exhibits_api(db: Session = Depends(get_session)):
-    """Get all museum exhibits"""
-    return get_all_exhibits(db)
+def get_all_exhibits_api(response: Response,
+                         limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                         after: Optional[int] = None,
+                         stream: bool = False,
+                         db: Session = Depends(get_session)):
+    """Get a page of museum exhibits (or stream all of them as NDJSON)"""
+    if stream:
+        return ndjson_stream(db, stream_all_exhibits, after)
+    return paginated(response, get_all_exhibits(db, limit, after), limit)
+
+
+@app.get("/exhibits/query", response_model=List[Dict[str, Any]])
+def query_exhibits_api(response: Response,
+                       params: dict = Depends(exhibit_query_params),
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                       offset: int = Query(0, ge=0, le=MAX_PAGE_OFFSET),
+                       db: Session = Depends(get_session)):
+    """Get a page of exhibits by any combination of filters, with the requested sort and fields"""
+    exhibits = query_exhibits(db, params["filters"], params["sort"], params["fields"], limit, offset)
+    return offset_paginated(response, exhibits, limit, offset)
+
+
+@app.get("/exhibits/search", response_model=List[Exhibit])
+def search_exhibits_api(response: Response,
+                        q: str = Query(..., min_length=1, max_length=200),
+                        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                        offset: int = Query(0, ge=0, le=MAX_PAGE_OFFSET),
+                        db: Session = Depends(get_session)):
+    """Search exhibits by title, author and description, the best matches first"""
+    mode, exhibits = search_exhibits(db, q, limit, offset)
+    response.headers["X-Search-Mode"] = mode
+    return offset_paginated(response, exhibits, limit, offset)
+
+
+@app.get("/exhibits/halls", response_model=Dict[int, List[Exhibit]])
+def get_exhibits_in_halls_api(numbers: str, request: Request, response: Response,
+                              db: Session = Depends(get_session)):
+    """Get the exhibits of several halls (comma-separated numbers), grouped by hall number (supports If-None-Match)"""
+    hall_numbers = list(dict.fromkeys(parse_id_list(numbers, "numbers")))
+    versions = get_versions(db, [hall_scope(number) for number in hall_numbers] + [ALL_HALLS_SCOPE])
+    unchanged = not_modified(request, response, version_etag("halls" + "-".join(map(str, hall_numbers)), versions))
+    if unchanged:
+        return unchanged
+    return get_exhibits_in_halls(db, hall_numbers)
+
+
+@app.get("/exhibits/full-info")
+def get_full_exhibits_info_api(ids: str, db: Session = Depends(get_session)):
+    """Get full information for several exhibits (comma-separated ids) for catalogue pages"""
+    return get_full_exhibits_info(db, parse_id_list(ids))
 
 
 @app.get("/exhibits/{exhibit_id}", response_model=Exhibit)
@@ -225,8 +466,13 @@ def find_exhibit_by_inventory_number_api(inventory_number: str, db: Session = De
 
 
 @app.get("/exhibits/hall/{hall_number}", response_model=List[Exhibit])
-def get_exhibits_in_hall_api(hall_number: int, db: Session = Depends(get_session)):
-    """Get all exhibits in specified hall"""
+def get_exhibits_in_hall_api(hall_number: int, request: Request, response: Response,
+                             db: Session = Depends(get_session)):
+    """Get all exhibits in specified hall (supports If-None-Match)"""
+    versions = get_versions(db, [hall_scope(hall_number), ALL_HALLS_SCOPE])
+    unchanged = not_modified(request, response, version_etag(f"hall{hall_number}", versions))
+    if unchanged:
+        return unchanged
     exhibits = get_exhibits_in_hall(db, hall_number)
     return exhibits
 
@@ -240,6 +486,24 @@ def get_full_exhibit_info_api(exhibit_id: int, db: Session = Depends(get_session
     return info
 
 
+@app.get("/exhibits/{exhibit_id}/location", response_model=ExhibitLocation)
+def get_exhibit_location_api(exhibit_id: int, db: Session = Depends(get_session)):
+    """Get the current location of an exhibit and the movement that brought it there"""
+    location = get_exhibit_location(db, exhibit_id)
+    if not location:
+        raise HTTPException(status_code=404, detail=f"Exhibit with ID {exhibit_id} not found")
+    return location
+
+
+@app.get("/locations/{location}/exhibits", response_model=List[Exhibit])
+def get_exhibits_at_location_api(location: str, response: Response,
+                                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                 after: Optional[int] = None,
+                                 db: Session = Depends(get_session)):
+    """Get a page of the exhibits now at a location (hall, storage or restoration workshop)"""
+    return paginated(response, get_exhibits_at_location(db, location, limit, after), limit)
+
+
 @app.post("/exhibits", response_model=Exhibit)
 def create_exhibit_api(exhibit: Exhibit, db: Session = Depends(get_session)):
     """Create new exhibit"""
@@ -284,13 +548,19 @@ def get_hall_by_id_api(hall_id: int, db: Session = Depends(get_session)):
 @app.post("/halls", response_model=Hall)
 def create_hall_api(hall: Hall, db: Session = Depends(get_session)):
     """Create new hall"""
-    return create_hall(db, hall.model_dump())
+    try:
+        return create_hall(db, hall.model_dump())
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail=f"Hall number {hall.number} is already taken")
 
 
 @app.put("/halls/{hall_id}", response_model=Hall)
 def update_hall_api(hall_id: int, hall: Hall, db: Session = Depends(get_session)):
     """Update hall data"""
-    updated_hall = update_hall(db, hall_id, hall.model_dump(exclude_unset=True))
+    try:
+        updated_hall = update_hall(db, hall_id, hall.model_dump(exclude_unset=True))
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail=f"Hall number {hall.number} is already taken")
     if not updated_hall:
         raise HTTPException(status_code=404, detail="Hall not found")
     return updated_hall
@@ -308,9 +578,24 @@ def delete_hall_api(hall_id: int, db: Session = Depends(get_session)):
 # ====== VISITOR ROUTES ======
 
 @app.get("/visitors", response_model=List[Visitor])
-def get_all_visitors_api(db: Session = Depends(get_session)):
-    """Get all visitors with ticket information"""
-    return get_all_visitors(db)
+def get_all_visitors_api(response: Response,
+                         limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                         after: Optional[int] = None,
+                         stream: bool = False,
+                         db: Session = Depends(get_session)):
+    """Get a page of visitors (or stream all of them as NDJSON)"""
+    if stream:
+        return ndjson_stream(db, stream_all_visitors, after)
+    return paginated(response, get_all_visitors(db, limit, after), limit)
+
+
+@app.get("/visitors/with-tickets", response_model=List[VisitorWithTicket])
+def get_visitors_with_tickets_api(response: Response,
+                                  limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                  after: Optional[int] = None,
+                                  db: Session = Depends(get_session)):
+    """Get a page of visitors, each with its ticket embedded (one joined query)"""
+    return paginated(response, get_visitors_with_tickets(db, limit, after), limit)
 
 
 @app.get("/visitors/{visitor_id}", response_model=Visitor)
@@ -349,9 +634,18 @@ def delete_visitor_api(visitor_id: int, db: Session = Depends(get_session)):
 # ====== TICKET ROUTES ======
 
 @app.get("/tickets", response_model=List[Ticket])
-def get_all_tickets_api(db: Session = Depends(get_session)):
-    """Get all tickets"""
-    return get_all_tickets(db)
+def get_all_tickets_api(response: Response,
+                        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                        after: Optional[int] = None,
+                        stream: bool = False,
+                        ids: Optional[str] = Query(None, description="Comma-separated ids: get these tickets instead of a page"),
+                        db: Session = Depends(get_session)):
+    """Get a page of tickets, the tickets with the given ids, or all of them as NDJSON (stream)"""
+    if ids is not None:
+        return get_tickets_by_ids(db, parse_id_list(ids))
+    if stream:
+        return ndjson_stream(db, stream_all_tickets, after)
+    return paginated(response, get_all_tickets(db, limit, after), limit)
 
 
 @app.get("/tickets/{ticket_id}", response_model=Ticket)
@@ -369,16 +663,29 @@ def get_electronic_receipt(ticket_id: int, db: Session = Depends(get_session)):
     ticket = get_ticket_by_id(db, ticket_id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
-
-    return {
-        "receipt_number": f"Receipt-{ticket.number}",
-        "ticket_number": ticket.number,
-        "purchase_date": ticket.date_time,
-        "ticket_type": ticket.type,
-        "price": ticket.price,
-        "payment_status": ticket.payment_status,
-        "receipt": f"Payment for ticket {ticket.number} for amount {ticket.price} rub."
-    }
+    return build_receipt(ticket)
+
+
+@app.post("/tickets/receipts")
+def get_receipts_api(ids: Optional[List[int]] = Body(None, description="Tickets to get the receipts of"),
+                     start: Optional[date] = Body(None, alias="from", description="First day of the period, inclusive"),
+                     end: Optional[date] = Body(None, alias="to", description="Last day of the period, inclusive"),
+                     output: str = Query("ndjson", alias="format", description="ndjson or zip"),
+                     db: Session = Depends(get_session)):
+    """Stream the receipts of the given tickets or of the tickets sold in a period.
+
+    NDJSON gives one receipt object per line, zip a text document per
+    receipt. The tickets are read in id order through a server-side cursor.
+    """
+    if output not in RECEIPT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"'format' must be one of: {', '.join(RECEIPT_FORMATS)}")
+    if (ids is None) == (start is None and end is None):
+        raise HTTPException(status_code=422, detail="Either 'ids' or a 'from'/'to' period must be given")
+    if ids is not None and len(ids) > MAX_BULK_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_SIZE} ids are allowed per request")
+    if start is not None and end is not None and end < start:
+        raise HTTPException(status_code=422, detail="'to' must not be before 'from'")
+    return receipts_stream(db, lambda session: stream_receipts(session, ids, start, end), output)
 
 
 @app.post("/tickets", response_model=Ticket)
@@ -387,6 +694,29 @@ def create_ticket_api(ticket: Ticket, db: Session = Depends(get_session)):
     return create_ticket(db, ticket.model_dump())
 
 
+@app.post("/tickets/sell")
+def sell_tickets_api(response: Response,
+                     items: List[Dict[str, Any]] = Body(..., description="Tickets without numbers, each with an optional 'visitor'"),
+                     idempotency_key: Optional[str] = Header(None, max_length=255),
+                     db: Session = Depends(get_session)):
+    """Sell tickets (numbered by the database) and their visitors in one transaction.
+
+    A retry with the same Idempotency-Key header returns the first response
+    with Idempotent-Replayed: true instead of selling the tickets again.
+    """
+    if not items:
+        raise HTTPException(status_code=422, detail="At least one ticket must be sold")
+    if len(items) > MAX_SALE_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_SALE_SIZE} tickets are sold per request")
+    try:
+        sale, replayed = sell_tickets(db, items, idempotency_key)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return sale
+
+
 @app.put("/tickets/{ticket_id}", response_model=Ticket)
 def update_ticket_api(ticket_id: int, ticket: Ticket, db: Session = Depends(get_session)):
     """Update ticket data"""
@@ -408,9 +738,30 @@ def delete_ticket_api(ticket_id: int, db: Session = Depends(get_session)):
 # ====== MOVEMENT ROUTES ======
 
 @app.get("/movements", response_model=List[Movement])
-def get_all_movements_api(db: Session = Depends(get_session)):
-    """Get all movements"""
-    return get_all_movements(db)
+def get_all_movements_api(response: Response,
+                          limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                          after: Optional[int] = None,
+                          stream: bool = False,
+                          db: Session = Depends(get_session)):
+    """Get a page of movements (or stream all of them as NDJSON)"""
+    if stream:
+        return ndjson_stream(db, stream_all_movements, after)
+    return paginated(response, get_all_movements(db, limit, after), limit)
+
+
+@app.get("/movements/period", response_model=List[Movement])
+def get_movements_by_period_api(response: Response, start: datetime, end: datetime,
+                                limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                after: Optional[str] = Query(None, description="Cursor from X-Next-After: '<date>,<id>'"),
+                                stream: bool = False,
+                                db: Session = Depends(get_session)):
+    """Get a page of the movements of a period in date order (or stream all of them as NDJSON)"""
+    if end < start:
+        raise HTTPException(status_code=422, detail="'end' must not be before 'start'")
+    cursor = parse_date_cursor(after)
+    if stream:
+        return ndjson_stream(db, lambda session, after: stream_movements_by_period(session, start, end, after), cursor)
+    return paginated_by_date(response, get_movements_page_by_period(db, start, end, limit, cursor), limit)
 
 
 @app.get("/movements/exhibit/{exhibit_id}", response_model=List[Movement])
@@ -423,7 +774,10 @@ def get_exhibit_movement_history_api(exhibit_id: int, db: Session = Depends(get_
 @app.post("/movements", response_model=Movement)
 def create_movement_api(movement: Movement, db: Session = Depends(get_session)):
     """Create new movement"""
-    return create_movement(db, movement.model_dump())
+    try:
+        return create_movement(db, movement.model_dump())
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
 
 
 @app.delete("/movements/{movement_id}")
@@ -444,8 +798,12 @@ def get_all_restorations_api(db: Session = Depends(get_session)):
 
 
 @app.get("/restorations/current", response_model=List[Restoration])
-def get_current_restorations_api(db: Session = Depends(get_session)):
-    """Get all current (unfinished) restorations"""
+def get_current_restorations_api(request: Request, response: Response, db: Session = Depends(get_session)):
+    """Get all current (unfinished) restorations (supports If-None-Match)"""
+    versions = get_versions(db, [RESTORATION_SCOPE])
+    unchanged = not_modified(request, response, version_etag("restorations", versions))
+    if unchanged:
+        return unchanged
     restorations = get_current_restorations(db)
     return restorations
 
@@ -478,11 +836,25 @@ def delete_restoration_api(restoration_id: int, db: Session = Depends(get_sessio
 
 @app.get("/statistics/halls")
 def get_halls_statistics_api(db: Session = Depends(get_session)):
-    """Get statistics on number of exhibits in each hall"""
+    """Get statistics on exhibits in each hall, by condition and by active restorations"""
     statistics = get_halls_statistics(db)
     return statistics
 
 
+@app.get("/statistics/sales")
+def get_sales_statistics_api(params: dict = Depends(sales_statistics_params), db: Session = Depends(get_session)):
+    """Get tickets sold and revenue for a period, grouped by day/week/month/year, type and payment status"""
+    if sales_fold_due():
+        fold_daily_sales(db)
+    return get_sales_statistics(db, params["start"], params["end"], params["group_by"])
+
+
+@app.get("/statistics/visitors")
+def get_visitor_statistics_api(period: dict = Depends(period_params), db: Session = Depends(get_session)):
+    """Get the age histogram, ticket type mix and hourly attendance of the visitors of a period"""
+    return get_visitor_statistics(db, period["start"], period["end"])
+
+
 @app.get("/exhibits/supply/{supply_id}", response_model=List[Exhibit])
 def get_exhibits_from_supply_api(supply_id: int, db: Session = Depends(get_session)):
     """Get all exhibits from specific supply"""
@@ -490,6 +862,43 @@ def get_exhibits_from_supply_api(supply_id: int, db: Session = Depends(get_sessi
     return exhibits
 
 
+# ====== CSV IMPORT / EXPORT ROUTES ======
+
+def check_copy_table(table: str):
+    """Validate a table name and database support for COPY routes"""
+    if table not in COPY_MODELS:
+        raise HTTPException(status_code=404, detail=f"Table '{table}' cannot be imported or exported")
+    try:
+        check_copy_support()
+    except ValueError as error:
+        raise HTTPException(status_code=501, detail=str(error))
+
+
+@app.get("/export/{table}")
+def export_table_api(table: str):
+    """Stream a whole table (exhibit, movement, ticket) as CSV through PostgreSQL COPY"""
+    check_copy_table(table)
+    return StreamingResponse(iter_export_csv(table), media_type="text/csv",
+                             headers={"Content-Disposition": f'attachment; filename="{table}.csv"'})
+
+
+@app.post("/import/{table}")
+async def import_table_api(table: str, request: Request,
+                           chunk_size: int = Query(COPY_CHUNK_SIZE, ge=1, le=100000)):
+    """Load CSV with a header line (request body) into a table through PostgreSQL COPY"""
+    check_copy_table(table)
+    # The upload is spooled to a temporary file, so memory use does not grow with its size
+    with tempfile.TemporaryFile() as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        source = io.TextIOWrapper(upload, encoding="utf-8", newline="")
+        try:
+            return await run_in_threadpool(import_csv, table, source, chunk_size)
+        except ValueError as error:
+            raise HTTPException(status_code=400, detail=str(error))
+
+
 # ====== AUTOMATIC BROWSER OPENING FUNCTION ======
 
 def open_browser():
@@ -0,0 +1,254 @@
+# metrics.py
+# Prometheus metrics in the text exposition format, served at /metrics:
+#   - request latency histograms per route template, method and status
+#   - requests in flight
+#   - connection pool usage (from database.get_pool_status)
+#   - business gauges: tickets sold today and restorations in progress.
+#     These are kept up to date by the write functions in requests.py and only
+#     recounted from the tables when they went stale (bulk writes, CSV imports,
+#     day change) or every METRICS_RECOUNT_SECONDS to pick up writes made by
+#     other worker processes.
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlmodel import Session, select, func
+
+import database
+from cache import cache
+from models import Ticket, Restoration, ACTIVE_RESTORATION_STATUS
+
+# Off by default with APP_MODE=prod: /metrics shows pool usage and sales without authentication
+METRICS_ENABLED = os.getenv(
+    "METRICS_ENABLED", "false" if os.getenv("APP_MODE", "dev") == "prod" else "true"
+).strip().lower() in ("1", "true", "yes", "on")
+METRICS_RECOUNT_SECONDS = int(os.getenv("METRICS_RECOUNT_SECONDS", "300"))
+
+# Upper bounds of the latency histogram buckets, seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Route label of requests that matched no route (keeps the label set bounded)
+UNMATCHED_ROUTE = "unmatched"
+
+
+# ====== REQUEST METRICS ======
+
+class _Histogram:
+    """Latency histogram of one label set"""
+
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+_histograms: Dict[Tuple[str, str, str], _Histogram] = {}
+_histograms_lock = threading.Lock()
+_in_flight = 0
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    """Record the duration of one served request"""
+    key = (method, route, str(status))
+    with _histograms_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram()
+        histogram.observe(seconds)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _in_flight -= 1
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            observe_request(scope["method"], route, status, time.perf_counter() - started)
+
+
+# ====== BUSINESS GAUGES ======
+
+class BusinessGauges:
+    """Tickets sold today and restorations in progress, maintained incrementally"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Held while the tables are recounted, so that readers start one recount at a time
+        self.recount_lock = threading.Lock()
+        self.day: Optional[date] = None
+        self.counted_at = 0.0
+        self.stale = True
+        # Number of changes reported so far; a recount that overlapped a change
+        # can't tell whether its SELECT saw it, so it leaves the gauges stale
+        self.changes = 0
+        self.tickets_today = 0
+        self.restorations_in_progress = 0
+
+    def invalidate(self):
+        """Recount on the next read, for writes that bypass the hooks below"""
+        with self.lock:
+            self.changes += 1
+            self.stale = True
+
+    def ticket_changed(self, old: Optional[datetime], new: Optional[datetime]):
+        """A ticket was created (old=None), deleted (new=None) or its date changed"""
+        with self.lock:
+            self.changes += 1
+            if self.stale:
+                return
+            if isinstance(old, datetime) and old.date() == self.day:
+                self.tickets_today -= 1
+            if isinstance(new, datetime) and new.date() == self.day:
+                self.tickets_today += 1
+
+    def restoration_changed(self, old_status: Optional[str], new_status: Optional[str]):
+        """A restoration was created (old_status=None), deleted (new_status=None) or updated"""
+        with self.lock:
+            self.changes += 1
+            if self.stale:
+                return
+            if old_status == ACTIVE_RESTORATION_STATUS:
+                self.restorations_in_progress -= 1
+            if new_status == ACTIVE_RESTORATION_STATUS:
+                self.restorations_in_progress += 1
+
+    def _recount(self, today: date):
+        day_start = datetime.combine(today, datetime.min.time())
+        with self.lock:
+            changes = self.changes
+        with Session(database.engine) as db:
+            tickets = db.exec(select(func.count(Ticket.id))
+                              .where(Ticket.date_time >= day_start)
+                              .where(Ticket.date_time < day_start + timedelta(days=1))).one()
+            restorations = db.exec(select(func.count(Restoration.id))
+                                   .where(Restoration.status == ACTIVE_RESTORATION_STATUS)).one()
+        with self.lock:
+            self.day = today
+            self.counted_at = time.monotonic()
+            self.stale = self.changes != changes
+            self.tickets_today = tickets
+            self.restorations_in_progress = restorations
+
+    def _needs_recount(self, today: date) -> bool:
+        with self.lock:
+            expired = time.monotonic() - self.counted_at > METRICS_RECOUNT_SECONDS
+            return self.stale or self.day != today or expired
+
+    def read(self) -> Tuple[int, int]:
+        """Current values, recounted first if they are stale, from another day or too old"""
+        today = date.today()
+        if self._needs_recount(today):
+            with self.recount_lock:
+                # Another reader may have recounted while this one waited
+                if self._needs_recount(today):
+                    self._recount(today)
+        with self.lock:
+            return self.tickets_today, self.restorations_in_progress
+
+
+business = BusinessGauges()
+
+
+# ====== EXPOSITION ======
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _pool_lines(lines: List[str]):
+    status = database.get_pool_status()
+    pools = [("sync", status)] + ([("async", status["async"])] if "async" in status else [])
+    for metric, key, help_text in (
+        ("museum_db_pool_size", "size", "Configured number of persistent connections"),
+        ("museum_db_pool_checked_out", "checkedout", "Connections currently in use"),
+        ("museum_db_pool_checked_in", "checkedin", "Idle connections in the pool"),
+        ("museum_db_pool_overflow", "overflow", "Connections opened above the pool size"),
+        ("museum_db_pool_max_connections", "max_connections", "Largest number of connections of this worker"),
+    ):
+        # QueuePool reports overflow as negative until the pool is full
+        values = [(name, max(pool[key], 0) if key == "overflow" else pool[key]) for name, pool in pools if key in pool]
+        if not values:
+            continue
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(f"{metric}{_labels(pool=name)} {value}" for name, value in values)
+
+
+def render_metrics() -> str:
+    """Render all metrics of this worker in the Prometheus text format"""
+    lines = [
+        "# HELP museum_http_request_duration_seconds Time spent serving HTTP requests",
+        "# TYPE museum_http_request_duration_seconds histogram",
+    ]
+    with _histograms_lock:
+        snapshot = [(key, list(h.buckets), h.sum, h.count) for key, h in sorted(_histograms.items())]
+    for (method, route, status), buckets, total, count in snapshot:
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS + (float("inf"),), buckets):
+            cumulative += bucket
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"museum_http_request_duration_seconds_bucket"
+                         f"{_labels(method=method, route=route, status=status, le=le)} {cumulative}")
+        labels = _labels(method=method, route=route, status=status)
+        lines.append(f"museum_http_request_duration_seconds_sum{labels} {total:.6f}")
+        lines.append(f"museum_http_request_duration_seconds_count{labels} {count}")
+
+    lines += [
+        "# HELP museum_http_requests_in_flight HTTP requests being served",
+        "# TYPE museum_http_requests_in_flight gauge",
+        f"museum_http_requests_in_flight {_in_flight}",
+    ]
+    _pool_lines(lines)
+
+    lines += [
+        "# HELP museum_cache_operations_total Cache lookups by result, invalidations and backend errors",
+        "# TYPE museum_cache_operations_total counter",
+    ]
+    lines.extend(f"museum_cache_operations_total{_labels(namespace=namespace, result=result)} {count}"
+                 for (namespace, result), count in sorted(cache.stats().items()))
+
+    tickets_today, restorations_in_progress = business.read()
+    lines += [
+        "# HELP museum_tickets_sold_today Tickets dated today",
+        "# TYPE museum_tickets_sold_today gauge",
+        f"museum_tickets_sold_today {tickets_today}",
+        "# HELP museum_restorations_in_progress Restorations that are not finished",
+        "# TYPE museum_restorations_in_progress gauge",
+        f"museum_restorations_in_progress {restorations_in_progress}",
+    ]
+    return "\n".join(lines) + "\n"
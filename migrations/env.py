@@ -0,0 +1,43 @@
+# migrations/env.py
+from logging.config import fileConfig
+
+from alembic import context
+from sqlmodel import SQLModel
+
+import database
+import models  # noqa: F401 - registers the tables in SQLModel.metadata
+
+config = context.config
+
+# Logging is configured from alembic.ini only for command-line runs; the
+# application keeps its own logging when it runs migrations on startup
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = SQLModel.metadata
+
+
+def run_migrations_offline():
+    """Generate SQL for the migrations without connecting to the database"""
+    context.configure(
+        url=database.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Apply the migrations through the application engine"""
+    with database.engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
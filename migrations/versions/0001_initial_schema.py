@@ -0,0 +1,107 @@
+"""Initial schema, as previously created by SQLModel.metadata.create_all
+
+Databases created by create_all before migrations existed already have these
+tables; they are left untouched, so such databases upgrade in place.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-11-01
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_context().as_sql:
+        existing = set()
+    else:
+        existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    def create_table(name, *columns):
+        if name not in existing:
+            op.create_table(name, *columns)
+
+    create_table(
+        "employee",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("full_name", sa.String(length=255), nullable=False),
+        sa.Column("position", sa.String(length=100), nullable=False),
+        sa.Column("personnel_number", sa.String(length=50), nullable=False),
+        sa.Column("access_level", sa.String(length=50), nullable=False),
+    )
+    create_table(
+        "hall",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("number", sa.Integer(), nullable=True),
+        sa.Column("exposition_name", sa.String(length=255), nullable=True),
+        sa.Column("type", sa.String(length=50), nullable=False),
+    )
+    create_table(
+        "supply",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("number", sa.String(length=100), nullable=False, unique=True),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("supplier", sa.String(length=255), nullable=False),
+        sa.Column("employee_id", sa.Integer(), sa.ForeignKey("employee.id"), nullable=True),
+    )
+    create_table(
+        "ticket",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("number", sa.String(length=100), nullable=False, unique=True),
+        sa.Column("date_time", sa.DateTime(), nullable=False),
+        sa.Column("type", sa.String(length=50), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("payment_status", sa.String(length=50), nullable=False),
+    )
+    create_table(
+        "visitor",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("age", sa.Integer(), nullable=False),
+        sa.Column("phone", sa.String(length=50), nullable=True),
+        sa.Column("email", sa.String(length=255), nullable=True),
+        sa.Column("ticket_id", sa.Integer(), sa.ForeignKey("ticket.id"), nullable=True),
+    )
+    create_table(
+        "exhibit",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("inventory_number", sa.String(length=100), nullable=False, unique=True),
+        sa.Column("title", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("creation_date", sa.Date(), nullable=True),
+        sa.Column("author", sa.String(length=255), nullable=True),
+        sa.Column("condition", sa.String(length=100), nullable=True),
+        sa.Column("storage_location", sa.String(length=255), nullable=True),
+        sa.Column("hall_id", sa.Integer(), sa.ForeignKey("hall.id"), nullable=True),
+        sa.Column("supply_id", sa.Integer(), sa.ForeignKey("supply.id"), nullable=True),
+    )
+    create_table(
+        "movement",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("exhibit_id", sa.Integer(), sa.ForeignKey("exhibit.id"), nullable=False),
+        sa.Column("from_location", sa.String(length=255), nullable=True),
+        sa.Column("to_location", sa.String(length=255), nullable=True),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.Column("responsible_employee_id", sa.Integer(), sa.ForeignKey("employee.id"), nullable=True),
+        sa.Column("reason", sa.String(length=255), nullable=True),
+    )
+    create_table(
+        "restoration",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("exhibit_id", sa.Integer(), sa.ForeignKey("exhibit.id"), nullable=False),
+        sa.Column("start_date", sa.Date(), nullable=False),
+        sa.Column("end_date", sa.Date(), nullable=True),
+        sa.Column("executor", sa.String(length=255), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("status", sa.String(length=50), nullable=False),
+    )
+
+
+def downgrade():
+    for name in ("restoration", "movement", "exhibit", "visitor", "ticket", "supply", "hall", "employee"):
+        op.drop_table(name)
@@ -0,0 +1,45 @@
+"""Indexes for the foreign key and filter columns used by requests.py
+
+On PostgreSQL the indexes are built CONCURRENTLY, so existing tables stay
+writable while they are created.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-11-01
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns)
+INDEXES = [
+    ("ix_employee_position", "employee", ["position"]),
+    ("ix_hall_number", "hall", ["number"]),
+    ("ix_visitor_ticket_id", "visitor", ["ticket_id"]),
+    ("ix_exhibit_hall_id", "exhibit", ["hall_id"]),
+    ("ix_exhibit_supply_id", "exhibit", ["supply_id"]),
+    ("ix_movement_date", "movement", ["date"]),
+    ("ix_movement_exhibit_id_date", "movement", ["exhibit_id", "date"]),
+    ("ix_restoration_exhibit_id", "restoration", ["exhibit_id"]),
+]
+
+IN_PROGRESS = sa.text("status = 'in progress'")
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+        op.create_index("ix_restoration_in_progress", "restoration", ["exhibit_id"], if_not_exists=True,
+                        postgresql_concurrently=True, postgresql_where=IN_PROGRESS, sqlite_where=IN_PROGRESS)
+
+
+def downgrade():
+    op.drop_index("ix_restoration_in_progress", table_name="restoration")
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,25 @@
+"""Change counters for conditional GET (ETag) support
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-11-15
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "entity_version",
+        sa.Column("scope", sa.String(length=100), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("entity_version")
@@ -0,0 +1,69 @@
+"""Full-text search over exhibit title, author and description
+
+PostgreSQL only: a stored generated tsvector column (Russian stemming, title
+weighted above author above description) with a GIN index, and, when the
+pg_trgm extension can be installed, a trigram index over title and author for
+typo-tolerant search. Adding the generated column rewrites the exhibit table
+once; the indexes are built CONCURRENTLY. The column is not part of the
+Exhibit model, so it never appears in the API responses. Other databases fall
+back to substring search (see requests.search_exhibits) and need no schema change.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-12-01
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'C')"
+)
+# Must match requests.TRIGRAM_DOCUMENT, otherwise the index is not used
+TRIGRAM_DOCUMENT = "(coalesce(title, '') || ' ' || coalesce(author, ''))"
+
+
+def _install_pg_trgm() -> bool:
+    """Create the pg_trgm extension if the server has it; False if it is unavailable"""
+    if op.get_context().as_sql:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        return True
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first() is None:
+        return False
+    try:
+        with bind.begin_nested():
+            bind.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except sa.exc.DBAPIError:
+        # Not enough privileges: search works without typo tolerance
+        return False
+    return True
+
+
+def upgrade():
+    if op.get_context().dialect.name != "postgresql":
+        return
+    op.execute(f"ALTER TABLE exhibit ADD COLUMN IF NOT EXISTS search_vector tsvector "
+               f"GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED")
+    trigram = _install_pg_trgm()
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_exhibit_search_vector "
+                   "ON exhibit USING gin (search_vector)")
+        if trigram:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_exhibit_search_trigram "
+                       f"ON exhibit USING gin ({TRIGRAM_DOCUMENT} gin_trgm_ops)")
+
+
+def downgrade():
+    if op.get_context().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_exhibit_search_trigram")
+    op.execute("DROP INDEX IF EXISTS ix_exhibit_search_vector")
+    op.execute("ALTER TABLE exhibit DROP COLUMN IF EXISTS search_vector")
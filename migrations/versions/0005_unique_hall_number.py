@@ -0,0 +1,42 @@
+"""Unique hall numbers
+
+Halls are looked up by number (GET /exhibits/hall/{number}), so a number must
+identify one hall. The plain index from 0002 is replaced with a unique one,
+built CONCURRENTLY on PostgreSQL. Halls without a number are still allowed.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-12-10
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def _check_duplicates():
+    """Refuse to migrate while several halls share a number, naming them"""
+    if op.get_context().as_sql:
+        return
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT number FROM hall WHERE number IS NOT NULL GROUP BY number HAVING count(*) > 1 ORDER BY number"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(f"Hall numbers are not unique: {', '.join(map(str, duplicates))}. "
+                           f"Renumber these halls before upgrading.")
+
+
+def upgrade():
+    _check_duplicates()
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_hall_number", table_name="hall", postgresql_concurrently=True)
+        op.create_index("ix_hall_number", "hall", ["number"], unique=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_hall_number", table_name="hall", postgresql_concurrently=True)
+        op.create_index("ix_hall_number", "hall", ["number"], postgresql_concurrently=True)
@@ -0,0 +1,113 @@
+"""Monthly range partitioning of the movement table
+
+PostgreSQL only. The movement table is rebuilt as a table partitioned by
+month on "date":
+- One partition per month holding data, up to MONTHS_AHEAD months after the current one.
+- A default partition for rows outside them.
+
+The primary key becomes (id, date), since unique keys of a partitioned table
+must include the partition column; ids still come from the same sequence.
+Nothing in the database keeps id unique by itself any more: the application
+rejects explicit ids of new movements and checks the ids of CSV imports
+(requests.PARTITION_COLUMNS, copy_io.import_csv). Rows written by hand must
+take their id from movement_id_seq.
+The rows are copied into the new table, so the migration holds an exclusive
+lock on movement while it runs: plan it for a maintenance window on large
+databases. Later months are created with partitions.py.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-12-20
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# Same naming and horizon as partitions.py
+MONTHS_AHEAD = 3
+COLUMNS = "id, exhibit_id, from_location, to_location, date, responsible_employee_id, reason"
+
+
+def _partition_name(month: date) -> str:
+    return f"movement_y{month.year}m{month.month:02d}"
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _months() -> list:
+    """First days of the months to create: from the oldest movement to MONTHS_AHEAD months from now"""
+    current = date.today().replace(day=1)
+    first = current
+    if not op.get_context().as_sql:
+        oldest = op.get_bind().execute(sa.text("SELECT min(date) FROM movement")).scalar()
+        if oldest is not None:
+            first = min(first, oldest.date().replace(day=1))
+    months = []
+    month = first
+    while month <= _add_months(current, MONTHS_AHEAD):
+        months.append(month)
+        month = _add_months(month, 1)
+    return months
+
+
+def _create_table(partitioned: bool):
+    op.execute(f"""
+        CREATE TABLE movement (
+            id integer NOT NULL DEFAULT nextval('movement_id_seq'),
+            exhibit_id integer NOT NULL REFERENCES exhibit (id),
+            from_location varchar(255),
+            to_location varchar(255),
+            date timestamp without time zone NOT NULL,
+            responsible_employee_id integer REFERENCES employee (id),
+            reason varchar(255),
+            PRIMARY KEY ({"id, date" if partitioned else "id"})
+        ){" PARTITION BY RANGE (date)" if partitioned else ""}
+    """)
+
+
+def _replace_table(partitioned: bool):
+    """Rebuild movement with or without partitioning, keeping rows, ids and indexes"""
+    months = _months() if partitioned else []
+    op.execute("ALTER TABLE movement RENAME TO movement_previous")
+    op.execute("ALTER TABLE movement_previous RENAME CONSTRAINT movement_pkey TO movement_previous_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_movement_date")
+    op.execute("DROP INDEX IF EXISTS ix_movement_exhibit_id_date")
+    # Keep the id sequence when the old table is dropped
+    op.execute("ALTER SEQUENCE movement_id_seq OWNED BY NONE")
+
+    _create_table(partitioned)
+    op.execute("ALTER SEQUENCE movement_id_seq OWNED BY movement.id")
+    if partitioned:
+        op.execute("CREATE TABLE movement_default PARTITION OF movement DEFAULT")
+        for month in months:
+            op.execute(f"CREATE TABLE {_partition_name(month)} PARTITION OF movement "
+                       f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')")
+
+    op.execute(f"INSERT INTO movement ({COLUMNS}) SELECT {COLUMNS} FROM movement_previous")
+    op.execute("DROP TABLE movement_previous")
+    # Indexes on a partitioned table are created on every partition
+    op.execute("CREATE INDEX ix_movement_date ON movement (date)")
+    op.execute("CREATE INDEX ix_movement_exhibit_id_date ON movement (exhibit_id, date)")
+    op.execute("ANALYZE movement")
+
+
+def upgrade():
+    if op.get_context().dialect.name != "postgresql":
+        return
+    _replace_table(partitioned=True)
+
+
+def downgrade():
+    if op.get_context().dialect.name != "postgresql":
+        return
+    # Detached partitions (archived months) are not part of movement and stay as they are
+    _replace_table(partitioned=False)
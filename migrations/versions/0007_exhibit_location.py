@@ -0,0 +1,46 @@
+"""Current location projection of exhibits
+
+exhibit_location keeps one row per exhibit: the destination of its latest
+movement, or its storage_location if it never moved. The write functions of
+requests.py keep it up to date; this migration fills it from the history.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-01-10
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+# Same rule as requests.refresh_locations
+FILL_LOCATIONS = """
+    INSERT INTO exhibit_location (exhibit_id, location, movement_id, moved_at)
+    SELECT exhibit.id, coalesce(latest.to_location, exhibit.storage_location), latest.id, latest.date
+    FROM exhibit
+    LEFT JOIN (
+        SELECT exhibit_id, id, to_location, date,
+               row_number() OVER (PARTITION BY exhibit_id ORDER BY date DESC, id DESC) AS position
+        FROM movement
+    ) AS latest ON latest.exhibit_id = exhibit.id AND latest.position = 1
+"""
+
+
+def upgrade():
+    op.create_table(
+        "exhibit_location",
+        sa.Column("exhibit_id", sa.Integer(), sa.ForeignKey("exhibit.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("location", sa.String(length=255), nullable=True),
+        sa.Column("movement_id", sa.Integer(), nullable=True),
+        sa.Column("moved_at", sa.DateTime(), nullable=True),
+    )
+    op.execute(FILL_LOCATIONS)
+    op.create_index("ix_exhibit_location_location", "exhibit_location", ["location", "exhibit_id"])
+
+
+def downgrade():
+    op.drop_index("ix_exhibit_location_location", table_name="exhibit_location")
+    op.drop_table("exhibit_location")
@@ -0,0 +1,45 @@
+"""Ticket numbering and idempotency keys for POST /tickets/sell
+
+- ticket_number_seq (PostgreSQL): numbers of sold tickets. Sequences are not
+  transactional, so concurrent sales never wait for each other to get numbers.
+- number_sequence: the same counter on databases without sequences.
+- idempotency_key: the response of each sale sent with an Idempotency-Key
+  header, replayed when the client retries the request.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-01-24
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_context().dialect.name == "postgresql":
+        op.execute("CREATE SEQUENCE IF NOT EXISTS ticket_number_seq")
+    op.create_table(
+        "number_sequence",
+        sa.Column("name", sa.String(length=100), primary_key=True),
+        sa.Column("value", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "idempotency_key",
+        sa.Column("key", sa.String(length=255), primary_key=True),
+        sa.Column("request_hash", sa.String(length=64), nullable=False),
+        sa.Column("response", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_idempotency_key_created_at", "idempotency_key", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_idempotency_key_created_at", table_name="idempotency_key")
+    op.drop_table("idempotency_key")
+    op.drop_table("number_sequence")
+    if op.get_context().dialect.name == "postgresql":
+        op.execute("DROP SEQUENCE IF EXISTS ticket_number_seq")
@@ -0,0 +1,108 @@
+"""Daily sales rollup of the ticket table
+
+daily_sales holds tickets sold and revenue per (day, type, payment_status).
+Triggers on ticket append every change to daily_sales_delta instead of
+updating daily_sales directly, so concurrent sales never wait on the same
+rollup row; requests.fold_daily_sales moves the journal into daily_sales.
+On PostgreSQL the triggers are statement-level with transition tables: a
+multi-row INSERT or a COPY adds one journal row per (day, type, status),
+not one per ticket. SQLite only has row-level triggers.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-02-07
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+POSTGRESQL_JOURNAL = """
+    CREATE OR REPLACE FUNCTION daily_sales_journal() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO daily_sales_delta (day, type, payment_status, tickets_count, revenue)
+            SELECT date_time::date, type, payment_status, -count(*), -sum(price)
+            FROM old_tickets GROUP BY 1, 2, 3;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO daily_sales_delta (day, type, payment_status, tickets_count, revenue)
+            SELECT date_time::date, type, payment_status, count(*), sum(price)
+            FROM new_tickets GROUP BY 1, 2, 3;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+# A trigger with transition tables can only handle one kind of event
+POSTGRESQL_TRIGGERS = {
+    "ticket_daily_sales_insert": "AFTER INSERT ON ticket REFERENCING NEW TABLE AS new_tickets",
+    "ticket_daily_sales_update": "AFTER UPDATE ON ticket REFERENCING OLD TABLE AS old_tickets NEW TABLE AS new_tickets",
+    "ticket_daily_sales_delete": "AFTER DELETE ON ticket REFERENCING OLD TABLE AS old_tickets",
+}
+
+SQLITE_OLD = ("INSERT INTO daily_sales_delta (day, type, payment_status, tickets_count, revenue) "
+              "VALUES (date(OLD.date_time), OLD.type, OLD.payment_status, -1, -OLD.price);")
+SQLITE_NEW = ("INSERT INTO daily_sales_delta (day, type, payment_status, tickets_count, revenue) "
+              "VALUES (date(NEW.date_time), NEW.type, NEW.payment_status, 1, NEW.price);")
+SQLITE_TRIGGERS = {
+    "ticket_daily_sales_insert": ("AFTER INSERT ON ticket", SQLITE_NEW),
+    "ticket_daily_sales_update": ("AFTER UPDATE ON ticket", SQLITE_OLD + " " + SQLITE_NEW),
+    "ticket_daily_sales_delete": ("AFTER DELETE ON ticket", SQLITE_OLD),
+}
+
+# Same rule as requests.daily_sales_rebuild_statements
+FILL_DAILY_SALES = """
+    INSERT INTO daily_sales (day, type, payment_status, tickets_count, revenue)
+    SELECT {day}, type, payment_status, count(*), sum(price)
+    FROM ticket
+    GROUP BY {day}, type, payment_status
+"""
+
+
+def upgrade():
+    dialect = op.get_context().dialect.name
+    op.create_table(
+        "daily_sales",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("type", sa.String(length=50), primary_key=True),
+        sa.Column("payment_status", sa.String(length=50), primary_key=True),
+        sa.Column("tickets_count", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Float(), nullable=False),
+    )
+    op.create_table(
+        "daily_sales_delta",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("type", sa.String(length=50), nullable=False),
+        sa.Column("payment_status", sa.String(length=50), nullable=False),
+        sa.Column("tickets_count", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_daily_sales_delta_day", "daily_sales_delta", ["day"])
+
+    if dialect == "postgresql":
+        # The table is locked so that no sale is both counted by the backfill and journaled
+        op.execute("LOCK TABLE ticket IN SHARE MODE")
+        op.execute(FILL_DAILY_SALES.format(day="date_time::date"))
+        op.execute(POSTGRESQL_JOURNAL)
+        for name, event in POSTGRESQL_TRIGGERS.items():
+            op.execute(f"CREATE TRIGGER {name} {event} FOR EACH STATEMENT EXECUTE FUNCTION daily_sales_journal()")
+    elif dialect == "sqlite":
+        op.execute(FILL_DAILY_SALES.format(day="date(date_time)"))
+        for name, (event, body) in SQLITE_TRIGGERS.items():
+            op.execute(f"CREATE TRIGGER {name} {event} FOR EACH ROW BEGIN {body} END")
+
+
+def downgrade():
+    dialect = op.get_context().dialect.name
+    for name in POSTGRESQL_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}" + (" ON ticket" if dialect == "postgresql" else ""))
+    if dialect == "postgresql":
+        op.execute("DROP FUNCTION IF EXISTS daily_sales_journal()")
+    op.drop_index("ix_daily_sales_delta_day", table_name="daily_sales_delta")
+    op.drop_table("daily_sales_delta")
+    op.drop_table("daily_sales")
@@ -0,0 +1,25 @@
+"""Index on ticket.date_time for the period filter of /statistics/visitors
+
+Built CONCURRENTLY on PostgreSQL, so ticket sales continue while it is created.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-02-15
+"""
+from alembic import op
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index("ix_ticket_date_time", "ticket", ["date_time"], if_not_exists=True,
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index("ix_ticket_date_time", table_name="ticket")
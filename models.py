@@ -1,12 +1,15 @@
 # models.py
-from sqlmodel import SQLModel, Field, Relationship
+from sqlmodel import SQLModel, Field, Relationship, Index, text
 from typing import Optional, List
 from datetime import datetime, date
 
+# Status of a restoration that is still in progress
+ACTIVE_RESTORATION_STATUS = "in progress"
+
 class Employee(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     full_name: str = Field(max_length=255)
-    position: str = Field(max_length=100)
+    position: str = Field(max_length=100, index=True)
     personnel_number: str = Field(max_length=50)
     access_level: str = Field(default="user", max_length=50)
 
@@ -17,7 +20,7 @@ class Employee(SQLModel, table=True):
 
 class Hall(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    number: Optional[int] = None
+    number: Optional[int] = Field(default=None, unique=True, index=True)
     exposition_name: Optional[str] = Field(default=None, max_length=255)
     type: str = Field(default="hall", max_length=50)
 
@@ -40,7 +43,7 @@ class Supply(SQLModel, table=True):
 class Ticket(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     number: str = Field(unique=True, max_length=100)
-    date_time: datetime = Field(default_factory=datetime.now)
+    date_time: datetime = Field(default_factory=datetime.now, index=True)
     type: str = Field(max_length=50)
     price: float = Field(ge=0)
     payment_status: str = Field(default="not paid", max_length=50)
@@ -55,12 +58,23 @@ class Visitor(SQLModel, table=True):
     age: int = Field(ge=0)
     phone: Optional[str] = Field(default=None, max_length=50)
     email: Optional[str] = Field(default=None, max_length=255)
-    ticket_id: Optional[int] = Field(default=None, foreign_key="ticket.id")
+    ticket_id: Optional[int] = Field(default=None, foreign_key="ticket.id", index=True)
 
     # Relationships
     ticket: Optional[Ticket] = Relationship(back_populates="visitor")
 
 
+class VisitorWithTicket(SQLModel):
+    """Visitor with the ticket embedded, as returned by GET /visitors/with-tickets"""
+    id: int
+    name: str
+    age: int
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    ticket_id: Optional[int] = None
+    ticket: Optional[Ticket] = None
+
+
 class Exhibit(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     inventory_number: str = Field(unique=True, max_length=100)
@@ -70,8 +84,8 @@ class Exhibit(SQLModel, table=True):
     author: Optional[str] = Field(default=None, max_length=255)
     condition: Optional[str] = Field(default=None, max_length=100)
     storage_location: Optional[str] = Field(default=None, max_length=255)
-    hall_id: Optional[int] = Field(default=None, foreign_key="hall.id")
-    supply_id: Optional[int] = Field(default=None, foreign_key="supply.id")
+    hall_id: Optional[int] = Field(default=None, foreign_key="hall.id", index=True)
+    supply_id: Optional[int] = Field(default=None, foreign_key="supply.id", index=True)
 
     # Relationships
     hall: Optional[Hall] = Relationship(back_populates="exhibits")
@@ -81,11 +95,20 @@ class Exhibit(SQLModel, table=True):
 
 
 class Movement(SQLModel, table=True):
+    __table_args__ = (
+        # Movement history of an exhibit in date order
+        Index("ix_movement_exhibit_id_date", "exhibit_id", "date"),
+    )
+
+    # On PostgreSQL the primary key of the partitioned table is (id, date)
+    # (migration 0006). The model keeps id alone: ids come from one sequence and
+    # the write paths never let an explicit id create a second row (see
+    # requests.PARTITION_COLUMNS), so db.get and updates by id stay correct
     id: Optional[int] = Field(default=None, primary_key=True)
     exhibit_id: int = Field(foreign_key="exhibit.id")
     from_location: Optional[str] = Field(default=None, max_length=255)
     to_location: Optional[str] = Field(default=None, max_length=255)
-    date: datetime = Field(default_factory=datetime.now)
+    date: datetime = Field(default_factory=datetime.now, index=True)
     responsible_employee_id: Optional[int] = Field(default=None, foreign_key="employee.id")
     reason: Optional[str] = Field(default=None, max_length=255)
 
@@ -95,13 +118,79 @@ class Movement(SQLModel, table=True):
 
 
 class Restoration(SQLModel, table=True):
+    __table_args__ = (
+        # Only unfinished restorations are ever looked up by status
+        Index("ix_restoration_in_progress", "exhibit_id",
+              postgresql_where=text(f"status = '{ACTIVE_RESTORATION_STATUS}'"),
+              sqlite_where=text(f"status = '{ACTIVE_RESTORATION_STATUS}'")),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    exhibit_id: int = Field(foreign_key="exhibit.id")
+    exhibit_id: int = Field(foreign_key="exhibit.id", index=True)
     start_date: date
     end_date: Optional[date] = None
     executor: Optional[str] = Field(default=None, max_length=255)
     description: Optional[str] = None
-    status: str = Field(default="in progress", max_length=50)
+    status: str = Field(default=ACTIVE_RESTORATION_STATUS, max_length=50)
 
     # Relationships
-    exhibit: Exhibit = Relationship(back_populates="restorations")
\ No newline at end of file
+    exhibit: Exhibit = Relationship(back_populates="restorations")
+
+class EntityVersion(SQLModel, table=True):
+    """Change counter of a group of rows, bumped by the write functions (used for ETags)"""
+    __tablename__ = "entity_version"
+
+    scope: str = Field(primary_key=True, max_length=100)
+    version: int = Field(default=0)
+
+class ExhibitLocation(SQLModel, table=True):
+    """Current location of an exhibit (latest movement, else storage_location), kept by requests.py"""
+    __tablename__ = "exhibit_location"
+    __table_args__ = (
+        # Exhibits at a location in id order (keyset pagination)
+        Index("ix_exhibit_location_location", "location", "exhibit_id"),
+    )
+
+    exhibit_id: int = Field(primary_key=True, foreign_key="exhibit.id", ondelete="CASCADE")
+    location: Optional[str] = Field(default=None, max_length=255)
+    # Latest movement of the exhibit, None if the location comes from storage_location
+    movement_id: Optional[int] = None
+    moved_at: Optional[datetime] = None
+
+class IdempotencyKey(SQLModel, table=True):
+    """Stored response of a request sent with an Idempotency-Key header, replayed on retries"""
+    __tablename__ = "idempotency_key"
+
+    key: str = Field(primary_key=True, max_length=255)
+    # Hash of the request body: a key reused for another request is rejected
+    request_hash: str = Field(max_length=64)
+    response: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now, index=True)
+
+class NumberSequence(SQLModel, table=True):
+    """Counter handing out blocks of numbers on databases without sequences (see requests.allocate_numbers)"""
+    __tablename__ = "number_sequence"
+
+    name: str = Field(primary_key=True, max_length=100)
+    value: int = Field(default=0)
+
+class DailySales(SQLModel, table=True):
+    """Tickets sold and revenue per day, type and payment status (see rollups.py)"""
+    __tablename__ = "daily_sales"
+
+    day: date = Field(primary_key=True)
+    type: str = Field(primary_key=True, max_length=50)
+    payment_status: str = Field(primary_key=True, max_length=50)
+    tickets_count: int = 0
+    revenue: float = 0
+
+class DailySalesDelta(SQLModel, table=True):
+    """Change of daily_sales written by the ticket triggers, not yet folded into it"""
+    __tablename__ = "daily_sales_delta"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: date = Field(index=True)
+    type: str = Field(max_length=50)
+    payment_status: str = Field(max_length=50)
+    tickets_count: int
+    revenue: float
@@ -0,0 +1,174 @@
+# partitions.py
+# Monthly partitions of the movement table on PostgreSQL (migration 0006).
+#
+# Range queries on movement.date only read the partitions of the requested
+# months. Rows outside the created months land in movement_default, so inserts
+# never fail; creating a month moves its rows out of the default partition.
+# Old months are archived by detaching them: the partition becomes a plain
+# table that can be dumped and dropped without touching the live table.
+#
+#   python partitions.py list
+#   python partitions.py create --months-ahead 3          (monthly, e.g. from cron)
+#   python partitions.py create --from 2020-01 --to 2020-12
+#   python partitions.py detach --before 2023-01 [--drop]
+import argparse
+import re
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+
+import database
+
+PARTITIONED_TABLE = "movement"
+DEFAULT_PARTITION = "movement_default"
+# How many months after the current one get their partition in advance
+MONTHS_AHEAD = 3
+
+
+# ====== MONTHS ======
+
+def month_start(value) -> date:
+    """First day of the month of a date or datetime"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    """First day of the month that is the given number of months away"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Name of the partition holding the given month"""
+    return f"{PARTITIONED_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def _parse_month(value: str) -> date:
+    """Parse YYYY-MM (or a full date) from the command line"""
+    return month_start(date.fromisoformat(value + "-01" if len(value) == 7 else value))
+
+
+# ====== PARTITION MANAGEMENT ======
+
+def is_partitioned(connection) -> bool:
+    """Whether movement is a partitioned table in this database"""
+    if connection.dialect.name != "postgresql":
+        return False
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+    ), {"table": PARTITIONED_TABLE}).scalar()
+
+
+def list_partitions(connection) -> List[dict]:
+    """Partitions of movement with their bounds and estimated row counts"""
+    rows = connection.execute(text("""
+        SELECT child.relname AS name,
+               pg_get_expr(child.relpartbound, child.oid) AS bounds,
+               greatest(child.reltuples, 0)::bigint AS estimated_rows
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(:table)
+        ORDER BY child.relname
+    """), {"table": PARTITIONED_TABLE})
+    return [dict(row._mapping) for row in rows]
+
+
+def create_partition(connection, month: date) -> bool:
+    """Create the partition of a month; False if it already exists"""
+    name = partition_name(month)
+    if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return False
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    # Rows of this month already in the default partition are moved into the
+    # new table before it is attached, otherwise attaching fails
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {PARTITIONED_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    connection.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), {"start": start, "end": end})
+    connection.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} ATTACH PARTITION {name} "
+                            f"FOR VALUES FROM ('{start}') TO ('{end}')"))
+    return True
+
+
+def create_partitions(connection, first: date, last: date) -> List[str]:
+    """Create the missing partitions of the months from first to last; returns their names"""
+    created = []
+    month = month_start(first)
+    while month <= month_start(last):
+        if create_partition(connection, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_partitions(connection, months_ahead: int = MONTHS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """Create the partitions of the current month and the next months_ahead months"""
+    current = month_start(today or date.today())
+    return create_partitions(connection, current, add_months(current, months_ahead))
+
+
+def detach_partitions(connection, before: date, drop: bool = False) -> List[str]:
+    """Detach (and optionally drop) the partitions of the months before the given one"""
+    detached = []
+    for partition in list_partitions(connection):
+        name = partition["name"]
+        # Only monthly partitions named by partition_name(); never the default one
+        match = re.fullmatch(rf"{PARTITIONED_TABLE}_y(\d{{4}})m(\d{{2}})", name)
+        if not match or date(int(match[1]), int(match[2]), 1) >= month_start(before):
+            continue
+        connection.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {name}"))
+        if drop:
+            connection.execute(text(f"DROP TABLE {name}"))
+        detached.append(name)
+    return detached
+
+
+# ====== COMMAND LINE ======
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monthly partitions of the movement table")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="show partitions with estimated row counts")
+
+    create = commands.add_parser("create", help="create missing monthly partitions")
+    create.add_argument("--from", dest="first", type=_parse_month, default=None,
+                        help="first month (YYYY-MM), default: the current month")
+    create.add_argument("--to", dest="last", type=_parse_month, default=None,
+                        help="last month (YYYY-MM), default: --months-ahead after the current month")
+    create.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+
+    detach = commands.add_parser("detach", help="detach the partitions of old months for archiving")
+    detach.add_argument("--before", type=_parse_month, required=True, help="first month to keep (YYYY-MM)")
+    detach.add_argument("--drop", action="store_true", help="drop the detached tables instead of keeping them")
+
+    args = parser.parse_args(argv)
+    with database.engine.begin() as connection:
+        if not is_partitioned(connection):
+            raise SystemExit("movement is not partitioned: PostgreSQL with migration 0006 is required")
+
+        if args.command == "list":
+            for partition in list_partitions(connection):
+                print(f"{partition['name']:<24} {partition['estimated_rows']:>12}  {partition['bounds']}")
+            return
+
+        if args.command == "create":
+            current = month_start(date.today())
+            first = args.first or current
+            last = args.last or add_months(current, args.months_ahead)
+            names = create_partitions(connection, first, last)
+            print(f"✅ Created {len(names)} partitions" + (f": {', '.join(names)}" if names else ""))
+            return
+
+        names = detach_partitions(connection, args.before, args.drop)
+        action = "Dropped" if args.drop else "Detached"
+        print(f"✅ {action} {len(names)} partitions" + (f": {', '.join(names)}" if names else ""))
+
+
+if __name__ == "__main__":
+    main()
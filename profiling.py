@@ -0,0 +1,159 @@
+# profiling.py
+# Per-request SQL profiling: engine event hooks count the statements and the time
+# spent in the database for the request that issued them, the ASGI middleware
+# reports the numbers in Server-Timing / X-Query-Count headers and remembers
+# the slow requests for /debug/slow. Streamed responses (NDJSON, CSV export,
+# receipts) run their queries after the headers are sent, so they get no
+# headers; their totals only appear in the slow request log.
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import event
+
+# Profile requests and add the timing headers. Off by default with APP_MODE=prod:
+# /debug/slow shows SQL text and route timings without authentication
+PROFILE_REQUESTS = os.getenv(
+    "PROFILE_REQUESTS", "false" if os.getenv("APP_MODE", "dev") == "prod" else "true"
+).strip().lower() in ("1", "true", "yes", "on")
+# Requests slower than this are kept for /debug/slow
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+# How many slow requests are kept (the oldest are dropped first)
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", "100"))
+# Statements are cut to this length in the slow request log
+MAX_STATEMENT_LENGTH = 1000
+
+
+class RequestStats:
+    """Database work done while serving one request"""
+
+    __slots__ = ("queries", "db_seconds", "slowest_seconds", "slowest_statement")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement = None
+
+    def add(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_seconds += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+
+# Stats of the request being served; the threadpool running sync routes copies
+# the context, so statements run there land in the same object
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+_slow_requests = deque(maxlen=SLOW_REQUEST_BUFFER)
+_slow_requests_lock = threading.Lock()
+
+
+# ====== ENGINE HOOKS ======
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add(statement, time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def install_query_hooks(engine):
+    """Attach the statement timing hooks to a (sync) engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ====== MIDDLEWARE ======
+
+class ProfilingMiddleware:
+    """ASGI middleware adding Server-Timing and X-Query-Count headers to HTTP responses with a known length"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status = None
+        streamed = False
+
+        async def send_with_timing(message):
+            nonlocal status, streamed
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                # A body without Content-Length (other than a bodiless 204/304) is
+                # streamed, and its queries have not run yet
+                if status not in (204, 304) and not any(name.lower() == b"content-length" for name, _ in headers):
+                    streamed = True
+                    await send(message)
+                    return
+                total_ms = (time.perf_counter() - started) * 1000
+                db_ms = stats.db_seconds * 1000
+                headers.append((b"server-timing",
+                                f'db;dur={db_ms:.1f};desc="{stats.queries} queries", app;dur={total_ms:.1f}'.encode()))
+                headers.append((b"x-query-count", str(stats.queries).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception:
+            status = status or 500
+            raise
+        finally:
+            _request_stats.reset(token)
+            total_ms = (time.perf_counter() - started) * 1000
+            if total_ms >= SLOW_REQUEST_MS:
+                _record_slow_request(scope, status, total_ms, stats, streamed)
+
+
+def _record_slow_request(scope, status: Optional[int], total_ms: float, stats: RequestStats, streamed: bool):
+    statement = stats.slowest_statement
+    if statement and len(statement) > MAX_STATEMENT_LENGTH:
+        statement = statement[:MAX_STATEMENT_LENGTH] + "..."
+    query_string = scope.get("query_string", b"").decode("latin-1")
+    with _slow_requests_lock:
+        _slow_requests.append({
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "method": scope["method"],
+            "path": scope["path"] + (f"?{query_string}" if query_string else ""),
+            "status": status,
+            "streamed": streamed,
+            "duration_ms": round(total_ms, 1),
+            "queries": stats.queries,
+            "db_ms": round(stats.db_seconds * 1000, 1),
+            "slowest_query_ms": round(stats.slowest_seconds * 1000, 1),
+            "slowest_query": statement,
+        })
+
+
+def get_slow_requests() -> List[dict]:
+    """Recent requests slower than SLOW_REQUEST_MS, the slowest first"""
+    with _slow_requests_lock:
+        requests = list(_slow_requests)
+    return sorted(requests, key=lambda request: request["duration_ms"], reverse=True)
@@ -1,8 +1,227 @@
 # requests.py
-from sqlmodel import select, Session
+from sqlmodel import select, Session, func, insert, update, delete
+from sqlalchemy import Date, Integer, and_, bindparam, case, cast, column, literal, literal_column, or_, table, text, true, tuple_, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+from pydantic import ValidationError
+from metrics import business
+from cache import cache, MISS
 from models import *
-from typing import List, Optional
-from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+import hashlib
+import json
+
+
+# Keyset pagination defaults for list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Rows fetched per round trip when streaming through a server-side cursor
+STREAM_BATCH_SIZE = 1000
+# Largest number of items accepted by one bulk request
+MAX_BULK_SIZE = 10000
+# Deepest page of the offset-paginated endpoints (search, exhibit query)
+MAX_PAGE_OFFSET = 10000
+
+# Natural keys used to upsert rows in bulk; other tables upsert by id
+UPSERT_KEYS = {
+    Exhibit: "inventory_number",
+    Supply: "number",
+    Ticket: "number",
+}
+
+# Partition column of the tables partitioned on PostgreSQL (migration 0006);
+# their primary key there is (id, partition column), so the database no longer
+# keeps id unique by itself. The models and the code still treat id alone as
+# the key (db.get, updates and deletes by id, exhibit_location.movement_id):
+# new rows always take their id from the sequence, and an explicit id may only
+# address an existing row (see _partitioned_rows)
+PARTITION_COLUMNS = {
+    Movement: "date",
+}
+
+
+def _is_partitioned(db: Session, model) -> bool:
+    """Whether the table of a model is partitioned, i.e. its ids are unique only by convention"""
+    return model in PARTITION_COLUMNS and db.get_bind().dialect.name == "postgresql"
+
+# Cache namespaces holding rows of each table (see cache.py)
+CACHE_NAMESPACES = {
+    Employee: ("employees_position",),
+    Exhibit: ("exhibit", "exhibit_inventory"),
+    Hall: ("hall", "halls"),
+}
+
+
+# ====== CHANGE VERSIONS ======
+# Write functions bump the version of the scopes they change in the same
+# transaction; read routes build their ETag from these versions, so an
+# unchanged resource is answered with 304 without reading its rows.
+
+# GET /restorations/current
+RESTORATION_SCOPE = "restoration"
+# Bumped by writes that may change any hall (bulk writes, CSV imports)
+ALL_HALLS_SCOPE = "hall:*"
+
+
+def hall_scope(hall_number) -> str:
+    """Version scope of GET /exhibits/hall/{hall_number}"""
+    return f"hall:{hall_number}"
+
+
+def bump_versions(db: Session, scopes):
+    """Increment the versions of the given scopes as part of the current transaction"""
+    # Sorted, so that concurrent writers lock the version rows in the same order
+    rows = [{"scope": scope} for scope in sorted(set(scopes))]
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        raise ValueError(f"Version tracking is not supported for the '{dialect}' database")
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    table = EntityVersion.__table__
+    statement = dialect_insert(table).values(version=1)
+    statement = statement.on_conflict_do_update(index_elements=[table.c.scope],
+                                                set_={"version": table.c.version + 1})
+    db.exec(statement, params=rows)
+
+
+def get_versions(db: Session, scopes: List[str]) -> Dict[str, int]:
+    """Get the versions of the given scopes (0 for scopes never changed)"""
+    statement = select(EntityVersion).where(EntityVersion.scope.in_(scopes))
+    versions = {row.scope: row.version for row in db.exec(statement)}
+    return {scope: versions.get(scope, 0) for scope in scopes}
+
+
+def _hall_scopes(db: Session, hall_ids) -> List[str]:
+    """Version scopes of the halls with the given ids"""
+    hall_ids = {hall_id for hall_id in hall_ids if hall_id is not None}
+    if not hall_ids:
+        return []
+    numbers = db.exec(select(Hall.number).where(Hall.id.in_(hall_ids))).all()
+    return [hall_scope(number) for number in numbers]
+
+
+# ====== CURRENT LOCATIONS ======
+# exhibit_location holds one row per exhibit: the destination of its latest
+# movement (by date, then id), or its storage_location if it never moved.
+# Write functions touching exhibits or movements update it in the same
+# transaction, so location reads are a primary key or index lookup.
+
+def _latest_movements(exhibit_ids: Optional[List[int]] = None):
+    """Subquery ranking the movements of each exhibit, the latest one first"""
+    position = func.row_number().over(partition_by=Movement.exhibit_id,
+                                      order_by=(Movement.date.desc(), Movement.id.desc()))
+    statement = select(Movement.exhibit_id, Movement.id, Movement.to_location, Movement.date,
+                       position.label("position"))
+    if exhibit_ids is not None:
+        statement = statement.where(Movement.exhibit_id.in_(exhibit_ids))
+    return statement.subquery("latest")
+
+
+def location_refresh_statements(exhibit_ids: Optional[List[int]] = None) -> list:
+    """DELETE and INSERT ... SELECT recomputing the locations of some exhibits (all if None)"""
+    latest = _latest_movements(exhibit_ids)
+    source = (select(Exhibit.id, func.coalesce(latest.c.to_location, Exhibit.storage_location),
+                     latest.c.id, latest.c.date)
+              .outerjoin(latest, and_(latest.c.exhibit_id == Exhibit.id, latest.c.position == 1)))
+    clear = delete(ExhibitLocation)
+    if exhibit_ids is not None:
+        source = source.where(Exhibit.id.in_(exhibit_ids))
+        clear = clear.where(ExhibitLocation.exhibit_id.in_(exhibit_ids))
+    fill = insert(ExhibitLocation).from_select(["exhibit_id", "location", "movement_id", "moved_at"], source)
+    return [clear, fill]
+
+
+def refresh_locations(db: Session, exhibit_ids: Optional[List[int]] = None):
+    """Recompute the current locations of some exhibits (all if None) in the current transaction"""
+    if exhibit_ids is not None:
+        exhibit_ids = sorted({exhibit_id for exhibit_id in exhibit_ids if exhibit_id is not None})
+        if not exhibit_ids:
+            return
+    for statement in location_refresh_statements(exhibit_ids):
+        db.exec(statement)
+
+
+def _move_location(db: Session, movement: Movement):
+    """Apply a new movement to the current location of its exhibit"""
+    # The row lock serializes concurrent movements of the same exhibit
+    statement = (select(ExhibitLocation)
+                 .where(ExhibitLocation.exhibit_id == movement.exhibit_id)
+                 .with_for_update())
+    current = db.exec(statement).first()
+    if current is None or movement.to_location is None:
+        refresh_locations(db, [movement.exhibit_id])
+    elif current.moved_at is None or (movement.date, movement.id) > (current.moved_at, current.movement_id):
+        current.location = movement.to_location
+        current.movement_id = movement.id
+        current.moved_at = movement.date
+    # An older movement (entered after the fact) does not change the location
+
+
+def _location_exhibit_ids(model, rows) -> List[int]:
+    """Exhibits whose current location a bulk write of these rows (dicts) may change"""
+    if model is Exhibit:
+        return [row.get("id") for row in rows]
+    if model is Movement:
+        return [row.get("exhibit_id") for row in rows]
+    return []
+
+
+def get_exhibit_location(db: Session, exhibit_id: int) -> Optional[ExhibitLocation]:
+    """Get the current location of an exhibit"""
+    return db.get(ExhibitLocation, exhibit_id)
+
+
+def _exhibits_at_location_statement(location: str, limit: int, after: Optional[int]):
+    """Build a query for one page of the exhibits now at a location, ordered by id"""
+    statement = (select(Exhibit)
+                 .join(ExhibitLocation, ExhibitLocation.exhibit_id == Exhibit.id)
+                 .where(ExhibitLocation.location == location)
+                 .order_by(ExhibitLocation.exhibit_id)
+                 .limit(limit))
+    if after is not None:
+        statement = statement.where(ExhibitLocation.exhibit_id > after)
+    return statement
+
+
+def get_exhibits_at_location(db: Session, location: str, limit: int = DEFAULT_PAGE_SIZE,
+                             after: Optional[int] = None) -> List[Exhibit]:
+    """Get one page of the exhibits now at a location (keyset pagination on id)"""
+    return db.exec(_exhibits_at_location_statement(location, limit, after)).all()
+
+
+# ====== PAGINATION HELPERS ======
+
+def _page_statement(model, limit: int, after: Optional[int]):
+    """Build a query for one page of rows ordered by id, starting after the given id"""
+    statement = select(model).order_by(model.id).limit(limit)
+    if after is not None:
+        statement = statement.where(model.id > after)
+    return statement
+
+
+def _stream_statement(model, after: Optional[int]):
+    """Build a query over all rows ordered by id, fetched through a server-side cursor"""
+    statement = (select(model)
+                 .order_by(model.id)
+                 .execution_options(yield_per=STREAM_BATCH_SIZE))
+    if after is not None:
+        statement = statement.where(model.id > after)
+    return statement
+
+
+def _get_page(db: Session, model, limit: int, after: Optional[int]) -> list:
+    """Get one page of rows ordered by id, starting after the given id"""
+    results = db.exec(_page_statement(model, limit, after))
+    return results.all()
+
+
+def _stream_rows(db: Session, model, after: Optional[int]) -> Iterator:
+    """Iterate over all rows ordered by id using a server-side cursor"""
+    for row in db.exec(_stream_statement(model, after)):
+        yield row
 
 
 # ====== EMPLOYEE OPERATIONS ======
@@ -21,17 +240,21 @@ def get_employee_by_id(db: Session, employee_id: int) -> Optional[Employee]:
 
 def get_employees_by_position(db: Session, position: str) -> List[Employee]:
     """Get employees by position"""
-    statement = select(Employee).where(Employee.position == position)
-    results = db.exec(statement)
-    return results.all()
+    employees = cache.get("employees_position", position, Employee)
+    if employees is MISS:
+        statement = select(Employee).where(Employee.position == position)
+        employees = db.exec(statement).all()
+        cache.set("employees_position", position, employees)
+    return employees
 
 
 def create_employee(db: Session, employee_data: dict) -> Employee:
     """Create new employee"""
-    employee = Employee(**employee_data)
+    employee = Employee.model_validate(employee_data)
     db.add(employee)
     db.commit()
     db.refresh(employee)
+    cache.invalidate("employees_position", employee.position)
     return employee
 
 
@@ -39,10 +262,12 @@ def update_employee(db: Session, employee_id: int, update_data: dict) -> Optiona
     """Update employee data"""
     employee = db.get(Employee, employee_id)
     if employee:
+        old_position = employee.position
         for key, value in update_data.items():
             setattr(employee, key, value)
         db.commit()
         db.refresh(employee)
+        cache.invalidate("employees_position", old_position, employee.position)
     return employee
 
 
@@ -50,37 +275,52 @@ def delete_employee(db: Session, employee_id: int) -> bool:
     """Delete employee"""
     employee = db.get(Employee, employee_id)
     if employee:
+        position = employee.position
         db.delete(employee)
         db.commit()
+        cache.invalidate("employees_position", position)
         return True
     return False
 
 
 # ====== EXHIBIT OPERATIONS ======
 
-def get_all_exhibits(db: Session) -> List[Exhibit]:
-    """Get all exhibits"""
-    statement = select(Exhibit)
-    results = db.exec(statement)
-    return results.all()
+def get_all_exhibits(db: Session, limit: int = DEFAULT_PAGE_SIZE, after: Optional[int] = None) -> List[Exhibit]:
+    """Get one page of exhibits (keyset pagination on id)"""
+    return _get_page(db, Exhibit, limit, after)
+
+
+def stream_all_exhibits(db: Session, after: Optional[int] = None) -> Iterator[Exhibit]:
+    """Iterate over all exhibits without loading the whole table"""
+    return _stream_rows(db, Exhibit, after)
 
 
 def get_exhibit_by_id(db: Session, exhibit_id: int) -> Optional[Exhibit]:
     """Get exhibit by ID"""
-    return db.get(Exhibit, exhibit_id)
+    exhibit = cache.get("exhibit", exhibit_id, Exhibit)
+    if exhibit is MISS:
+        exhibit = db.get(Exhibit, exhibit_id)
+        cache.set("exhibit", exhibit_id, exhibit)
+    return exhibit
 
 
 def find_exhibit_by_inventory_number(db: Session, inventory_number: str) -> Optional[Exhibit]:
     """Find exhibit by inventory number"""
-    statement = select(Exhibit).where(Exhibit.inventory_number == inventory_number)
-    results = db.exec(statement)
-    return results.first()
+    exhibit = cache.get("exhibit_inventory", inventory_number, Exhibit)
+    if exhibit is MISS:
+        statement = select(Exhibit).where(Exhibit.inventory_number == inventory_number)
+        exhibit = db.exec(statement).first()
+        cache.set("exhibit_inventory", inventory_number, exhibit)
+    return exhibit
 
 
 def create_exhibit(db: Session, exhibit_data: dict) -> Exhibit:
     """Create new exhibit"""
-    exhibit = Exhibit(**exhibit_data)
+    exhibit = Exhibit.model_validate(exhibit_data)
     db.add(exhibit)
+    db.flush()
+    refresh_locations(db, [exhibit.id])
+    bump_versions(db, _hall_scopes(db, [exhibit.hall_id]))
     db.commit()
     db.refresh(exhibit)
     return exhibit
@@ -90,10 +330,18 @@ def update_exhibit(db: Session, exhibit_id: int, update_data: dict) -> Optional[
     """Update exhibit data"""
     exhibit = db.get(Exhibit, exhibit_id)
     if exhibit:
+        old_inventory_number = exhibit.inventory_number
+        old_hall_id = exhibit.hall_id
         for key, value in update_data.items():
             setattr(exhibit, key, value)
+        if "storage_location" in update_data:
+            db.flush()
+            refresh_locations(db, [exhibit_id])
+        bump_versions(db, _hall_scopes(db, [old_hall_id, exhibit.hall_id]))
         db.commit()
         db.refresh(exhibit)
+        cache.invalidate("exhibit", exhibit_id)
+        cache.invalidate("exhibit_inventory", old_inventory_number, exhibit.inventory_number)
     return exhibit
 
 
@@ -101,8 +349,13 @@ def delete_exhibit(db: Session, exhibit_id: int) -> bool:
     """Delete exhibit"""
     exhibit = db.get(Exhibit, exhibit_id)
     if exhibit:
+        inventory_number = exhibit.inventory_number
+        bump_versions(db, _hall_scopes(db, [exhibit.hall_id]))
+        db.exec(delete(ExhibitLocation).where(ExhibitLocation.exhibit_id == exhibit_id))
         db.delete(exhibit)
         db.commit()
+        cache.invalidate("exhibit", exhibit_id)
+        cache.invalidate("exhibit_inventory", inventory_number)
         return True
     return False
 
@@ -111,22 +364,31 @@ def delete_exhibit(db: Session, exhibit_id: int) -> bool:
 
 def get_all_halls(db: Session) -> List[Hall]:
     """Get all halls"""
-    statement = select(Hall)
-    results = db.exec(statement)
-    return results.all()
+    halls = cache.get("halls", "all", Hall)
+    if halls is MISS:
+        statement = select(Hall)
+        halls = db.exec(statement).all()
+        cache.set("halls", "all", halls)
+    return halls
 
 
 def get_hall_by_id(db: Session, hall_id: int) -> Optional[Hall]:
     """Get hall by ID"""
-    return db.get(Hall, hall_id)
+    hall = cache.get("hall", hall_id, Hall)
+    if hall is MISS:
+        hall = db.get(Hall, hall_id)
+        cache.set("hall", hall_id, hall)
+    return hall
 
 
 def create_hall(db: Session, hall_data: dict) -> Hall:
     """Create new hall"""
-    hall = Hall(**hall_data)
+    hall = Hall.model_validate(hall_data)
     db.add(hall)
+    bump_versions(db, [hall_scope(hall.number)])
     db.commit()
     db.refresh(hall)
+    cache.invalidate("halls", "all")
     return hall
 
 
@@ -134,10 +396,14 @@ def update_hall(db: Session, hall_id: int, update_data: dict) -> Optional[Hall]:
     """Update hall data"""
     hall = db.get(Hall, hall_id)
     if hall:
+        old_number = hall.number
         for key, value in update_data.items():
             setattr(hall, key, value)
+        bump_versions(db, [hall_scope(old_number), hall_scope(hall.number)])
         db.commit()
         db.refresh(hall)
+        cache.invalidate("hall", hall_id)
+        cache.invalidate("halls", "all")
     return hall
 
 
@@ -145,19 +411,25 @@ def delete_hall(db: Session, hall_id: int) -> bool:
     """Delete hall"""
     hall = db.get(Hall, hall_id)
     if hall:
+        bump_versions(db, [hall_scope(hall.number)])
         db.delete(hall)
         db.commit()
+        cache.invalidate("hall", hall_id)
+        cache.invalidate("halls", "all")
         return True
     return False
 
 
 # ====== VISITOR OPERATIONS ======
 
-def get_all_visitors(db: Session) -> List[Visitor]:
-    """Get all visitors"""
-    statement = select(Visitor)
-    results = db.exec(statement)
-    return results.all()
+def get_all_visitors(db: Session, limit: int = DEFAULT_PAGE_SIZE, after: Optional[int] = None) -> List[Visitor]:
+    """Get one page of visitors (keyset pagination on id)"""
+    return _get_page(db, Visitor, limit, after)
+
+
+def stream_all_visitors(db: Session, after: Optional[int] = None) -> Iterator[Visitor]:
+    """Iterate over all visitors without loading the whole table"""
+    return _stream_rows(db, Visitor, after)
 
 
 def get_visitor_by_id(db: Session, visitor_id: int) -> Optional[Visitor]:
@@ -167,7 +439,7 @@ def get_visitor_by_id(db: Session, visitor_id: int) -> Optional[Visitor]:
 
 def create_visitor(db: Session, visitor_data: dict) -> Visitor:
     """Create new visitor"""
-    visitor = Visitor(**visitor_data)
+    visitor = Visitor.model_validate(visitor_data)
     db.add(visitor)
     db.commit()
     db.refresh(visitor)
@@ -197,11 +469,14 @@ def delete_visitor(db: Session, visitor_id: int) -> bool:
 
 # ====== TICKET OPERATIONS ======
 
-def get_all_tickets(db: Session) -> List[Ticket]:
-    """Get all tickets"""
-    statement = select(Ticket)
-    results = db.exec(statement)
-    return results.all()
+def get_all_tickets(db: Session, limit: int = DEFAULT_PAGE_SIZE, after: Optional[int] = None) -> List[Ticket]:
+    """Get one page of tickets (keyset pagination on id)"""
+    return _get_page(db, Ticket, limit, after)
+
+
+def stream_all_tickets(db: Session, after: Optional[int] = None) -> Iterator[Ticket]:
+    """Iterate over all tickets without loading the whole table"""
+    return _stream_rows(db, Ticket, after)
 
 
 def get_ticket_by_id(db: Session, ticket_id: int) -> Optional[Ticket]:
@@ -209,12 +484,78 @@ def get_ticket_by_id(db: Session, ticket_id: int) -> Optional[Ticket]:
     return db.get(Ticket, ticket_id)
 
 
+def _in_requested_order(rows, ids: List[int]) -> list:
+    """Order rows fetched by id like the requested ids, skipping unknown and repeated ids"""
+    by_id = {row.id: row for row in rows}
+    return [by_id[row_id] for row_id in dict.fromkeys(ids) if row_id in by_id]
+
+
+def get_tickets_by_ids(db: Session, ticket_ids: List[int]) -> List[Ticket]:
+    """Get several tickets in one query, in the order of the given ids"""
+    return _in_requested_order(db.exec(select(Ticket).where(Ticket.id.in_(ticket_ids))), ticket_ids)
+
+
+def _sold_in_period(statement, start: Optional[date], end: Optional[date]):
+    """Keep the tickets sold from the start day to the end day inclusive; None leaves a side open"""
+    if start is not None:
+        statement = statement.where(Ticket.date_time >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        statement = statement.where(Ticket.date_time < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return statement
+
+
+# Output formats of POST /tickets/receipts
+RECEIPT_FORMATS = ("ndjson", "zip")
+
+
+def build_receipt(ticket: Ticket) -> dict:
+    """Electronic receipt of a ticket (or of a row with the ticket columns)"""
+    return {
+        "receipt_number": f"Receipt-{ticket.number}",
+        "ticket_number": ticket.number,
+        "purchase_date": ticket.date_time,
+        "ticket_type": ticket.type,
+        "price": ticket.price,
+        "payment_status": ticket.payment_status,
+        "receipt": f"Payment for ticket {ticket.number} for amount {ticket.price} rub."
+    }
+
+
+def render_receipt(receipt: dict) -> str:
+    """Plain-text document of a receipt"""
+    return (f"{receipt['receipt_number']}\n"
+            f"Ticket: {receipt['ticket_number']}\n"
+            f"Type: {receipt['ticket_type']}\n"
+            f"Purchase date: {receipt['purchase_date'].isoformat(sep=' ', timespec='seconds')}\n"
+            f"Price: {receipt['price']} rub.\n"
+            f"Payment status: {receipt['payment_status']}\n"
+            f"\n{receipt['receipt']}\n")
+
+
+def _receipts_statement(ticket_ids: Optional[List[int]], start: Optional[date], end: Optional[date]):
+    """Build the query over the receipt columns of the given tickets or of a period, fetched through a server-side cursor"""
+    statement = (select(Ticket.number, Ticket.date_time, Ticket.type, Ticket.price, Ticket.payment_status)
+                 .order_by(Ticket.id)
+                 .execution_options(yield_per=STREAM_BATCH_SIZE))
+    if ticket_ids is not None:
+        statement = statement.where(Ticket.id.in_(ticket_ids))
+    return _sold_in_period(statement, start, end)
+
+
+def stream_receipts(db: Session, ticket_ids: Optional[List[int]] = None,
+                    start: Optional[date] = None, end: Optional[date] = None) -> Iterator[dict]:
+    """Iterate over the receipts of the given tickets, or of the tickets sold from start to end, in id order"""
+    for row in db.exec(_receipts_statement(ticket_ids, start, end)):
+        yield build_receipt(row)
+
+
 def create_ticket(db: Session, ticket_data: dict) -> Ticket:
     """Create new ticket"""
-    ticket = Ticket(**ticket_data)
+    ticket = Ticket.model_validate(ticket_data)
     db.add(ticket)
     db.commit()
     db.refresh(ticket)
+    business.ticket_changed(None, ticket.date_time)
     return ticket
 
 
@@ -222,10 +563,12 @@ def update_ticket(db: Session, ticket_id: int, update_data: dict) -> Optional[Ti
     """Update ticket data"""
     ticket = db.get(Ticket, ticket_id)
     if ticket:
+        old_date_time = ticket.date_time
         for key, value in update_data.items():
             setattr(ticket, key, value)
         db.commit()
         db.refresh(ticket)
+        business.ticket_changed(old_date_time, ticket.date_time)
     return ticket
 
 
@@ -233,25 +576,177 @@ def delete_ticket(db: Session, ticket_id: int) -> bool:
     """Delete ticket"""
     ticket = db.get(Ticket, ticket_id)
     if ticket:
+        date_time = ticket.date_time
         db.delete(ticket)
         db.commit()
+        business.ticket_changed(date_time, None)
         return True
     return False
 
 
+# ====== TICKET SALES ======
+# POST /tickets/sell: the numbers of the sold tickets come from the database,
+# never from the client, and a sale retried with the same Idempotency-Key
+# returns the stored response instead of selling the tickets again.
+
+# Largest number of tickets sold in one request
+MAX_SALE_SIZE = 1000
+# PostgreSQL sequence of ticket numbers (migration 0008); other databases use number_sequence
+TICKET_NUMBER_SEQUENCE = "ticket_number_seq"
+TICKET_NUMBER_FORMAT = "S-{:010d}"
+# How long a sale can be replayed by its Idempotency-Key
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+# Expired keys are deleted by at most one sale per this interval and worker
+IDEMPOTENCY_PURGE_INTERVAL = timedelta(minutes=5)
+_next_key_purge = datetime.min
+
+
+def allocate_numbers(db: Session, sequence: str, count: int) -> List[int]:
+    """Take count consecutive values of a counter in the current transaction"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        # One round trip for the whole block; concurrent sales do not wait for each other
+        statement = select(func.nextval(sequence)).select_from(func.generate_series(1, count))
+        return list(db.exec(statement).all())
+    if dialect != "sqlite":
+        raise ValueError(f"Number allocation is not supported for the '{dialect}' database")
+    # The counter row stays locked until commit, which SQLite does for every write anyway
+    table = NumberSequence.__table__
+    statement = (sqlite.insert(table).values(name=sequence, value=count)
+                 .on_conflict_do_update(index_elements=[table.c.name], set_={"value": table.c.value + count})
+                 .returning(table.c.value))
+    last = db.exec(statement).scalar_one()
+    return list(range(last - count + 1, last + 1))
+
+
+def _request_hash(payload) -> str:
+    """Fingerprint of a request body, to detect an Idempotency-Key reused for another request"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _claim_idempotency_key(db: Session, key: str, request_hash: str) -> Optional[IdempotencyKey]:
+    """Reserve a key for this request; returns the stored request if the key was already used.
+
+    A concurrent request holding the same key makes the INSERT wait until it
+    commits (then its response is returned) or rolls back (then the key is ours).
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        raise ValueError(f"Idempotency keys are not supported for the '{dialect}' database")
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    table = IdempotencyKey.__table__
+    statement = (dialect_insert(table)
+                 .values(key=key, request_hash=request_hash, created_at=datetime.now())
+                 .on_conflict_do_nothing(index_elements=[table.c.key])
+                 .returning(table.c.key))
+    if db.exec(statement).first() is not None:
+        return None
+    stored = db.get(IdempotencyKey, key)
+    if stored.created_at < datetime.now() - IDEMPOTENCY_KEY_TTL:
+        # Expired but not purged yet: the key starts over
+        stored.request_hash, stored.response, stored.created_at = request_hash, None, datetime.now()
+        return None
+    return stored
+
+
+def _purge_idempotency_keys(db: Session):
+    """Delete expired idempotency keys, at most once per IDEMPOTENCY_PURGE_INTERVAL"""
+    global _next_key_purge
+    now = datetime.now()
+    if now < _next_key_purge:
+        return
+    _next_key_purge = now + IDEMPOTENCY_PURGE_INTERVAL
+    db.exec(delete(IdempotencyKey).where(IdempotencyKey.created_at < now - IDEMPOTENCY_KEY_TTL))
+
+
+def _validate_sale(items: List[Dict[str, Any]]) -> Tuple[List[dict], List[Optional[dict]]]:
+    """Validate the sold tickets and their visitors; raises ValueError naming the first bad item.
+
+    The tickets get a placeholder number of the same format: real numbers are
+    only allocated for a valid sale, since a rolled back nextval leaves a gap.
+    """
+    tickets, visitors = [], []
+    for index, item in enumerate(items):
+        item = dict(item)
+        visitor = item.pop("visitor", None)
+        item.pop("id", None)
+        try:
+            ticket = Ticket.model_validate({**item, "number": TICKET_NUMBER_FORMAT.format(0)})
+            if visitor is not None:
+                visitor = Visitor.model_validate({**visitor, "ticket_id": None}).model_dump(exclude={"id"})
+        except ValidationError as error:
+            raise ValueError(f"Item {index}: {_bulk_error(index, error)['error']}") from error
+        tickets.append(ticket.model_dump(exclude={"id"}))
+        visitors.append(visitor)
+    return tickets, visitors
+
+
+def sell_tickets(db: Session, items: List[Dict[str, Any]], idempotency_key: Optional[str] = None) -> Tuple[dict, bool]:
+    """Sell tickets, each with an optional visitor, in one transaction.
+
+    Returns the sale and whether it is a replay of an earlier request with the
+    same idempotency key. Raises ValueError for invalid items or a key reused
+    for a different request.
+    """
+    if idempotency_key is not None:
+        request_hash = _request_hash(items)
+        stored = _claim_idempotency_key(db, idempotency_key, request_hash)
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                raise ValueError("Idempotency-Key was already used for a different request")
+            return json.loads(stored.response), True
+
+    ticket_rows, visitor_rows = _validate_sale(items)
+    numbers = allocate_numbers(db, TICKET_NUMBER_SEQUENCE, len(ticket_rows))
+    for row, number in zip(ticket_rows, numbers):
+        row["number"] = TICKET_NUMBER_FORMAT.format(number)
+    tickets = db.exec(insert(Ticket).returning(Ticket, sort_by_parameter_order=True), params=ticket_rows).scalars().all()
+
+    sold = [ticket.model_dump(mode="json") for ticket in tickets]
+    visitor_rows = [(index, {**row, "ticket_id": tickets[index].id})
+                    for index, row in enumerate(visitor_rows) if row is not None]
+    if visitor_rows:
+        visitors = db.exec(insert(Visitor).returning(Visitor, sort_by_parameter_order=True),
+                           params=[row for _, row in visitor_rows]).scalars().all()
+        for (index, _), visitor in zip(visitor_rows, visitors):
+            sold[index]["visitor"] = visitor.model_dump(mode="json")
+
+    sale = {
+        "tickets": [{**ticket, "visitor": ticket.get("visitor")} for ticket in sold],
+        "total": sum(ticket["price"] for ticket in sold),
+    }
+    if idempotency_key is not None:
+        db.exec(update(IdempotencyKey)
+                .where(IdempotencyKey.key == idempotency_key)
+                .values(response=json.dumps(sale)))
+    _purge_idempotency_keys(db)
+    date_times = [ticket.date_time for ticket in tickets]
+    db.commit()
+    for date_time in date_times:
+        business.ticket_changed(None, date_time)
+    return sale, False
+
+
 # ====== MOVEMENT OPERATIONS ======
 
-def get_all_movements(db: Session) -> List[Movement]:
-    """Get all movements"""
-    statement = select(Movement)
-    results = db.exec(statement)
-    return results.all()
+def get_all_movements(db: Session, limit: int = DEFAULT_PAGE_SIZE, after: Optional[int] = None) -> List[Movement]:
+    """Get one page of movements (keyset pagination on id)"""
+    return _get_page(db, Movement, limit, after)
+
+
+def stream_all_movements(db: Session, after: Optional[int] = None) -> Iterator[Movement]:
+    """Iterate over all movements without loading the whole table"""
+    return _stream_rows(db, Movement, after)
 
 
 def create_movement(db: Session, movement_data: dict) -> Movement:
-    """Create new movement"""
-    movement = Movement(**movement_data)
+    """Create new movement; raises ValueError for an explicit id on a partitioned table"""
+    if movement_data.get("id") is not None and _is_partitioned(db, Movement):
+        raise ValueError("Movement ids are assigned by the database")
+    movement = Movement.model_validate(movement_data)
     db.add(movement)
+    db.flush()
+    _move_location(db, movement)
     db.commit()
     db.refresh(movement)
     return movement
@@ -261,7 +756,15 @@ def delete_movement(db: Session, movement_id: int) -> bool:
     """Delete movement"""
     movement = db.get(Movement, movement_id)
     if movement:
+        exhibit_id = movement.exhibit_id
+        current = db.exec(select(ExhibitLocation)
+                          .where(ExhibitLocation.exhibit_id == exhibit_id)
+                          .with_for_update()).first()
         db.delete(movement)
+        db.flush()
+        # Only deleting the latest movement moves the exhibit back
+        if current is None or current.movement_id == movement_id:
+            refresh_locations(db, [exhibit_id])
         db.commit()
         return True
     return False
@@ -278,10 +781,12 @@ def get_all_restorations(db: Session) -> List[Restoration]:
 
 def create_restoration(db: Session, restoration_data: dict) -> Restoration:
     """Create new restoration"""
-    restoration = Restoration(**restoration_data)
+    restoration = Restoration.model_validate(restoration_data)
     db.add(restoration)
+    bump_versions(db, [RESTORATION_SCOPE])
     db.commit()
     db.refresh(restoration)
+    business.restoration_changed(None, restoration.status)
     return restoration
 
 
@@ -289,10 +794,13 @@ def update_restoration(db: Session, restoration_id: int, update_data: dict) -> O
     """Update restoration data"""
     restoration = db.get(Restoration, restoration_id)
     if restoration:
+        old_status = restoration.status
         for key, value in update_data.items():
             setattr(restoration, key, value)
+        bump_versions(db, [RESTORATION_SCOPE])
         db.commit()
         db.refresh(restoration)
+        business.restoration_changed(old_status, restoration.status)
     return restoration
 
 
@@ -300,32 +808,68 @@ def delete_restoration(db: Session, restoration_id: int) -> bool:
     """Delete restoration"""
     restoration = db.get(Restoration, restoration_id)
     if restoration:
+        status = restoration.status
+        bump_versions(db, [RESTORATION_SCOPE])
         db.delete(restoration)
         db.commit()
+        business.restoration_changed(status, None)
         return True
     return False
 
 
 # ====== SPECIAL QUERIES ======
 
+def _exhibits_in_hall_statement(hall_number: int):
+    """Build a query for the exhibits of a hall, joined to the hall by id"""
+    return (select(Exhibit)
+            .join(Hall, Exhibit.hall_id == Hall.id)
+            .where(Hall.number == hall_number)
+            .order_by(Exhibit.id))
+
+
+def _exhibits_in_halls_statement(hall_numbers: List[int]):
+    """Build a query for the exhibits of the given halls with their hall numbers, joined by hall id"""
+    return (select(Hall.number, Exhibit)
+            .join(Hall, Exhibit.hall_id == Hall.id)
+            .where(Hall.number.in_(hall_numbers))
+            .order_by(Hall.number, Exhibit.id))
+
+
+def _group_exhibits_by_hall(rows, hall_numbers: List[int]) -> Dict[int, List[Exhibit]]:
+    """Group (hall number, exhibit) rows by hall; halls without exhibits get an empty list"""
+    grouped = {number: [] for number in hall_numbers}
+    for number, exhibit in rows:
+        grouped[number].append(exhibit)
+    return grouped
+
+
 def get_exhibits_in_hall(db: Session, hall_number: int) -> List[Exhibit]:
     """Get all exhibits in specified hall"""
-    hall_statement = select(Hall).where(Hall.number == hall_number)
-    hall = db.exec(hall_statement).first()
+    results = db.exec(_exhibits_in_hall_statement(hall_number))
+    return results.all()
 
-    if not hall:
-        return []
 
-    statement = select(Exhibit).where(Exhibit.hall_id == hall.id)
-    results = db.exec(statement)
-    return results.all()
+def get_exhibits_in_halls(db: Session, hall_numbers: List[int]) -> Dict[int, List[Exhibit]]:
+    """Get the exhibits of several halls, grouped by hall number, in one query"""
+    return _group_exhibits_by_hall(db.exec(_exhibits_in_halls_statement(hall_numbers)), hall_numbers)
 
 
-def get_visitors_with_tickets(db: Session) -> List[Visitor]:
-    """Get visitors with ticket information"""
-    statement = select(Visitor)
-    results = db.exec(statement)
-    return results.all()
+def _visitors_with_tickets_statement(limit: int, after: Optional[int]):
+    """Build a query for one page of visitors joined with their tickets, ordered by visitor id"""
+    statement = (select(Visitor)
+                 .outerjoin(Ticket, Ticket.id == Visitor.ticket_id)
+                 # The ticket comes from the same row: no query per visitor
+                 .options(contains_eager(Visitor.ticket))
+                 .order_by(Visitor.id)
+                 .limit(limit))
+    if after is not None:
+        statement = statement.where(Visitor.id > after)
+    return statement
+
+
+def get_visitors_with_tickets(db: Session, limit: int = DEFAULT_PAGE_SIZE, after: Optional[int] = None) -> List[Visitor]:
+    """Get one page of visitors with their tickets loaded (keyset pagination on id)"""
+    return db.exec(_visitors_with_tickets_statement(limit, after)).all()
 
 
 def get_exhibit_movement_history(db: Session, exhibit_id: int) -> List[Movement]:
@@ -340,7 +884,7 @@ def get_exhibit_movement_history(db: Session, exhibit_id: int) -> List[Movement]
 def get_current_restorations(db: Session) -> List[Restoration]:
     """Get all current (unfinished) restorations"""
     statement = (select(Restoration)
-                 .where(Restoration.status == "in progress"))
+                 .where(Restoration.status == ACTIVE_RESTORATION_STATUS))
     results = db.exec(statement)
     return results.all()
 
@@ -352,6 +896,33 @@ def get_exhibits_from_supply(db: Session, supply_id: int) -> List[Exhibit]:
     return results.all()
 
 
+def _movements_by_period_statement(start: datetime, end: datetime, after: Optional[Tuple[datetime, int]]):
+    """Build a query for the movements of a period in (date, id) order, after the given keyset cursor"""
+    # The date bounds let PostgreSQL skip the partitions of other months
+    statement = (select(Movement)
+                 .where(Movement.date >= start)
+                 .where(Movement.date <= end)
+                 .order_by(Movement.date, Movement.id))
+    if after is not None:
+        statement = statement.where(tuple_(Movement.date, Movement.id) > tuple(after))
+    return statement
+
+
+def get_movements_page_by_period(db: Session, start: datetime, end: datetime, limit: int = DEFAULT_PAGE_SIZE,
+                                 after: Optional[Tuple[datetime, int]] = None) -> List[Movement]:
+    """Get one page of the movements of a period, starting after the given (date, id)"""
+    results = db.exec(_movements_by_period_statement(start, end, after).limit(limit))
+    return results.all()
+
+
+def stream_movements_by_period(db: Session, start: datetime, end: datetime,
+                               after: Optional[Tuple[datetime, int]] = None) -> Iterator[Movement]:
+    """Iterate over the movements of a period using a server-side cursor"""
+    statement = _movements_by_period_statement(start, end, after).execution_options(yield_per=STREAM_BATCH_SIZE)
+    for row in db.exec(statement):
+        yield row
+
+
 def get_movements_by_period(db: Session, start: datetime, end: datetime) -> List[Movement]:
     """Get all movements for specified period"""
     statement = (select(Movement)
@@ -362,50 +933,648 @@ def get_movements_by_period(db: Session, start: datetime, end: datetime) -> List
     return results.all()
 
 
+# Loading plan for an exhibit card: hall and supply are joined into the main
+# query, each collection is fetched by one extra "WHERE exhibit_id IN (...)" query
+EXHIBIT_CARD_LOADING_PLAN = (
+    joinedload(Exhibit.hall),
+    joinedload(Exhibit.supply),
+    selectinload(Exhibit.movements),
+    selectinload(Exhibit.restorations),
+)
+
+
+def _exhibit_card(exhibit: Exhibit) -> dict:
+    """Build full exhibit information from an exhibit with loaded relationships"""
+    return {
+        'exhibit': exhibit,
+        'hall': exhibit.hall,
+        'supply': exhibit.supply,
+        'movements': sorted(exhibit.movements, key=lambda movement: movement.date),
+        'restorations': sorted(exhibit.restorations, key=lambda restoration: restoration.start_date)
+    }
+
+
+def _exhibit_card_statement(exhibit_ids: List[int]):
+    """Build a query for exhibits with everything an exhibit card needs"""
+    return (select(Exhibit)
+            .where(Exhibit.id.in_(exhibit_ids))
+            .options(*EXHIBIT_CARD_LOADING_PLAN))
+
+
+def _collect_exhibit_cards(exhibits, exhibit_ids: List[int]) -> List[dict]:
+    """Build exhibit cards in the order requested by the caller, skipping unknown ids"""
+    exhibits_by_id = {exhibit.id: exhibit for exhibit in exhibits}
+    return [_exhibit_card(exhibits_by_id[exhibit_id]) for exhibit_id in exhibit_ids if exhibit_id in exhibits_by_id]
+
+
 def get_full_exhibit_info(db: Session, exhibit_id: int):
     """Get full exhibit information including hall, supply, movements and restorations"""
-    exhibit = db.get(Exhibit, exhibit_id)
+    exhibit = db.exec(_exhibit_card_statement([exhibit_id])).first()
     if not exhibit:
         return None
+    return _exhibit_card(exhibit)
+
+
+def get_full_exhibits_info(db: Session, exhibit_ids: List[int]) -> List[dict]:
+    """Get full information for several exhibits with a constant number of queries"""
+    exhibits = db.exec(_exhibit_card_statement(exhibit_ids)).unique()
+    return _collect_exhibit_cards(exhibits, exhibit_ids)
+
+
+def _halls_statistics_statement():
+    """Build the grouped query behind the halls statistics"""
+    # Exhibits that have at least one unfinished restoration
+    active_restorations = (select(Restoration.exhibit_id)
+                           .where(Restoration.status == ACTIVE_RESTORATION_STATUS)
+                           .distinct()
+                           .subquery())
+
+    # One row per (hall, exhibit condition); the outer joins keep empty halls
+    return (select(Hall.id, Hall.number, Hall.exposition_name, Hall.type,
+                   Exhibit.condition,
+                   func.count(Exhibit.id),
+                   func.count(active_restorations.c.exhibit_id))
+            .outerjoin(Exhibit, Exhibit.hall_id == Hall.id)
+            .outerjoin(active_restorations, active_restorations.c.exhibit_id == Exhibit.id)
+            .group_by(Hall.id, Hall.number, Hall.exposition_name, Hall.type, Exhibit.condition)
+            .order_by(Hall.id))
+
+
+def _collect_halls_statistics(rows) -> List[dict]:
+    """Fold (hall, condition) rows of the grouped query into one entry per hall"""
+    statistics = {}
+    for hall_id, number, exposition_name, hall_type, condition, count, restoring in rows:
+        hall_statistics = statistics.setdefault(hall_id, {
+            'hall_id': hall_id,
+            'hall_number': number,
+            'exposition_name': exposition_name,
+            'type': hall_type,
+            'exhibits_count': 0,
+            'exhibits_by_condition': {},
+            'exhibits_under_restoration': 0
+        })
+        if count:
+            hall_statistics['exhibits_count'] += count
+            hall_statistics['exhibits_by_condition'][condition or 'unknown'] = count
+            hall_statistics['exhibits_under_restoration'] += restoring
+
+    return list(statistics.values())
+
+
+def get_halls_statistics(db: Session):
+    """Get statistics on exhibits in each hall: totals, conditions and active restorations"""
+    return _collect_halls_statistics(db.exec(_halls_statistics_statement()))
+
+
+# ====== SALES STATISTICS ======
+# Triggers on ticket (migration 0009) journal every change into
+# daily_sales_delta; folding moves the journal into the daily_sales rollup.
+# Reads add the not yet folded journal rows to the rollup, so they are exact
+# whenever the journal was last folded, and never scan the ticket table.
+
+SALES_PERIODS = ("day", "week", "month", "year")
+SALES_GROUPS = SALES_PERIODS + ("type", "payment_status")
+# The journal is folded by at most one statistics request per this interval and worker
+SALES_FOLD_INTERVAL = timedelta(minutes=1)
+_next_sales_fold = datetime.min
+
+
+def _sales_group(dialect: str, name: str, sales):
+    """Grouping expression of a sales statistics key; periods are keyed by their first day"""
+    if name not in SALES_PERIODS or name == "day":
+        return sales.c[name]
+    if dialect == "postgresql":
+        return cast(func.date_trunc(name, sales.c.day), Date)
+    if name == "week":
+        # Back to the Monday of the week
+        return func.date(sales.c.day, "-6 days", "weekday 1")
+    return func.strftime("%Y-%m-01" if name == "month" else "%Y-01-01", sales.c.day)
+
+
+def _sales_statistics_statement(dialect: str, start: Optional[date], end: Optional[date], group_by: List[str]):
+    """Build the query summing the rollup and the pending journal by the requested keys"""
+    parts = []
+    for model in (DailySales, DailySalesDelta):
+        part = select(model.day, model.type, model.payment_status, model.tickets_count, model.revenue)
+        if start is not None:
+            part = part.where(model.day >= start)
+        if end is not None:
+            part = part.where(model.day <= end)
+        parts.append(part)
+    sales = union_all(*parts).subquery("sales")
+    keys = [_sales_group(dialect, name, sales) for name in group_by]
+    tickets_count = func.sum(sales.c.tickets_count)
+    return (select(*(key.label(name) for key, name in zip(keys, group_by)),
+                   tickets_count.label("tickets_count"),
+                   func.sum(sales.c.revenue).label("revenue"))
+            .group_by(*keys)
+            # Groups whose tickets were all deleted
+            .having(tickets_count != 0)
+            .order_by(*keys))
+
+
+def _collect_sales_statistics(rows) -> List[dict]:
+    """Convert the grouped rows to response items"""
+    return [{**row._mapping, "revenue": round(row.revenue, 2)} for row in rows]
+
+
+def get_sales_statistics(db: Session, start: Optional[date] = None, end: Optional[date] = None,
+                         group_by: List[str] = ("day",)) -> List[dict]:
+    """Get tickets sold and revenue between two days (inclusive), grouped by the given keys"""
+    statement = _sales_statistics_statement(db.get_bind().dialect.name, start, end, list(group_by))
+    return _collect_sales_statistics(db.exec(statement))
+
+
+def daily_sales_fold_statements(dialect: str) -> list:
+    """Statements moving the journal into daily_sales, to run in one transaction"""
+    delta = DailySalesDelta.__table__
+    rollup = DailySales.__table__
+    keys = [delta.c.day, delta.c.type, delta.c.payment_status]
+    columns = ["day", "type", "payment_status", "tickets_count", "revenue"]
+    if dialect == "postgresql":
+        # Only the journal rows deleted here are folded, even if new ones are committed meanwhile
+        journal = delete(delta).returning(*keys, delta.c.tickets_count, delta.c.revenue).cte("journal")
+        statements_tail = []
+    elif dialect == "sqlite":
+        # SQLite runs one writer at a time: the journal cannot change until commit
+        journal = delta
+        statements_tail = [delete(delta)]
+    else:
+        raise ValueError(f"Sales rollups are not supported for the '{dialect}' database")
+    journal_keys = [journal.c.day, journal.c.type, journal.c.payment_status]
+    source = (select(*journal_keys, func.sum(journal.c.tickets_count), func.sum(journal.c.revenue))
+              # WHERE avoids an ambiguity of INSERT ... SELECT ... ON CONFLICT on SQLite
+              .where(true())
+              .group_by(*journal_keys)
+              # Rollup rows are locked in the same order by concurrent folds
+              .order_by(*journal_keys))
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    fold = dialect_insert(rollup).from_select(columns, source)
+    fold = fold.on_conflict_do_update(
+        index_elements=[rollup.c.day, rollup.c.type, rollup.c.payment_status],
+        set_={"tickets_count": rollup.c.tickets_count + fold.excluded.tickets_count,
+              "revenue": rollup.c.revenue + fold.excluded.revenue}
+    )
+    if dialect == "postgresql":
+        fold = fold.add_cte(journal)
+    return [fold] + statements_tail
+
+
+def daily_sales_rebuild_statements() -> list:
+    """Statements recomputing daily_sales from the ticket table, to run in one transaction"""
+    day = func.date(Ticket.date_time)
+    source = (select(day, Ticket.type, Ticket.payment_status, func.count(), func.sum(Ticket.price))
+              .group_by(day, Ticket.type, Ticket.payment_status))
+    fill = insert(DailySales).from_select(["day", "type", "payment_status", "tickets_count", "revenue"], source)
+    return [delete(DailySalesDelta), delete(DailySales), fill]
+
+
+def sales_fold_due() -> bool:
+    """Whether this worker should fold the sales journal now (at most once per SALES_FOLD_INTERVAL)"""
+    global _next_sales_fold
+    now = datetime.now()
+    if now < _next_sales_fold:
+        return False
+    _next_sales_fold = now + SALES_FOLD_INTERVAL
+    return True
+
+
+def fold_daily_sales(db: Session):
+    """Move the sales journal into daily_sales and commit"""
+    for statement in daily_sales_fold_statements(db.get_bind().dialect.name):
+        db.exec(statement)
+    db.commit()
+
+
+# ====== VISITOR STATISTICS ======
+# GET /statistics/visitors: one grouped pass over visitor JOIN ticket yields a
+# small cube (age bucket x ticket type x hour); the age histogram, the ticket
+# type mix and the hourly curve are sums over that cube, so the cost does not
+# depend on the number of visitors beyond the single scan.
+
+# Lower bounds of the age buckets, each up to the next bound (the last one is open)
+AGE_BUCKETS = (0, 7, 18, 25, 45, 65)
+
+
+def _age_bucket_label(index: int) -> str:
+    lower = AGE_BUCKETS[index]
+    if index + 1 < len(AGE_BUCKETS):
+        return f"{lower}-{AGE_BUCKETS[index + 1] - 1}"
+    return f"{lower}+"
+
+
+def _ticket_hour(dialect: str):
+    """Hour of the day of the ticket time"""
+    if dialect == "postgresql":
+        return cast(func.extract("hour", Ticket.date_time), Integer)
+    return cast(func.strftime("%H", Ticket.date_time), Integer)
+
 
-    hall = db.get(Hall, exhibit.hall_id) if exhibit.hall_id else None
-    supply = db.get(Supply, exhibit.supply_id) if exhibit.supply_id else None
+def _visitor_statistics_statement(dialect: str, start: Optional[date], end: Optional[date]):
+    """Build the query counting visitors by age bucket, ticket type and hour of their ticket"""
+    bucket = case(*((Visitor.age >= lower, index) for index, lower in reversed(list(enumerate(AGE_BUCKETS)))),
+                  else_=0)
+    hour = _ticket_hour(dialect)
+    statement = (select(bucket.label("bucket"), Ticket.type, hour.label("hour"),
+                        func.count().label("visitors"), func.sum(Visitor.age).label("age_sum"))
+                 .select_from(Visitor)
+                 .join(Ticket, Ticket.id == Visitor.ticket_id)
+                 .group_by(bucket, Ticket.type, hour))
+    return _sold_in_period(statement, start, end)
 
-    movement_statement = (select(Movement)
-                         .where(Movement.exhibit_id == exhibit_id)
-                         .order_by(Movement.date))
-    movements = db.exec(movement_statement).all()
 
-    restoration_statement = (select(Restoration)
-                            .where(Restoration.exhibit_id == exhibit_id)
-                            .order_by(Restoration.start_date))
-    restorations = db.exec(restoration_statement).all()
+def _share(count: int, total: int) -> float:
+    return round(count / total, 4) if total else 0.0
 
+
+def _collect_visitor_statistics(rows) -> dict:
+    """Fold the cube into the age histogram, the ticket type mix and the hourly curve"""
+    by_bucket, by_type, by_hour, age_by_type = {}, {}, {}, {}
+    for row in rows:
+        by_bucket[row.bucket] = by_bucket.get(row.bucket, 0) + row.visitors
+        by_type[row.type] = by_type.get(row.type, 0) + row.visitors
+        by_hour[row.hour] = by_hour.get(row.hour, 0) + row.visitors
+        age_by_type[row.type] = age_by_type.get(row.type, 0) + row.age_sum
+    total = sum(by_bucket.values())
+
+    hourly, cumulative = [], 0
+    for hour in sorted(by_hour):
+        cumulative += by_hour[hour]
+        hourly.append({"hour": hour, "visitors": by_hour[hour], "share": _share(by_hour[hour], total),
+                       "cumulative_share": _share(cumulative, total)})
     return {
-        'exhibit': exhibit,
-        'hall': hall,
-        'supply': supply,
-        'movements': movements,
-        'restorations': restorations
+        "visitors": total,
+        "age_buckets": [{"bucket": _age_bucket_label(index), "visitors": by_bucket.get(index, 0),
+                         "share": _share(by_bucket.get(index, 0), total)}
+                        for index in range(len(AGE_BUCKETS))],
+        "ticket_types": [{"type": ticket_type, "visitors": count, "share": _share(count, total),
+                          "average_age": round(age_by_type[ticket_type] / count, 1)}
+                         for ticket_type, count in sorted(by_type.items(), key=lambda item: -item[1])],
+        "hourly": hourly,
     }
 
 
-def get_halls_statistics(db: Session):
-    """Get statistics on number of exhibits in each hall"""
-    halls_statement = select(Hall)
-    halls = db.exec(halls_statement).all()
-
-    statistics = []
-    for hall in halls:
-        exhibits_statement = select(Exhibit).where(Exhibit.hall_id == hall.id)
-        count = len(db.exec(exhibits_statement).all())
-
-        statistics.append({
-            'hall_id': hall.id,
-            'hall_number': hall.number,
-            'exposition_name': hall.exposition_name,
-            'type': hall.type,
-            'exhibits_count': count
-        })
+def get_visitor_statistics(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> dict:
+    """Get the age histogram, ticket type mix and hourly attendance of visitors with tickets of a period"""
+    statement = _visitor_statistics_statement(db.get_bind().dialect.name, start, end)
+    return _collect_visitor_statistics(db.exec(statement))
+
+
+# ====== EXHIBIT QUERY ======
+# GET /exhibits/query: whitelisted filters, sort keys and fields compiled into
+# a single SELECT. Only the requested columns are read, so list views can
+# leave out the description.
+
+EXHIBIT_QUERY_FIELDS = tuple(column.name for column in Exhibit.__table__.columns)
+
+EXHIBIT_QUERY_FILTERS = {
+    "hall_id": lambda ids: Exhibit.hall_id.in_(ids),
+    "supply_id": lambda ids: Exhibit.supply_id.in_(ids),
+    "condition": lambda value: Exhibit.condition == value,
+    "author": lambda value: Exhibit.author == value,
+    "storage_location": lambda value: Exhibit.storage_location == value,
+    "created_from": lambda value: Exhibit.creation_date >= value,
+    "created_to": lambda value: Exhibit.creation_date <= value,
+}
+
+
+def _exhibit_query_statement(filters: Dict[str, Any], sort: List[Tuple[str, bool]],
+                             fields: List[str], limit: int, offset: int):
+    """Build the query for GET /exhibits/query; sort is a list of (field, descending)"""
+    columns = Exhibit.__table__.c
+    statement = select(*[columns[name] for name in fields])
+    for name, value in filters.items():
+        if value is not None:
+            statement = statement.where(EXHIBIT_QUERY_FILTERS[name](value))
+    order = [columns[name].desc() if descending else columns[name].asc() for name, descending in sort]
+    # id breaks ties, so that pages do not overlap
+    if "id" not in [name for name, _ in sort]:
+        order.append(columns.id.asc())
+    return statement.order_by(*order).offset(offset).limit(limit)
+
+
+def _collect_exhibit_query(rows, fields: List[str]) -> List[dict]:
+    """Turn query rows into dicts with the requested fields"""
+    if len(fields) == 1:
+        # A single column comes back as plain values
+        return [{fields[0]: value} for value in rows]
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def query_exhibits(db: Session, filters: Dict[str, Any], sort: List[Tuple[str, bool]] = (),
+                   fields: List[str] = EXHIBIT_QUERY_FIELDS, limit: int = DEFAULT_PAGE_SIZE,
+                   offset: int = 0) -> List[dict]:
+    """Get one page of exhibits matching all the given filters, with the requested fields only"""
+    rows = db.exec(_exhibit_query_statement(filters, list(sort), list(fields), limit, offset))
+    return _collect_exhibit_query(rows, list(fields))
+
+
+# ====== SEARCH ======
+# On PostgreSQL exhibits are searched through the search_vector column and its
+# GIN index (migration 0004): Russian stemming, web search syntax ("phrase",
+# or, -word) and ranking by ts_rank_cd. If nothing matches and pg_trgm is
+# installed, the query is retried as a trigram word similarity search over
+# title and author, which tolerates typos. Other databases use a substring match.
+
+SEARCH_CONFIG = "russian"
+# Must match the expression of ix_exhibit_search_trigram
+TRIGRAM_DOCUMENT = "coalesce(exhibit.title, '') || ' ' || coalesce(exhibit.author, '')"
+
+# Whether pg_trgm is installed, checked once per process
+_search_features: Dict[str, bool] = {}
+_TRIGRAM_CHECK = select(func.count()).select_from(table("pg_extension")).where(column("extname") == "pg_trgm")
+
+
+def _fulltext_condition(query: str):
+    return literal_column("exhibit.search_vector").op("@@")(func.websearch_to_tsquery(SEARCH_CONFIG, query))
+
+
+def _fulltext_probe(query: str):
+    """Build a query checking whether anything matches the full-text query"""
+    return select(Exhibit.id).where(_fulltext_condition(query)).limit(1)
+
+
+def _search_statement(mode: str, query: str, limit: int, offset: int):
+    """Build a query for one page of search results, the best matches first"""
+    if mode == "fulltext":
+        rank = func.ts_rank_cd(literal_column("exhibit.search_vector"), func.websearch_to_tsquery(SEARCH_CONFIG, query))
+        statement = select(Exhibit).where(_fulltext_condition(query)).order_by(rank.desc(), Exhibit.id)
+    elif mode == "fuzzy":
+        document = literal_column(f"({TRIGRAM_DOCUMENT})")
+        statement = (select(Exhibit)
+                     .where(literal(query).op("<%")(document))
+                     .order_by(func.word_similarity(query, document).desc(), Exhibit.id))
+    else:
+        statement = (select(Exhibit)
+                     .where(or_(Exhibit.title.icontains(query, autoescape=True),
+                                Exhibit.author.icontains(query, autoescape=True),
+                                Exhibit.description.icontains(query, autoescape=True)))
+                     .order_by(Exhibit.id))
+    return statement.offset(offset).limit(limit)
+
+
+def _search_mode(db: Session, query: str) -> str:
+    """Choose how to search: fulltext, fuzzy (no full-text match) or substring"""
+    if db.get_bind().dialect.name != "postgresql":
+        return "substring"
+    if "pg_trgm" not in _search_features:
+        _search_features["pg_trgm"] = db.exec(_TRIGRAM_CHECK).one() > 0
+    if not _search_features["pg_trgm"] or db.exec(_fulltext_probe(query)).first() is not None:
+        return "fulltext"
+    return "fuzzy"
+
+
+def search_exhibits(db: Session, query: str, limit: int = DEFAULT_PAGE_SIZE,
+                    offset: int = 0) -> Tuple[str, List[Exhibit]]:
+    """Search exhibits by title, author and description; returns the search mode and one page of results"""
+    mode = _search_mode(db, query)
+    return mode, db.exec(_search_statement(mode, query, limit, offset)).all()
+
+
+# ====== BULK OPERATIONS ======
+# Every bulk operation runs in one transaction. The batch is first sent as a
+# single executemany statement; if the database rejects it, the items are
+# retried one by one in savepoints so that only the offending ones fail.
+
+def _bulk_error(index: int, error: Exception) -> dict:
+    """Describe why one item of a bulk request failed"""
+    if isinstance(error, DBAPIError):
+        message = str(error.orig).strip().splitlines()[0]
+    elif isinstance(error, ValidationError):
+        message = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+    else:
+        message = str(error)
+    return {'index': index, 'error': message}
+
+
+def _bulk_result(succeeded: List[dict], failed: List[dict]) -> dict:
+    """Build the response of a bulk operation"""
+    return {
+        'succeeded_count': len(succeeded),
+        'failed_count': len(failed),
+        'succeeded': sorted(succeeded, key=lambda item: item['index']),
+        'failed': sorted(failed, key=lambda item: item['index'])
+    }
 
-    return statistics
\ No newline at end of file
+
+def _bump_bulk_versions(db: Session, model):
+    """Bump the version scopes a bulk write to a table may change, before its commit"""
+    if model in (Exhibit, Hall):
+        bump_versions(db, [ALL_HALLS_SCOPE])
+    elif model is Restoration:
+        bump_versions(db, [RESTORATION_SCOPE])
+
+
+def _after_bulk_write(model):
+    """Bring derived state up to date after a bulk write to a table"""
+    for namespace in CACHE_NAMESPACES.get(model, ()):
+        cache.invalidate_namespace(namespace)
+    if model in (Ticket, Restoration):
+        business.invalidate()
+
+
+def _execute_batch(db: Session, statement, rows: List[dict], indexes: List[int],
+                   failed: List[dict], returning: bool = True) -> List[tuple]:
+    """Execute a statement for a batch of rows, isolating rows the database rejects.
+
+    Returns (index, row) pairs for the rows that went through: the rows produced
+    by RETURNING, or the parameter rows themselves for statements without it.
+    A batch with a few bad rows costs O(bad rows * log(batch size)) statements.
+    """
+    def execute(batch_indexes: List[int], batch: List[dict]) -> List[tuple]:
+        try:
+            with db.begin_nested():
+                result = db.exec(statement, params=batch)
+                return list(zip(batch_indexes, result.all() if returning else batch))
+        except DBAPIError as error:
+            if len(batch) == 1:
+                failed.append(_bulk_error(batch_indexes[0], error))
+                return []
+        # Something in the batch violates a constraint: split it in halves
+        # until the offending rows are isolated
+        middle = len(batch) // 2
+        return (execute(batch_indexes[:middle], batch[:middle])
+                + execute(batch_indexes[middle:], batch[middle:]))
+
+    return execute(indexes, rows)
+
+
+def _insert_statement(db: Session, model, upsert: bool, update_columns=()):
+    """Build a multi-row INSERT ... RETURNING, optionally with ON CONFLICT DO UPDATE"""
+    dialect = db.get_bind().dialect.name
+    if not upsert:
+        statement = insert(model)
+    elif dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        key = UPSERT_KEYS.get(model, "id")
+        conflict_columns = [key]
+        if dialect == "postgresql" and key == "id" and model in PARTITION_COLUMNS:
+            conflict_columns.append(PARTITION_COLUMNS[model])
+        statement = dialect_insert(model)
+        # Only the fields given in the request overwrite an existing row
+        update_columns = [column for column in update_columns if column not in ["id"] + conflict_columns]
+        if update_columns:
+            statement = statement.on_conflict_do_update(
+                index_elements=conflict_columns,
+                set_={column: statement.excluded[column] for column in update_columns}
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=conflict_columns)
+    else:
+        raise ValueError(f"Upsert is not supported for the '{dialect}' database")
+    return statement.returning(model, sort_by_parameter_order=True)
+
+
+def _partitioned_rows(db: Session, model, validated: List[tuple], upsert: bool,
+                      failed: List[dict]) -> Tuple[List[tuple], List[tuple]]:
+    """Keep ids unique in a partitioned table, whose primary key is (id, partition column).
+
+    A row with an explicit id is accepted only to upsert an existing row, and
+    its partition column defaults to the stored value. Returns the rows to
+    upsert as usual and the rows whose partition column changes: those are
+    moved first (see _upsert_moved_row), so that ON CONFLICT (id, partition
+    column) finds them instead of inserting a second row with the same id.
+    """
+    ids = [row["id"] for _, row, _ in validated if "id" in row]
+    if not ids:
+        return validated, []
+    column = PARTITION_COLUMNS[model]
+    # Concurrent writers of the table wait until commit, so the ids looked up stay valid
+    db.exec(text(f"LOCK TABLE {model.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+    existing = dict(db.exec(select(model.id, getattr(model, column)).where(model.id.in_(ids))).all())
+
+    kept, moved = [], []
+    for index, row, update_columns in validated:
+        if "id" in row:
+            if not upsert or row["id"] not in existing:
+                failed.append({'index': index, 'error': f"{model.__name__} ids are assigned by the database: "
+                                                        f"id {row['id']} can only upsert an existing row"})
+                continue
+            if column not in update_columns:
+                row[column] = existing[row["id"]]
+            elif row[column] != existing[row["id"]]:
+                moved.append((index, row, update_columns))
+                continue
+        kept.append((index, row, update_columns))
+    return kept, moved
+
+
+def _upsert_moved_row(db: Session, model, index: int, row: dict, update_columns: tuple,
+                      failed: List[dict]) -> List[tuple]:
+    """Upsert a row whose partition column changes: move it to the new value, then update it"""
+    column = PARTITION_COLUMNS[model]
+    table = model.__table__
+    try:
+        with db.begin_nested():
+            # PostgreSQL moves an updated row to the partition of its new value
+            db.exec(update(table).where(table.c.id == row["id"]).values({column: row[column]}))
+            result = db.exec(_insert_statement(db, model, True, update_columns), params=[row])
+            return [(index, result.one())]
+    except DBAPIError as error:
+        failed.append(_bulk_error(index, error))
+        return []
+
+
+def bulk_create(db: Session, model, items: List[Dict[str, Any]], upsert: bool = False) -> dict:
+    """Insert (or upsert by natural key) many rows in one transaction"""
+    # Rows are grouped by the set of fields they update on conflict, so that
+    # a typical import where every item has the same fields is one statement
+    batches = {}
+    validated, failed = [], []
+    for index, item in enumerate(items):
+        try:
+            instance = model.model_validate(item)
+        except ValidationError as error:
+            failed.append(_bulk_error(index, error))
+            continue
+        row = instance.model_dump()
+        if row.get("id") is None:
+            row.pop("id", None)
+        update_columns = tuple(sorted(instance.model_fields_set)) if upsert else ()
+        validated.append((index, row, update_columns))
+
+    moved = []
+    if _is_partitioned(db, model):
+        validated, moved = _partitioned_rows(db, model, validated, upsert, failed)
+    for index, row, update_columns in validated:
+        batch_indexes, batch_rows = batches.setdefault(update_columns, ([], []))
+        batch_indexes.append(index)
+        batch_rows.append(row)
+
+    results = []
+    for update_columns, (batch_indexes, batch_rows) in batches.items():
+        statement = _insert_statement(db, model, upsert, update_columns)
+        results += _execute_batch(db, statement, batch_rows, batch_indexes, failed)
+    for index, row, update_columns in moved:
+        results += _upsert_moved_row(db, model, index, row, update_columns, failed)
+
+    # Serialize before commit, which would expire the returned objects
+    succeeded = [{'index': index, 'item': row[0].model_dump()} for index, row in results]
+    if results:
+        refresh_locations(db, _location_exhibit_ids(model, [item['item'] for item in succeeded]))
+        _bump_bulk_versions(db, model)
+    db.commit()
+    _after_bulk_write(model)
+    return _bulk_result(succeeded, failed)
+
+
+def bulk_update(db: Session, model, items: List[Dict[str, Any]]) -> dict:
+    """Update many rows by id in one transaction"""
+    ids = [item.get("id") for item in items if isinstance(item.get("id"), int)]
+    existing = {row.id: row.model_dump() for row in db.exec(select(model).where(model.id.in_(ids)))}
+
+    rows, indexes, failed = [], [], []
+    for index, item in enumerate(items):
+        if item.get("id") not in existing:
+            failed.append({'index': index, 'error': f"{model.__name__} with id {item.get('id')} not found"})
+            continue
+        try:
+            row = model.model_validate({**existing[item["id"]], **item}).model_dump()
+        except ValidationError as error:
+            failed.append(_bulk_error(index, error))
+            continue
+        rows.append(row)
+        indexes.append(index)
+
+    succeeded = []
+    if rows:
+        # ORM bulk UPDATE by primary key: one executemany for the whole batch
+        results = _execute_batch(db, update(model), rows, indexes, failed, returning=False)
+        succeeded = [{'index': index, 'item': row} for index, row in results]
+        # A moved movement changes the location of its old and its new exhibit
+        changed = [item['item'] for item in succeeded]
+        refresh_locations(db, _location_exhibit_ids(model, changed + [existing[row['id']] for row in changed]))
+        _bump_bulk_versions(db, model)
+        db.commit()
+        _after_bulk_write(model)
+    return _bulk_result(succeeded, failed)
+
+
+def bulk_delete(db: Session, model, ids: List[int]) -> dict:
+    """Delete many rows by id in one transaction"""
+    existing = set(db.exec(select(model.id).where(model.id.in_(ids))).all())
+
+    rows, indexes, failed = [], [], []
+    for index, row_id in enumerate(ids):
+        if row_id not in existing:
+            failed.append({'index': index, 'error': f"{model.__name__} with id {row_id} not found"})
+            continue
+        rows.append({'row_id': row_id})
+        indexes.append(index)
+
+    succeeded = []
+    if rows:
+        location_ids = [row['row_id'] for row in rows] if model is Exhibit else []
+        if model is Movement:
+            # Look up the exhibits of the movements while they still exist
+            statement = select(Movement.exhibit_id).where(Movement.id.in_([row['row_id'] for row in rows]))
+            location_ids = db.exec(statement.distinct()).all()
+        table = model.__table__
+        statement = delete(table).where(table.c.id == bindparam('row_id'))
+        results = _execute_batch(db, statement, rows, indexes, failed, returning=False)
+        succeeded = [{'index': index, 'item': {'id': row['row_id']}} for index, row in results]
+        refresh_locations(db, location_ids)
+        _bump_bulk_versions(db, model)
+        db.commit()
+        _after_bulk_write(model)
+    return _bulk_result(succeeded, failed)
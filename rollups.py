@@ -0,0 +1,47 @@
+# rollups.py
+# Daily sales rollup (migration 0009) maintenance.
+#
+# Triggers on ticket journal every change into daily_sales_delta, and
+# GET /statistics/sales folds the journal into daily_sales once a minute per
+# worker. Folding from cron as well keeps the journal short when the
+# statistics are rarely read; rebuilding recomputes the rollup from the
+# ticket table, e.g. after the triggers were disabled for a bulk load.
+#
+#   python rollups.py fold       (e.g. every minute from cron)
+#   python rollups.py rebuild
+import argparse
+
+from sqlalchemy import func, select
+
+import database
+from models import DailySales, DailySalesDelta
+from requests import daily_sales_fold_statements, daily_sales_rebuild_statements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Daily sales rollup")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("fold", help="move the change journal into daily_sales")
+    commands.add_parser("rebuild", help="recompute daily_sales from the ticket table")
+
+    args = parser.parse_args(argv)
+    with database.engine.begin() as connection:
+        dialect = connection.dialect.name
+        if args.command == "fold":
+            pending = connection.execute(select(func.count()).select_from(DailySalesDelta)).scalar()
+            for statement in daily_sales_fold_statements(dialect):
+                connection.execute(statement)
+            print(f"✅ Folded about {pending} journal rows into daily_sales")
+            return
+
+        if dialect == "postgresql":
+            # No sale may be journaled between the recount and the commit
+            connection.exec_driver_sql("LOCK TABLE ticket IN SHARE MODE")
+        for statement in daily_sales_rebuild_statements():
+            connection.execute(statement)
+        rows = connection.execute(select(func.count()).select_from(DailySales)).scalar()
+        print(f"✅ Rebuilt daily_sales: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,140 +1,129 @@
 # seed_data.py
+"""
+Тестовые данные музея.
+
+    python seed_data.py                      # демонстрационные данные (идемпотентно)
+    python seed_data.py generate --exhibits 1_000_000 --movements-per-exhibit 20 --tickets-per-day 5000
+
+Генератор создаёт детерминированный (при одинаковых --seed и --end-date) набор данных
+нужного объёма и загружает его пакетами: через COPY на PostgreSQL, иначе через executemany.
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+import database
+from copy_io import copy_rows
+from requests import refresh_locations
+from partitions import MONTHS_AHEAD, add_months, create_partitions, is_partitioned
 from database import create_db_and_tables, get_session
 from models import *
-from datetime import datetime, date
-from sqlmodel import select, text
+from datetime import datetime, date, timedelta
+from sqlmodel import select, insert
+
+
+def _get_or_create(session, model, lookup: dict, **fields):
+    """Возвращает запись по ключу lookup, создавая её с остальными полями при отсутствии"""
+    instance = session.exec(select(model).filter_by(**lookup)).first()
+    if instance:
+        return instance, False
+    instance = model(**lookup, **fields)
+    session.add(instance)
+    session.flush()
+    return instance, True
 
 
 def create_sample_data():
-    """Создание тестовых данных с принудительным обновлением"""
+    """Создание тестовых данных (идемпотентно: существующие записи не меняются и не дублируются)"""
 
     with next(get_session()) as session:
-        print("🔄 Creating/updating test data...")
-
-        # УДАЛЯЕМ СТАРЫЕ ДАННЫЕ
-        session.exec(text("DELETE FROM restoration"))
-        session.exec(text("DELETE FROM movement"))
-        session.exec(text("DELETE FROM exhibit"))
-        session.exec(text("DELETE FROM visitor"))
-        session.exec(text("DELETE FROM ticket"))
-        session.exec(text("DELETE FROM supply"))
-        session.exec(text("DELETE FROM hall"))
-        session.exec(text("DELETE FROM employee"))
-        session.commit()
+        print("🔄 Creating test data...")
+        created = []
+        # Экспонаты, текущее местоположение которых надо пересчитать
+        located = []
+
+        def add(model, lookup, **fields):
+            instance, is_new = _get_or_create(session, model, lookup, **fields)
+            if is_new:
+                created.append(model.__name__)
+                if model in (Exhibit, Movement):
+                    located.append(instance.id if model is Exhibit else instance.exhibit_id)
+            return instance
 
         # 1. Создаем сотрудников
-        employee1 = Employee(
+        add(Employee, {"personnel_number": "T001"},
             full_name="Иванов Иван Иванович",
             position="кассир",
-            personnel_number="T001",
-            access_level="staff"
-        )
+            access_level="staff")
 
-        employee2 = Employee(
+        add(Employee, {"personnel_number": "T002"},
             full_name="Петров Петр Петрович",
             position="экскурсовод",
-            personnel_number="T002",
-            access_level="staff"
-        )
-
-        employee3 = Employee(
-            full_name="Сидорова Анна Александровна",
-            position="хранитель фондов",
-            personnel_number="T003",
-            access_level="manager"
-        )
-
-        session.add_all([employee1, employee2, employee3])
-        session.commit()
+            access_level="staff")
+
+        employee3 = add(Employee, {"personnel_number": "T003"},
+                        full_name="Сидорова Анна Александровна",
+                        position="хранитель фондов",
+                        access_level="manager")
 
         # 2. Создаем залы
-        hall1 = Hall(
-            number=1,
-            exposition_name="Древние артефакты",
-            type="выставочный зал"
-        )
-
-        hall2 = Hall(
-            number=2,
-            exposition_name="Живопись XIX века",
-            type="выставочный зал"
-        )
-
-        hall3 = Hall(
-            number=100,
-            exposition_name="Основное хранилище",
-            type="хранилище"
-        )
-
-        session.add_all([hall1, hall2, hall3])
-        session.commit()
+        hall1 = add(Hall, {"number": 1},
+                    exposition_name="Древние артефакты",
+                    type="выставочный зал")
+
+        hall2 = add(Hall, {"number": 2},
+                    exposition_name="Живопись XIX века",
+                    type="выставочный зал")
+
+        hall3 = add(Hall, {"number": 100},
+                    exposition_name="Основное хранилище",
+                    type="хранилище")
 
         # 3. Создаем поставку
-        supply1 = Supply(
-            number="P-2025-10-01",
-            date=date(2025, 10, 1),
-            supplier='Галерея "Альфа"',
-            employee_id=employee3.id
-        )
-
-        session.add(supply1)
-        session.commit()
+        supply1 = add(Supply, {"number": "P-2025-10-01"},
+                      date=date(2025, 10, 1),
+                      supplier='Галерея "Альфа"',
+                      employee_id=employee3.id)
 
         # 4. Создаем билеты
-        ticket1 = Ticket(
-            number="B5001",
-            date_time=datetime(2025, 10, 20, 11, 0),
-            type="взрослый",
-            price=500.00,
-            payment_status="оплачен"
-        )
-
-        ticket2 = Ticket(
-            number="B5002",
-            date_time=datetime(2025, 10, 20, 12, 0),
-            type="детский",
-            price=250.00,
-            payment_status="оплачен"
-        )
-
-        session.add_all([ticket1, ticket2])
-        session.commit()
+        ticket1 = add(Ticket, {"number": "B5001"},
+                      date_time=datetime(2025, 10, 20, 11, 0),
+                      type="взрослый",
+                      price=500.00,
+                      payment_status="оплачен")
+
+        ticket2 = add(Ticket, {"number": "B5002"},
+                      date_time=datetime(2025, 10, 20, 12, 0),
+                      type="детский",
+                      price=250.00,
+                      payment_status="оплачен")
 
         # 5. Создаем посетителей
-        visitor1 = Visitor(
+        add(Visitor, {"email": "alexey@example.com"},
             name="Алексей",
             age=35,
             phone="+7-900-111-22-33",
-            email="alexey@example.com",
-            ticket_id=ticket1.id
-        )
+            ticket_id=ticket1.id)
 
-        visitor2 = Visitor(
+        add(Visitor, {"email": "maria@example.com"},
             name="Мария",
             age=12,
             phone="+7-900-222-33-44",
-            email="maria@example.com",
-            ticket_id=ticket2.id
-        )
-
-        session.add_all([visitor1, visitor2])
-        session.commit()
+            ticket_id=ticket2.id)
 
         # 6. Создаем экспонаты
-        exhibit1 = Exhibit(
-            inventory_number="INV-1001",
-            title="Икона Владимирская Богоматерь",
-            description="Древняя икона в резной кипарисовой раме, XIV век",
-            creation_date=date(1350, 1, 1),
-            author="Неизвестный мастер",
-            condition="хорошее",
-            storage_location="витрина №1",
-            hall_id=hall1.id,
-            supply_id=supply1.id
-        )
-
-        exhibit2 = Exhibit(
-            inventory_number="INV-1002",
+        exhibit1 = add(Exhibit, {"inventory_number": "INV-1001"},
+                       title="Икона Владимирская Богоматерь",
+                       description="Древняя икона в резной кипарисовой раме, XIV век",
+                       creation_date=date(1350, 1, 1),
+                       author="Неизвестный мастер",
+                       condition="хорошее",
+                       storage_location="витрина №1",
+                       hall_id=hall1.id,
+                       supply_id=supply1.id)
+
+        add(Exhibit, {"inventory_number": "INV-1002"},
             title='Картина "Закат над Волгой"',
             description="Масляная живопись на холсте, пейзаж",
             creation_date=date(1885, 1, 1),
@@ -142,54 +131,326 @@ def create_sample_data():
             condition="отличное",
             storage_location="стена зала №2",
             hall_id=hall2.id,
-            supply_id=supply1.id
-        )
-
-        exhibit3 = Exhibit(
-            inventory_number="INV-1003",
-            title="Статуэтка льва из слоновой кости",
-            description="Резная статуэтка льва в натуральную величину",
-            creation_date=date(1750, 1, 1),
-            author="Неизвестный резчик",
-            condition="удовлетворительное",
-            storage_location="хранилище 100-А",
-            hall_id=hall3.id,
-            supply_id=supply1.id
-        )
-
-        session.add_all([exhibit1, exhibit2, exhibit3])
-        session.commit()
+            supply_id=supply1.id)
+
+        exhibit3 = add(Exhibit, {"inventory_number": "INV-1003"},
+                       title="Статуэтка льва из слоновой кости",
+                       description="Резная статуэтка льва в натуральную величину",
+                       creation_date=date(1750, 1, 1),
+                       author="Неизвестный резчик",
+                       condition="удовлетворительное",
+                       storage_location="хранилище 100-А",
+                       hall_id=hall3.id,
+                       supply_id=supply1.id)
 
         # 7. Создаем перемещение
-        movement1 = Movement(
-            exhibit_id=exhibit3.id,
+        add(Movement, {"exhibit_id": exhibit3.id, "date": datetime(2025, 10, 25, 10, 0)},
             from_location="хранилище 100-А",
             to_location="витрина №2 основного зала",
-            date=datetime.now(),
             responsible_employee_id=employee3.id,
-            reason='Временная выставка "Малые скульптуры Древнего Востока"'
-        )
-
-        session.add(movement1)
+            reason='Временная выставка "Малые скульптуры Древнего Востока"')
 
         # 8. Создаем реставрацию
-        restoration1 = Restoration(
-            exhibit_id=exhibit1.id,
-            start_date=date(2025, 5, 1),
+        add(Restoration, {"exhibit_id": exhibit1.id, "start_date": date(2025, 5, 1)},
             end_date=date(2025, 7, 1),
             executor="Реставратор высшей категории Петров С.С.",
             description="Частичная реставрация лакового слоя, укрепление грунта",
-            status="завершено"
-        )
-
-        session.add(restoration1)
+            status="завершено")
 
+        refresh_locations(session, located)
         session.commit()
 
-        print("✅ Russian test data successfully created!")
-        print(f"   Создано: 3 сотрудника, 3 зала, 1 поставка, 2 билета")
-        print(f"            2 посетителя, 3 экспоната, 1 перемещение, 1 реставрация")
+        if created:
+            print(f"✅ Russian test data created: {len(created)} new records")
+        else:
+            print("✅ Russian test data already present, nothing to do")
+
+
+# ====== ГЕНЕРАТОР ДАННЫХ ДЛЯ НАГРУЗОЧНЫХ ТЕСТОВ ======
+
+# Таблицы в порядке загрузки (сначала те, на которые ссылаются внешние ключи)
+GENERATED_TABLES = ["employee", "hall", "supply", "exhibit", "movement", "restoration", "ticket", "visitor"]
+# Загружаются вместе с генерируемыми таблицами, но без собственных id
+DERIVED_TABLES = ["exhibit_location"]
+
+POSITIONS = ["кассир", "экскурсовод", "хранитель фондов", "реставратор", "смотритель"]
+FIRST_NAMES = ["Иван", "Анна", "Пётр", "Мария", "Алексей", "Елена", "Сергей", "Ольга", "Дмитрий", "Наталья"]
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов"]
+EXPOSITIONS = ["Древние артефакты", "Живопись XIX века", "Русский авангард", "Иконопись", "Скульптура",
+               "Декоративно-прикладное искусство", "Графика", "Археология", "Нумизматика", "Оружие и доспехи"]
+TITLE_OBJECTS = ["Икона", "Картина", "Статуэтка", "Ваза", "Портрет", "Пейзаж", "Гравюра", "Монета", "Шкатулка",
+                 "Кувшин", "Натюрморт", "Эскиз", "Фреска", "Кинжал", "Медальон"]
+TITLE_SUBJECTS = ["льва", "всадника", "святого Николая", "купчихи", "над Волгой", "с цветами", "старого города",
+                  "морского берега", "императрицы", "охотника", "в золотой раме", "с орнаментом"]
+AUTHORS = ["Неизвестный мастер", "Архип Куинджи", "Иван Айвазовский", "Илья Репин", "Андрей Рублёв",
+           "Василий Суриков", "Исаак Левитан", "Казимир Малевич", "Валентин Серов", "Неизвестный резчик"]
+MATERIALS = ["масло, холст", "дерево, темпера", "слоновая кость", "бронза", "фарфор", "серебро", "бумага, акварель"]
+CONDITIONS = ["отличное", "хорошее", "удовлетворительное", "требует реставрации"]
+SUPPLIERS = ['Галерея "Альфа"', "Частная коллекция", "Аукционный дом", "Археологическая экспедиция", "Дар музею"]
+# (тип билета, цена, диапазон возраста посетителя)
+TICKET_TYPES = [("взрослый", 500.0, (18, 70)), ("детский", 250.0, (3, 17)),
+                ("студенческий", 300.0, (18, 25)), ("пенсионный", 200.0, (60, 90))]
+TICKET_TYPE_WEIGHTS = [55, 20, 15, 10]
+
+
+class _BatchLoader:
+    """Накапливает сгенерированные строки по таблицам и записывает их пакетами"""
+
+    def __init__(self, batch_size: int):
+        engine = database.engine
+        self.batch_size = batch_size
+        self.use_copy = engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+        self.connection = engine.raw_connection() if self.use_copy else engine.connect()
+        self.buffers = {table: [] for table in GENERATED_TABLES + DERIVED_TABLES}
+        self.counts = Counter()
+
+    def next_ids(self) -> dict:
+        """Первые свободные id таблиц: строки генерируются с явными id, чтобы связать их без RETURNING"""
+        queries = {table: f"SELECT coalesce(max(id), 0) + 1 FROM {table}" for table in GENERATED_TABLES}
+        # Номера залов уникальны и не совпадают с id у залов, добавленных вручную
+        queries["hall_number"] = "SELECT coalesce(max(number), 0) + 1 FROM hall"
+        ids = {}
+        for name, query in queries.items():
+            if self.use_copy:
+                with self.connection.cursor() as cursor:
+                    cursor.execute(query)
+                    ids[name] = cursor.fetchone()[0]
+            else:
+                ids[name] = self.connection.exec_driver_sql(query).scalar()
+        return ids
+
+    def add(self, table: str, row: dict):
+        self.buffers[table].append(row)
+        if len(self.buffers[table]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # Все буферы пишутся по порядку, чтобы внешние ключи ссылались на уже загруженные строки
+        for table in GENERATED_TABLES + DERIVED_TABLES:
+            rows = self.buffers[table]
+            if not rows:
+                continue
+            columns = list(rows[0])
+            if self.use_copy:
+                with self.connection.cursor() as cursor:
+                    copy_rows(cursor, table, columns, ([row[column] for column in columns] for row in rows))
+            else:
+                self.connection.execute(insert(SQLModel.metadata.tables[table]), rows)
+            self.counts[table] += len(rows)
+            self.buffers[table] = []
+        self.connection.commit()
+
+    def close(self):
+        self.flush()
+        if self.use_copy:
+            # Последовательности id должны продолжаться после явно заданных id
+            with self.connection.cursor() as cursor:
+                for table in GENERATED_TABLES:
+                    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                   f"(SELECT coalesce(max(id), 1) FROM {table}))")
+            self.connection.commit()
+        self.connection.close()
+
+
+def _create_movement_partitions(first: date, last: date):
+    """Помесячные секции movement на период истории, чтобы строки не попали в секцию по умолчанию"""
+    with database.engine.begin() as connection:
+        if is_partitioned(connection):
+            create_partitions(connection, first, add_months(last, MONTHS_AHEAD))
+
+
+def generate_dataset(exhibits: int = 10_000, movements_per_exhibit: int = 5, tickets_per_day: int = 500,
+                     days: int = 365, employees: int = 50, halls: int = 30, restoration_rate: float = 0.05,
+                     seed: int = 42, end_date: date = None, batch_size: int = 10_000) -> Counter:
+    """Генерирует набор данных заданного объёма и загружает его в базу пакетами"""
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    history_days = max(days, 5 * 365)
+    _create_movement_partitions(end_date - timedelta(days=history_days), end_date)
+    loader = _BatchLoader(batch_size)
+    ids = loader.next_ids()
+
+    try:
+        # 1. Сотрудники
+        employee_ids = []
+        for _ in range(employees):
+            employee_id = ids["employee"]
+            ids["employee"] += 1
+            employee_ids.append(employee_id)
+            loader.add("employee", {
+                "id": employee_id,
+                "full_name": f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}",
+                "position": rng.choice(POSITIONS),
+                "personnel_number": f"G{employee_id:06d}",
+                "access_level": rng.choice(["staff", "staff", "manager"]),
+            })
+
+        # 2. Залы и хранилища
+        hall_ids, locations = [], []
+        for _ in range(halls):
+            hall_id = ids["hall"]
+            hall_number = ids["hall_number"]
+            ids["hall"] += 1
+            ids["hall_number"] += 1
+            is_storage = rng.random() < 0.2
+            hall_ids.append(hall_id)
+            locations.append(f"хранилище {hall_number}-А" if is_storage else f"зал №{hall_number}")
+            loader.add("hall", {
+                "id": hall_id,
+                "number": hall_number,
+                "exposition_name": "Основное хранилище" if is_storage else rng.choice(EXPOSITIONS),
+                "type": "хранилище" if is_storage else "выставочный зал",
+            })
+        locations.append("реставрационная мастерская")
+
+        # 3. Поставки: примерно по тысяче экспонатов на поставку
+        supply_ids = []
+        for _ in range(exhibits // 1000 + 1):
+            supply_id = ids["supply"]
+            ids["supply"] += 1
+            supply_ids.append(supply_id)
+            loader.add("supply", {
+                "id": supply_id,
+                "number": f"GP-{supply_id:07d}",
+                "date": end_date - timedelta(days=rng.randint(0, 3650)),
+                "supplier": rng.choice(SUPPLIERS),
+                "employee_id": rng.choice(employee_ids),
+            })
+
+        # 4. Экспонаты с историей перемещений и реставрациями
+        for _ in range(exhibits):
+            exhibit_id = ids["exhibit"]
+            ids["exhibit"] += 1
+
+            location = rng.choice(locations)
+            moved_at = datetime.combine(end_date - timedelta(days=history_days), datetime.min.time())
+            movements = []
+            for _ in range(movements_per_exhibit):
+                destination = rng.choice(locations)
+                moved_at += timedelta(minutes=rng.randint(60, history_days * 24 * 60 // max(movements_per_exhibit, 1)))
+                movements.append({
+                    "id": ids["movement"],
+                    "exhibit_id": exhibit_id,
+                    "from_location": location,
+                    "to_location": destination,
+                    "date": moved_at,
+                    "responsible_employee_id": rng.choice(employee_ids),
+                    "reason": rng.choice(["выставка", "хранение", "реставрация", "инвентаризация"]),
+                })
+                ids["movement"] += 1
+                location = destination
+
+            loader.add("exhibit", {
+                "id": exhibit_id,
+                "inventory_number": f"GEN-{exhibit_id:09d}",
+                "title": f"{rng.choice(TITLE_OBJECTS)} {rng.choice(TITLE_SUBJECTS)}",
+                "description": f"{rng.choice(MATERIALS)}, {rng.choice(TITLE_OBJECTS).lower()} из собрания музея",
+                "creation_date": date(rng.randint(1300, 1990), rng.randint(1, 12), rng.randint(1, 28)),
+                "author": rng.choice(AUTHORS),
+                "condition": rng.choice(CONDITIONS),
+                "storage_location": location,
+                "hall_id": rng.choice(hall_ids),
+                "supply_id": rng.choice(supply_ids),
+            })
+            for movement in movements:
+                loader.add("movement", movement)
+            # Текущее местоположение — конец истории перемещений (см. requests.refresh_locations)
+            loader.add("exhibit_location", {
+                "exhibit_id": exhibit_id,
+                "location": location,
+                "movement_id": movements[-1]["id"] if movements else None,
+                "moved_at": movements[-1]["date"] if movements else None,
+            })
+
+            if rng.random() < restoration_rate:
+                in_progress = rng.random() < 0.3
+                start = end_date - timedelta(days=rng.randint(0, 720))
+                loader.add("restoration", {
+                    "id": ids["restoration"],
+                    "exhibit_id": exhibit_id,
+                    "start_date": start,
+                    "end_date": None if in_progress else start + timedelta(days=rng.randint(7, 180)),
+                    "executor": f"Реставратор {rng.choice(LAST_NAMES)}",
+                    "description": "Укрепление красочного слоя, расчистка",
+                    "status": ACTIVE_RESTORATION_STATUS if in_progress else "завершено",
+                })
+                ids["restoration"] += 1
+
+        # 5. Билеты за последние days дней и посетители к ним
+        for day in range(days):
+            day_start = datetime.combine(end_date - timedelta(days=days - 1 - day), datetime.min.time())
+            for _ in range(tickets_per_day):
+                ticket_id = ids["ticket"]
+                ids["ticket"] += 1
+                ticket_type, price, (min_age, max_age) = rng.choices(TICKET_TYPES, TICKET_TYPE_WEIGHTS)[0]
+                loader.add("ticket", {
+                    "id": ticket_id,
+                    "number": f"G-{ticket_id:010d}",
+                    "date_time": day_start + timedelta(hours=10, seconds=rng.randint(0, 10 * 3600 - 1)),
+                    "type": ticket_type,
+                    "price": price,
+                    "payment_status": "оплачен" if rng.random() < 0.95 else "not paid",
+                })
+                if rng.random() < 0.9:
+                    loader.add("visitor", {
+                        "id": ids["visitor"],
+                        "name": rng.choice(FIRST_NAMES),
+                        "age": rng.randint(min_age, max_age),
+                        "phone": None,
+                        "email": f"visitor{ids['visitor']}@example.com",
+                        "ticket_id": ticket_id,
+                    })
+                    ids["visitor"] += 1
+    finally:
+        loader.close()
+
+    return loader.counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Тестовые данные музея")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("sample", help="демонстрационные данные (по умолчанию)")
+
+    generator = commands.add_parser("generate", help="набор данных для нагрузочных тестов")
+    generator.add_argument("--exhibits", type=int, default=10_000)
+    generator.add_argument("--movements-per-exhibit", type=int, default=5)
+    generator.add_argument("--tickets-per-day", type=int, default=500)
+    generator.add_argument("--days", type=int, default=365, help="за сколько последних дней создать билеты")
+    generator.add_argument("--employees", type=int, default=50)
+    generator.add_argument("--halls", type=int, default=30)
+    generator.add_argument("--restoration-rate", type=float, default=0.05, help="доля экспонатов с реставрацией")
+    generator.add_argument("--seed", type=int, default=42)
+    generator.add_argument("--end-date", type=date.fromisoformat, default=None,
+                           help="последний день истории (YYYY-MM-DD), по умолчанию сегодня")
+    generator.add_argument("--batch-size", type=int, default=10_000)
+
+    args = parser.parse_args(argv)
+    create_db_and_tables()
+
+    if args.command != "generate":
+        create_sample_data()
+        return
+
+    started = time.perf_counter()
+    counts = generate_dataset(
+        exhibits=args.exhibits,
+        movements_per_exhibit=args.movements_per_exhibit,
+        tickets_per_day=args.tickets_per_day,
+        days=args.days,
+        employees=args.employees,
+        halls=args.halls,
+        restoration_rate=args.restoration_rate,
+        seed=args.seed,
+        end_date=args.end_date,
+        batch_size=args.batch_size,
+    )
+    seconds = time.perf_counter() - started
+    total = sum(counts.values())
+    print(f"✅ Generated {total} rows in {seconds:.1f} s ({total / seconds:.0f} rows/s)")
+    for table in GENERATED_TABLES:
+        print(f"   {table}: {counts[table]}")
 
 
 if __name__ == "__main__":
-    create_sample_data()
\ No newline at end of file
+    main()
\ No newline at end of file
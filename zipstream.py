@@ -0,0 +1,110 @@
+# zipstream.py
+"""
+ZIP archives written as a stream, for downloads of any number of documents.
+
+zipfile keeps a ZipInfo of every entry in memory until the archive is closed,
+about a kilobyte per file. ZipStream returns the bytes of each file as soon as
+it is added and spools the central directory to a temporary file instead, so
+memory stays constant however many files the archive holds. Each file is
+deflated in one piece: files are small documents, so their sizes and CRC are
+known before the local header is written and no data descriptors are needed.
+ZIP64 records are added when the archive outgrows the classic format
+(65535 files or 4 GB).
+
+    with ZipStream() as archive:
+        yield archive.add("a.txt", b"...")
+        yield from archive.finish()
+"""
+import struct
+import tempfile
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+
+# Central directory bytes kept in memory before it is moved to a temporary file
+DIRECTORY_SPOOL_SIZE = 1024 * 1024
+# Bytes of the central directory copied per output chunk
+DIRECTORY_CHUNK_SIZE = 64 * 1024
+
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_ENTRIES_LIMIT = 0xFFFF
+# Version needed to extract: 2.0 (deflate) and 4.5 (ZIP64)
+VERSION_DEFLATE = 20
+VERSION_ZIP64 = 45
+# Names are stored in UTF-8
+FLAG_UTF8 = 0x0800
+METHOD_DEFLATE = 8
+# Regular file, rw-r--r--
+EXTERNAL_ATTRIBUTES = 0o100644 << 16
+
+
+def _dos_time(moment: datetime) -> tuple:
+    """MS-DOS time and date of a local file header"""
+    return (moment.hour << 11 | moment.minute << 5 | moment.second // 2,
+            (max(moment.year, 1980) - 1980) << 9 | moment.month << 5 | moment.day)
+
+
+class ZipStream:
+    """Builds a ZIP archive file by file, returning the bytes to send right away"""
+
+    def __init__(self, level: int = 6, modified: Optional[datetime] = None):
+        self.level = level
+        self.time, self.date = _dos_time(modified or datetime.now())
+        self.offset = 0
+        self.entries = 0
+        self.directory = tempfile.SpooledTemporaryFile(max_size=DIRECTORY_SPOOL_SIZE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.directory.close()
+
+    def add(self, name: str, data: bytes) -> bytes:
+        """Local header and deflated data of one file"""
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        compressed = compressor.compress(data) + compressor.flush()
+        encoded_name = name.encode("utf-8")
+        crc = zlib.crc32(data)
+        header = struct.pack("<IHHHHHIIIHH", 0x04034B50, VERSION_DEFLATE, FLAG_UTF8, METHOD_DEFLATE,
+                             self.time, self.date, crc, len(compressed), len(data), len(encoded_name), 0)
+
+        # The offset of a file past 4 GB goes to a ZIP64 extra field
+        extra, offset, version = b"", self.offset, VERSION_DEFLATE
+        if self.offset >= ZIP32_LIMIT:
+            extra, offset, version = struct.pack("<HHQ", 0x0001, 8, self.offset), ZIP32_LIMIT, VERSION_ZIP64
+        self.directory.write(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, version, version, FLAG_UTF8, METHOD_DEFLATE,
+            self.time, self.date, crc, len(compressed), len(data), len(encoded_name), len(extra), 0,
+            0, 0, EXTERNAL_ATTRIBUTES, offset,
+        ) + encoded_name + extra)
+
+        chunk = header + encoded_name + compressed
+        self.offset += len(chunk)
+        self.entries += 1
+        return chunk
+
+    def finish(self) -> Iterator[bytes]:
+        """Central directory and end records; the archive is complete after them"""
+        directory_offset, directory_size = self.offset, self.directory.tell()
+        self.directory.seek(0)
+        while True:
+            chunk = self.directory.read(DIRECTORY_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+        end_offset = directory_offset + directory_size
+        if (self.entries >= ZIP32_ENTRIES_LIMIT or directory_offset >= ZIP32_LIMIT
+                or directory_size >= ZIP32_LIMIT):
+            yield struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                              self.entries, self.entries, directory_size, directory_offset)
+            yield struct.pack("<IIQI", 0x07064B50, 0, end_offset, 1)
+            yield struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, ZIP32_ENTRIES_LIMIT, ZIP32_ENTRIES_LIMIT,
+                              ZIP32_LIMIT, ZIP32_LIMIT, 0)
+        else:
+            yield struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, self.entries, self.entries,
+                              directory_size, directory_offset, 0)